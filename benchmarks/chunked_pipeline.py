@@ -0,0 +1,87 @@
+# benchmarks/chunked_pipeline.py
+
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from core.engine import SimulationEngine
+from fluid_solver.synthetic_turbulence import SyntheticTurbulenceGenerator
+
+
+def make_config(directory, num_particles, storage, blocked):
+    config = {
+        'mechanism_file': 'gri30.yaml',
+        'time_step': 1e-4,
+        'total_time': 1.0,
+        'num_particles': num_particles,
+        'seed': 1,
+        'initial_conditions': {
+            'composition': {'CH4': 0.055, 'O2': 0.22, 'N2': 0.725},
+            'temperature': 300.0,
+            'pressure': 101325.0
+        },
+        'flow_field_file': os.path.join(directory, 'flow_field.h5'),
+        'export_directory': os.path.join(directory, 'exports'),
+        'micromixing_constant': 1.0,
+        'diffusivity': 1e-5,
+        'micromixing_model': 'adaptive',
+        'particle_storage': storage,
+    }
+    if blocked is not None:
+        config['blocked_execution'] = {'enabled': True, 'chunk_size': blocked}
+    return config
+
+
+def time_steps(config, num_steps):
+    """
+    Return the mean wall time of one macro step (transport, mixing, chemistry).
+    The first step is excluded as warm-up. Both modes evaluate the strain tensors
+    in batches, so the timings differ by the chunking alone.
+    """
+    engine = SimulationEngine(config)
+    try:
+        engine.advance_stages()
+        start = time.perf_counter()
+        for _ in range(num_steps):
+            engine.advance_stages()
+        return (time.perf_counter() - start) / num_steps
+    finally:
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time macro steps stage by stage and in chunks of several sizes.")
+    parser.add_argument('--particles', type=int, default=5000)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[64, 256, 1024, 4096])
+    parser.add_argument('--storage', choices=('dict', 'array', 'memmap'), default='array')
+    args = parser.parse_args()
+
+    storage = {
+        'dict': {'format': 'dict'},
+        'array': {'format': 'array'},
+        'memmap': {'format': 'array', 'backing': 'memmap'},
+    }[args.storage]
+    directory = tempfile.mkdtemp()
+    try:
+        SyntheticTurbulenceGenerator(
+            {'synthetic_turbulence': {'resolution': [32, 32, 32], 'rms_velocity': 1.0, 'seed': 1}}
+        ).generate(os.path.join(directory, 'flow_field.h5'))
+        print(f"{'mode':<24}{'s/step':>12}{'us/particle':>14}")
+        for chunk_size in [None] + args.chunk_sizes:
+            seconds = time_steps(make_config(directory, args.particles, storage, chunk_size), args.steps)
+            mode = 'stage by stage' if chunk_size is None else f"chunks of {chunk_size}"
+            print(f"{mode:<24}{seconds:>12.3f}{1e6 * seconds / args.particles:>14.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/particle_memory.py
+
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import tracemalloc
+
+import numpy as np
+
+from chemistry.kinetics import ChemicalKinetics
+from particles.particle import Particle
+from particles.particle_manager import ParticleManager
+
+# GRI-3.0 nitrogen and C3 species; excluding them switches off the 140 reactions that involve them
+DEFAULT_EXCLUDED_SPECIES = [
+    'N', 'NH', 'NH2', 'NH3', 'NNH', 'NO', 'NO2', 'N2O', 'HNO', 'CN', 'HCN', 'H2CN', 'HCNN',
+    'HCNO', 'HOCN', 'HNCO', 'NCO', 'AR', 'C3H7', 'C3H8', 'CH2CHO', 'CH3CHO'
+]
+
+STORAGE_MODES = {
+    'dict': {'format': 'dict'},
+    'array float64': {'format': 'array', 'precision': 'float64'},
+    'array float32': {'format': 'array', 'precision': 'float32'},
+    'array float32 + excluded': {'format': 'array', 'precision': 'float32', 'excluded_species': DEFAULT_EXCLUDED_SPECIES},
+}
+
+
+def measure(storage, num_particles, mechanism_file, time_step):
+    """
+    Return the bytes allocated per particle for one storage mode, after one
+    detailed chemistry step of a burning CH4/air mixture, so every particle
+    holds the distinct, mostly non-zero scalars of a reacting run.
+    :return: tuple (bytes per particle including position/velocity, bytes per particle for the scalars only)
+    """
+    config = {
+        'mechanism_file': mechanism_file,
+        'time_step': time_step,
+        'num_particles': 0,
+        'initial_conditions': {
+            'composition': {'CH4': 0.055, 'O2': 0.22, 'N2': 0.725},
+            'temperature': 1500.0,
+            'pressure': 101325.0
+        },
+        'particle_storage': storage,
+    }
+    manager = ParticleManager(config)
+    kinetics = ChemicalKinetics(config)
+    names = ['temperature', 'pressure'] + manager.gas.species_names
+    composition = config['initial_conditions']['composition']
+    rng = np.random.default_rng(0)
+
+    def build_particles():
+        return [
+            Particle(position, manager.make_properties({
+                'temperature': 1500.0 + 100.0 * rng.random(),
+                'pressure': 101325.0,
+                **{name: composition.get(name, 0.0) for name in names[2:]}
+            }))
+            for position in rng.random((num_particles, 3))
+        ]
+
+    gc.collect()
+    tracemalloc.start()
+    particles = build_particles()
+    kinetics.react_particles(particles)
+    gc.collect()
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    scalars = sum(properties_size(particle.properties) for particle in particles)
+    del particles
+    gc.collect()
+    return total / num_particles, scalars / num_particles
+
+
+def properties_size(properties):
+    """Return the bytes held by one particle's scalar container."""
+    if isinstance(properties, dict):
+        return sys.getsizeof(properties) + sum(sys.getsizeof(value) for value in properties.values())
+    size = sys.getsizeof(properties) + sys.getsizeof(properties.values)
+    if properties.sparse is not None:
+        size += sys.getsizeof(properties.sparse) + sum(sys.getsizeof(value) for value in properties.sparse.values())
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report bytes per particle for each particle storage mode.")
+    parser.add_argument('--particles', type=int, default=2000)
+    parser.add_argument('--mechanism', default='gri30.yaml')
+    parser.add_argument('--time-step', type=float, default=1e-3, help="chemistry step before measuring")
+    args = parser.parse_args()
+
+    print(f"{'storage mode':<28}{'bytes/particle':>16}{'scalars only':>16}")
+    for name, storage in STORAGE_MODES.items():
+        total, scalars = measure(storage, args.particles, args.mechanism, args.time_step)
+        print(f"{name:<28}{total:>16.0f}{scalars:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/particle_sorting.py
+
+import sys
+import os
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from fluid_solver.solver_interface import FluidSolverInterface
+from particles.population_control import PopulationController
+from particles.spatial_ordering import MortonOrdering
+
+
+def write_flow_field(path, resolution, seed=0):
+    """Write a random velocity field on a uniform grid of resolution**3 nodes."""
+    rng = np.random.default_rng(seed)
+    nodes = np.linspace(0.0, 1.0, resolution)
+    with h5py.File(path, 'w') as f:
+        for name in ('x', 'y', 'z'):
+            f.create_dataset(name, data=nodes)
+        for name in ('u', 'v', 'w'):
+            f.create_dataset(name, data=rng.standard_normal((resolution,) * 3))
+
+
+def best_time(function, repeats):
+    """Return the shortest wall time of several calls."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare interpolation and per-cell binning throughput of particles in creation order "
+                    "and in Morton order."
+    )
+    parser.add_argument('--particles', type=int, default=2_000_000)
+    parser.add_argument('--resolution', type=int, default=128, help="flow grid nodes per axis")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        flow_field_file = os.path.join(directory, 'flow_field.h5')
+        write_flow_field(flow_field_file, args.resolution)
+        fluid_solver = FluidSolverInterface({'flow_field_file': flow_field_file})
+        ordering = MortonOrdering({})
+        ordering.set_grid(fluid_solver)
+        binning = PopulationController({})
+        binning.set_grid(fluid_solver)
+        num_cells = (args.resolution - 1) ** 3
+
+        rng = np.random.default_rng(1)
+        positions = rng.random((args.particles, 3))
+        values = rng.random(args.particles)
+        start = time.perf_counter()
+        order = ordering.order(positions)
+        sort_seconds = time.perf_counter() - start
+
+        print(f"{args.particles} particles, {args.resolution}^3 grid, Morton sort {sort_seconds:.3f} s")
+        print(f"{'operation':<16}{'order':<10}{'s':>10}{'Mparticles/s':>16}")
+        results = {}
+        for label, permutation in (('creation', np.arange(args.particles)), ('morton', order)):
+            sorted_positions = np.ascontiguousarray(positions[permutation])
+            sorted_values = np.ascontiguousarray(values[permutation])
+            cells = binning.cell_indices(sorted_positions)
+            operations = {
+                'interpolation': lambda: fluid_solver.get_velocities_at(sorted_positions),
+                'binning': lambda: np.bincount(cells, weights=sorted_values, minlength=num_cells),
+            }
+            for operation, function in operations.items():
+                seconds = best_time(function, args.repeats)
+                results[operation, label] = seconds
+                print(f"{operation:<16}{label:<10}{seconds:>10.3f}{args.particles / seconds / 1e6:>16.2f}")
+        for operation in ('interpolation', 'binning'):
+            print(f"{operation} speedup: {results[operation, 'creation'] / results[operation, 'morton']:.2f}x")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
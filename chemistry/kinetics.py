@@ -3,12 +3,35 @@
 import cantera as ct
 import numpy as np
 
+from particles.particle_storage import StateLayout
+
+
+def disable_species_reactions(gas, species):
+    """
+    Switch off every reaction that consumes or produces one of the given species,
+    so that species held at zero by the particle storage stay at zero.
+    :param gas: Cantera Solution
+    :param species: iterable of species names
+    :return: number of reactions switched off
+    """
+    species = set(species)
+    if not species:
+        return 0
+    disabled = 0
+    for i, reaction in enumerate(gas.reactions()):
+        if species & (set(reaction.reactants) | set(reaction.products)):
+            gas.set_multiplier(0.0, i)
+            disabled += 1
+    return disabled
+
+
 class ChemicalKinetics:
     def __init__(self, config):
         self.config = config
         self.mechanism_file = config['mechanism_file']
         self.load_mechanism()
         self.time_step = config['time_step']
+        self.create_reactor()
 
     def load_mechanism(self):
         """
@@ -19,41 +42,62 @@ class ChemicalKinetics:
             self.gas = ct.Solution(self.mechanism_file)
         except Exception as e:
             raise IOError(f"Error loading chemical mechanism: {e}")
+        disable_species_reactions(self.gas, StateLayout.configured_exclusions(self.config))
 
-    def react_particles(self, particles):
+    def create_reactor(self):
+        """
+        Create the reactor network reused for every particle. The reactor shares
+        self.gas, so setting the gas state and calling syncState re-initializes
+        it in place instead of constructing new Cantera objects per particle.
+        """
+        try:
+            self.reactor = ct.IdealGasConstPressureReactor(self.gas, clone=False)
+        except TypeError:
+            # Cantera < 3.2 always shares the phase with the reactor
+            self.reactor = ct.IdealGasConstPressureReactor(self.gas)
+        self.network = ct.ReactorNet([self.reactor])
+
+    def react_particles(self, particles, time_step=None):
+        """
+        Integrate each particle's chemistry at constant pressure.
+        :param particles: list of Particle objects
+        :param time_step: integration time (defaults to the configured time_step)
+        """
+        time_step = self.time_step if time_step is None else time_step
+        species_names = self.gas.species_names
         for particle in particles:
             # Ensure only valid species are included in the composition
-            composition = {
-                species: particle.properties.get(species, 0.0)
-                for species in self.gas.species_names
-            }
+            composition = np.array([particle.properties.get(species, 0.0) for species in species_names])
 
             # Normalize composition to sum to 1 if the total is greater than zero
-            total_composition = sum(composition.values())
+            total_composition = composition.sum()
             if total_composition > 0:
-                composition = {k: v / total_composition for k, v in composition.items()}
+                composition = composition / total_composition
 
             # Extract temperature and pressure
             temperature = particle.properties.get('temperature', 300.0)
             pressure = particle.properties.get('pressure', ct.one_atm)
 
             # Check for NaN values in temperature, pressure, or composition
-            if np.isnan(temperature) or np.isnan(pressure) or any(np.isnan(value) for value in composition.values()):
+            if np.isnan(temperature) or np.isnan(pressure) or np.isnan(composition).any():
                 raise ValueError("Invalid initial conditions: temperature, pressure, or composition contains NaN values.")
 
+            # The reactor expands while it integrates; restore its volume before the new
+            # state, or its mass (density * volume) grows with every particle until it overflows
+            self.reactor.volume = 1.0
+
             # Set the state of the gas object
             try:
                 self.gas.TPY = temperature, pressure, composition
             except ct.CanteraError as e:
                 raise RuntimeError(f"Failed to set state for gas: {e}")
 
-            # Integrate the reactor over the time step
-            reactor = ct.IdealGasConstPressureReactor(self.gas)
-            sim = ct.ReactorNet([reactor])
-            sim.advance(self.time_step)
+            # Restart the persistent reactor from this state and integrate over the time step
+            self.reactor.syncState()
+            self.network.initial_time = 0.0
+            self.network.advance(time_step)
 
             # Update particle properties with new state
-            particle.properties['temperature'] = reactor.T
-            particle.properties['pressure'] = reactor.thermo.P
-            for i, species in enumerate(self.gas.species_names):
-                particle.properties[species] = reactor.thermo.Y[i]
\ No newline at end of file
+            particle.properties['temperature'] = self.reactor.T
+            particle.properties['pressure'] = self.gas.P
+            particle.properties.update(zip(species_names, self.gas.Y.tolist()))
@@ -0,0 +1,308 @@
+# chemistry/tabulated_chemistry.py
+
+import os
+import json
+import hashlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import cantera as ct
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from chemistry.kinetics import disable_species_reactions
+from particles.particle_storage import StateLayout
+
+# Reactor time assigned to progress a non-reacting manifold never reaches
+NEVER = 1e30
+
+
+def compute_reactor_manifold(mechanism_file, mixture_fraction, fuel, oxidizer, temperature, pressure,
+                             end_time, progress_species, progress_grid, excluded_species=()):
+    """
+    Tabulate one homogeneous constant-pressure reactor on a normalized progress grid.
+    Runs in a worker process during table generation. Reactions involving the
+    excluded species are switched off, as in ChemicalKinetics.
+    :return: dict with 'temperature' (nc,), 'mass_fractions' (nc, K), 'time' (nc,),
+             'unburnt_progress' and 'burnt_progress' (floats)
+    """
+    gas = ct.Solution(mechanism_file)
+    disable_species_reactions(gas, excluded_species)
+    gas.set_mixture_fraction(mixture_fraction, fuel, oxidizer, basis='mass')
+    gas.TP = temperature, pressure
+    progress_indices = [gas.species_index(name) for name in progress_species]
+
+    try:
+        reactor = ct.IdealGasConstPressureReactor(gas, clone=False)
+    except TypeError:
+        # Cantera < 3.2 always shares the phase with the reactor
+        reactor = ct.IdealGasConstPressureReactor(gas)
+    network = ct.ReactorNet([reactor])
+    times = [0.0]
+    temperatures = [gas.T]
+    mass_fractions = [gas.Y.copy()]
+    while network.time < end_time:
+        network.step()
+        times.append(network.time)
+        temperatures.append(gas.T)
+        mass_fractions.append(gas.Y.copy())
+
+    times = np.array(times)
+    temperatures = np.array(temperatures)
+    mass_fractions = np.array(mass_fractions)
+    # C = sum of the progress species mass fractions, made monotone along the trajectory
+    progress = np.maximum.accumulate(mass_fractions[:, progress_indices].sum(axis=1))
+    unburnt_progress, burnt_progress = progress[0], progress[-1]
+
+    num_points = len(progress_grid)
+    if burnt_progress - unburnt_progress < 1e-12:
+        # Non-reacting mixture (pure fuel or oxidizer): a flat manifold
+        return {
+            'temperature': np.full(num_points, temperatures[0]),
+            'mass_fractions': np.tile(mass_fractions[0], (num_points, 1)),
+            'time': np.concatenate(([0.0], np.full(num_points - 1, NEVER))),
+            'unburnt_progress': unburnt_progress,
+            'burnt_progress': unburnt_progress,
+        }
+
+    # Map the trajectory onto the progress grid, using the first time each C is reached
+    _, unique = np.unique(progress, return_index=True)
+    targets = unburnt_progress + np.asarray(progress_grid) * (burnt_progress - unburnt_progress)
+    # Tabulating the reactor time t(c) rather than the instantaneous rate dC/dt (zero in
+    # the unburnt mixture) keeps the ignition delay: a particle crosses each interval in
+    # the reactor's time.
+    target_times = np.interp(targets, progress[unique], times[unique])
+    return {
+        'temperature': np.interp(targets, progress[unique], temperatures[unique]),
+        'mass_fractions': np.column_stack([
+            np.interp(targets, progress[unique], mass_fractions[unique, k])
+            for k in range(mass_fractions.shape[1])
+        ]),
+        'time': target_times,
+        'unburnt_progress': unburnt_progress,
+        'burnt_progress': burnt_progress,
+    }
+
+
+class TabulatedChemistry:
+    """
+    Tabulated-chemistry closure as an alternative to ChemicalKinetics.
+
+    A table of homogeneous-reactor manifolds is generated offline from the
+    mechanism, parameterized by mixture fraction Z (Bilger, between the fuel and
+    oxidizer streams) and normalized progress variable c, where C is the sum of
+    the progress species mass fractions. Each reactor runs for
+    'reactor_end_time', which should be long enough to approach equilibrium. At run time every particle's C is
+    advanced along the tabulated reactor time t(c) and its temperature and mass
+    fractions are read back from the table, all by vectorized multilinear
+    lookups. Tables are stored as HDF5 and cached by a hash of the mechanism
+    file and the generation conditions.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.mechanism_file = config['mechanism_file']
+        self.time_step = config['time_step']
+        settings = config.get('tabulated_chemistry', {})
+        initial_conditions = config.get('initial_conditions', {})
+
+        self.fuel = settings.get('fuel', {'CH4': 1.0})
+        self.oxidizer = settings.get('oxidizer', {'O2': 0.233, 'N2': 0.767})
+        self.temperature = settings.get('temperature', initial_conditions.get('temperature', 300.0))
+        self.pressure = settings.get('pressure', initial_conditions.get('pressure', ct.one_atm))
+        self.progress_species = settings.get('progress_species', ['CO2', 'CO', 'H2O', 'H2'])
+        self.reactor_end_time = settings.get('reactor_end_time', 1.0)
+        self.num_workers = settings.get('num_workers')
+        self.cache_directory = settings.get('cache_directory', 'chemistry_tables')
+        self.mixture_fraction_grid = np.asarray(
+            settings.get('mixture_fraction_grid', np.linspace(0.0, 1.0, settings.get('mixture_fraction_points', 21))),
+            dtype=float,
+        )
+        self.progress_grid = np.linspace(0.0, 1.0, settings.get('progress_points', 51))
+        self.excluded_species = sorted(StateLayout.configured_exclusions(config))
+
+        try:
+            self.gas = ct.Solution(self.mechanism_file)
+        except Exception as e:
+            raise IOError(f"Error loading chemical mechanism: {e}")
+        self.species_names = self.gas.species_names
+        self.progress_indices = [self.gas.species_index(name) for name in self.progress_species]
+        self.setup_mixture_fraction()
+
+        self.table_file = os.path.join(self.cache_directory, f"fgm_{self.table_hash()}.h5")
+        if not os.path.exists(self.table_file):
+            self.generate_table()
+        self.load_table()
+
+    def table_hash(self):
+        """Hash of the mechanism file contents and every generation condition."""
+        digest = hashlib.sha256()
+        with open(self.mechanism_file, 'rb') as f:
+            digest.update(f.read())
+        conditions = {
+            'fuel': self.fuel,
+            'oxidizer': self.oxidizer,
+            'temperature': self.temperature,
+            'pressure': self.pressure,
+            'progress_species': self.progress_species,
+            'reactor_end_time': self.reactor_end_time,
+            'mixture_fraction_grid': self.mixture_fraction_grid.tolist(),
+            'progress_grid': self.progress_grid.tolist(),
+        }
+        if self.excluded_species:
+            conditions['excluded_species'] = self.excluded_species
+        digest.update(json.dumps(conditions, sort_keys=True).encode())
+        return digest.hexdigest()[:16]
+
+    def generate_table(self):
+        """Compute one reactor manifold per mixture fraction in parallel and write the table."""
+        arguments = [
+            (self.mechanism_file, mixture_fraction, self.fuel, self.oxidizer, self.temperature,
+             self.pressure, self.reactor_end_time, self.progress_species, self.progress_grid, self.excluded_species)
+            for mixture_fraction in self.mixture_fraction_grid
+        ]
+        # Daemonic processes (e.g. domain decomposition workers) cannot start a pool
+        if self.num_workers == 1 or mp.current_process().daemon:
+            manifolds = [compute_reactor_manifold(*args) for args in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                manifolds = list(executor.map(compute_reactor_manifold, *zip(*arguments)))
+
+        os.makedirs(self.cache_directory, exist_ok=True)
+        temporary_file = self.table_file + f".{os.getpid()}.tmp"
+        with h5py.File(temporary_file, 'w') as f:
+            f.create_dataset('mixture_fraction', data=self.mixture_fraction_grid)
+            f.create_dataset('progress', data=self.progress_grid)
+            f.create_dataset('temperature', data=np.array([m['temperature'] for m in manifolds]))
+            f.create_dataset('mass_fractions', data=np.array([m['mass_fractions'] for m in manifolds]))
+            f.create_dataset('time', data=np.array([m['time'] for m in manifolds]))
+            f.create_dataset('unburnt_progress', data=np.array([m['unburnt_progress'] for m in manifolds]))
+            f.create_dataset('burnt_progress', data=np.array([m['burnt_progress'] for m in manifolds]))
+            f.attrs['species_names'] = json.dumps(self.species_names)
+            f.attrs['progress_species'] = json.dumps(self.progress_species)
+            f.attrs['mechanism_file'] = os.path.basename(self.mechanism_file)
+        os.replace(temporary_file, self.table_file)
+
+    def load_table(self):
+        try:
+            with h5py.File(self.table_file, 'r') as f:
+                self.table_mixture_fraction = f['mixture_fraction'][:]
+                self.table_progress = f['progress'][:]
+                temperature = f['temperature'][:]
+                mass_fractions = f['mass_fractions'][:]
+                self.reactor_time = f['time'][:]
+                self.unburnt_progress = f['unburnt_progress'][:]
+                self.burnt_progress = f['burnt_progress'][:]
+                if json.loads(f.attrs['species_names']) != self.species_names:
+                    raise ValueError("table species do not match the mechanism")
+        except Exception as e:
+            raise IOError(f"Error loading chemistry table '{self.table_file}': {e}")
+
+        self.reacting = self.burnt_progress - self.unburnt_progress >= 1e-12
+        grid = (self.table_mixture_fraction, self.table_progress)
+        self.temperature_interp = RegularGridInterpolator(grid, temperature)
+        self.mass_fractions_interp = RegularGridInterpolator(grid, mass_fractions)
+
+    def setup_mixture_fraction(self):
+        """
+        Precompute the species -> Bilger coupling function map and the stream values,
+        so Z is a single matrix-vector product per particle batch.
+        """
+        element_weights = dict(zip(self.gas.element_names, self.gas.atomic_weights))
+        # Bilger coefficients: 2 Z_C / W_C + Z_H / (2 W_H) - Z_O / W_O
+        coefficients = {'C': 2.0 / element_weights.get('C', 1.0), 'H': 0.5 / element_weights.get('H', 1.0),
+                        'O': -1.0 / element_weights.get('O', 1.0)}
+        self.bilger_coefficients = np.zeros(self.gas.n_species)
+        for k, species in enumerate(self.species_names):
+            for element, coefficient in coefficients.items():
+                if element in element_weights:
+                    self.bilger_coefficients[k] += (
+                        coefficient * self.gas.n_atoms(species, element) * element_weights[element]
+                        / self.gas.molecular_weights[k]
+                    )
+        self.fuel_coupling = self.bilger_coefficients @ self.stream_mass_fractions(self.fuel)
+        self.oxidizer_coupling = self.bilger_coefficients @ self.stream_mass_fractions(self.oxidizer)
+
+    def stream_mass_fractions(self, composition):
+        self.gas.TPY = self.temperature, self.pressure, composition
+        return self.gas.Y.copy()
+
+    def mixture_fraction(self, mass_fractions):
+        """
+        Bilger mixture fraction for a batch of compositions.
+        :param mass_fractions: numpy array of shape (N, K)
+        :return: numpy array of shape (N,) clipped to [0, 1]
+        """
+        coupling = mass_fractions @ self.bilger_coefficients
+        return np.clip((coupling - self.oxidizer_coupling) / (self.fuel_coupling - self.oxidizer_coupling), 0.0, 1.0)
+
+    def normalized_progress(self, mixture_fraction, progress):
+        unburnt = np.interp(mixture_fraction, self.table_mixture_fraction, self.unburnt_progress)
+        burnt = np.interp(mixture_fraction, self.table_mixture_fraction, self.burnt_progress)
+        span = burnt - unburnt
+        normalized = np.divide(progress - unburnt, span, out=np.zeros_like(progress), where=span > 1e-12)
+        return np.clip(normalized, 0.0, 1.0)
+
+    def advance_progress(self, mixture_fraction, normalized, time_step):
+        """
+        Advance c by time_step along the tabulated reactor time t(c).
+        Between a reacting and a non-reacting manifold (whose times are NEVER) the
+        reacting manifold's times are held, so blended particles keep progressing.
+        :param mixture_fraction: numpy array of shape (N,)
+        :param normalized: normalized progress c, numpy array of shape (N,)
+        :return: advanced c, numpy array of shape (N,)
+        """
+        # Reactor time along c, linearly interpolated in Z for every particle: (N, nc)
+        grid = self.table_mixture_fraction
+        lower = np.clip(np.searchsorted(grid, mixture_fraction, side='right') - 1, 0, len(grid) - 2)
+        weight = ((mixture_fraction - grid[lower]) / (grid[lower + 1] - grid[lower]))[:, None]
+        lower_times = self.reactor_time[lower]
+        upper_times = self.reactor_time[lower + 1]
+        lower_reacting = self.reacting[lower][:, None]
+        upper_reacting = self.reacting[lower + 1][:, None]
+        times = ((1.0 - weight) * np.where(lower_reacting | ~upper_reacting, lower_times, upper_times)
+                 + weight * np.where(upper_reacting | ~lower_reacting, upper_times, lower_times))
+
+        rows = np.arange(len(normalized))
+        progress_grid = self.table_progress
+        interval = np.clip(np.searchsorted(progress_grid, normalized, side='right') - 1, 0, len(progress_grid) - 2)
+        fraction = (normalized - progress_grid[interval]) / (progress_grid[interval + 1] - progress_grid[interval])
+        current_time = times[rows, interval] + fraction * (times[rows, interval + 1] - times[rows, interval])
+
+        # Invert t(c) at the new time
+        new_time = current_time + time_step
+        interval = np.clip(np.sum(times <= new_time[:, None], axis=1) - 1, 0, len(progress_grid) - 2)
+        duration = times[rows, interval + 1] - times[rows, interval]
+        fraction = np.clip(np.divide(new_time - times[rows, interval], duration,
+                                     out=np.zeros_like(new_time), where=duration > 0), 0.0, 1.0)
+        return progress_grid[interval] + fraction * (progress_grid[interval + 1] - progress_grid[interval])
+
+    def react_particles(self, particles, time_step=None):
+        """
+        Advance all particles through the table.
+        :param particles: list of Particle objects
+        :param time_step: integration time (defaults to the configured time_step)
+        """
+        if not particles:
+            return
+        time_step = self.time_step if time_step is None else time_step
+        mass_fractions = np.array([
+            [particle.properties.get(species, 0.0) for species in self.species_names] for particle in particles
+        ])
+        totals = mass_fractions.sum(axis=1, keepdims=True)
+        mass_fractions = np.divide(mass_fractions, totals, out=mass_fractions, where=totals > 0)
+        if np.isnan(mass_fractions).any():
+            raise ValueError("Invalid initial conditions: composition contains NaN values.")
+
+        mixture_fraction = self.mixture_fraction(mass_fractions)
+        progress = mass_fractions[:, self.progress_indices].sum(axis=1)
+        normalized = self.normalized_progress(mixture_fraction, progress)
+        normalized = self.advance_progress(mixture_fraction, normalized, time_step)
+
+        points = np.column_stack((mixture_fraction, normalized))
+        temperatures = self.temperature_interp(points)
+        new_mass_fractions = self.mass_fractions_interp(points)
+        for particle, temperature, particle_mass_fractions in zip(particles, temperatures, new_mass_fractions):
+            particle.properties['temperature'] = float(temperature)
+            particle.properties.update(zip(self.species_names, particle_mass_fractions.tolist()))
@@ -0,0 +1,134 @@
+# chemistry/thermo.py
+
+import warnings
+
+import numpy as np
+import cantera as ct
+
+
+class NasaThermo:
+    """
+    Vectorized NASA-7 thermodynamics of ideal gas mixtures.
+
+    The polynomial coefficients are read once from a Cantera Solution. For a
+    batch of particles the species polynomials are contracted with the mass
+    fractions into one mixture polynomial per common mid-point temperature,
+    so each enthalpy evaluation, and each Newton iteration of the h -> T
+    inversion, costs a few array operations instead of a Cantera state set
+    per particle.
+    """
+
+    def __init__(self, gas, tolerance=1e-6, max_iterations=50):
+        """
+        :param gas: Cantera Solution whose species all use NASA-7 (NasaPoly2) thermo
+        :param tolerance: temperature tolerance of the h -> T inversion in K
+        :param max_iterations: Newton iterations before the inversion gives up
+        """
+        self.species_names = gas.species_names
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+        coefficients = []
+        for species in gas.species():
+            thermo = species.thermo
+            if not isinstance(thermo, ct.NasaPoly2):
+                raise ValueError(f"Species '{species.name}' does not use NASA-7 polynomials.")
+            coefficients.append(thermo.coeffs)
+        coefficients = np.array(coefficients)
+        self.min_temperature = max(species.thermo.min_temp for species in gas.species())
+        self.max_temperature = min(species.thermo.max_temp for species in gas.species())
+
+        # h_k = R / W_k (a1 T + a2 T^2 / 2 + a3 T^3 / 3 + a4 T^4 / 4 + a5 T^5 / 5 + a6)
+        scaling = np.array([1.0, 1.0 / 2.0, 1.0 / 3.0, 1.0 / 4.0, 1.0 / 5.0, 1.0])
+        per_mass = (ct.gas_constant / gas.molecular_weights)[:, None]
+        high = coefficients[:, 1:7] * scaling * per_mass
+        low = coefficients[:, 8:14] * scaling * per_mass
+
+        # Species that switch polynomials at the same temperature share a mixture polynomial
+        mid_temperatures = coefficients[:, 0]
+        self.groups = [
+            (mid, np.flatnonzero(mid_temperatures == mid), low[mid_temperatures == mid], high[mid_temperatures == mid])
+            for mid in np.unique(mid_temperatures)
+        ]
+
+    def mixture_coefficients(self, mass_fractions):
+        """
+        Contract the species polynomials with the mass fractions.
+        :param mass_fractions: numpy array of shape (N, K)
+        :return: list of (mid temperature, low coefficients (N, 6), high coefficients (N, 6))
+        """
+        mass_fractions = np.atleast_2d(mass_fractions)
+        return [
+            (mid, mass_fractions[:, species] @ low, mass_fractions[:, species] @ high)
+            for mid, species, low, high in self.groups
+        ]
+
+    @staticmethod
+    def evaluate(mixture, temperatures):
+        """
+        Return mass-specific enthalpy (J/kg) and heat capacity (J/kg/K) of mixture polynomials.
+        """
+        temperatures = np.asarray(temperatures, dtype=float)
+        enthalpy = np.zeros_like(temperatures)
+        cp = np.zeros_like(temperatures)
+        for mid, low, high in mixture:
+            c = np.where((temperatures < mid)[:, None], low, high)
+            t = temperatures
+            enthalpy += c[:, 5] + t * (c[:, 0] + t * (c[:, 1] + t * (c[:, 2] + t * (c[:, 3] + t * c[:, 4]))))
+            cp += c[:, 0] + t * (2.0 * c[:, 1] + t * (3.0 * c[:, 2] + t * (4.0 * c[:, 3] + t * 5.0 * c[:, 4])))
+        return enthalpy, cp
+
+    def mixture_enthalpy(self, temperatures, mass_fractions):
+        """
+        Mass-specific enthalpy of each mixture.
+        :param temperatures: numpy array of shape (N,)
+        :param mass_fractions: numpy array of shape (N, K)
+        :return: numpy array of shape (N,) in J/kg
+        """
+        return self.evaluate(self.mixture_coefficients(mass_fractions), temperatures)[0]
+
+    def mixture_cp(self, temperatures, mass_fractions):
+        """Mass-specific heat capacity at constant pressure of each mixture in J/kg/K."""
+        return self.evaluate(self.mixture_coefficients(mass_fractions), temperatures)[1]
+
+    def temperature_from_enthalpy(self, enthalpies, mass_fractions, initial_temperatures):
+        """
+        Invert h(T, Y) = h for all mixtures with batched Newton iterations.
+        :param enthalpies: numpy array of shape (N,) in J/kg
+        :param mass_fractions: numpy array of shape (N, K)
+        :param initial_temperatures: starting guesses of shape (N,), e.g. the temperatures before mixing
+        :return: numpy array of shape (N,) of temperatures in K; enthalpies outside the
+                 polynomial range give its bound, with a RuntimeWarning
+        """
+        enthalpies = np.asarray(enthalpies, dtype=float)
+        temperatures = np.clip(np.array(initial_temperatures, dtype=float), self.min_temperature, self.max_temperature)
+        mixture = self.mixture_coefficients(mass_fractions)
+        active = np.arange(len(temperatures))
+        for _ in range(self.max_iterations):
+            # Only iterate the mixtures that have not converged yet
+            selected = [(mid, low[active], high[active]) for mid, low, high in mixture]
+            enthalpy, cp = self.evaluate(selected, temperatures[active])
+            step = (enthalpies[active] - enthalpy) / cp
+            updated = np.clip(temperatures[active] + step, self.min_temperature, self.max_temperature)
+            change = np.abs(updated - temperatures[active])
+            temperatures[active] = updated
+            active = active[change > self.tolerance]
+            if len(active) == 0:
+                break
+        else:
+            raise RuntimeError(
+                f"Temperature inversion did not converge for {len(active)} mixtures in {self.max_iterations} iterations."
+            )
+
+        # A mixture held at a bound of the polynomial range has not reached its enthalpy
+        at_bound = np.flatnonzero((temperatures <= self.min_temperature) | (temperatures >= self.max_temperature))
+        if len(at_bound):
+            selected = [(mid, low[at_bound], high[at_bound]) for mid, low, high in mixture]
+            enthalpy, cp = self.evaluate(selected, temperatures[at_bound])
+            clamped = np.count_nonzero(np.abs(enthalpies[at_bound] - enthalpy) / cp > self.tolerance)
+            if clamped:
+                warnings.warn(
+                    f"Temperature inversion clamped {clamped} mixtures to the NASA-7 range "
+                    f"[{self.min_temperature}, {self.max_temperature}] K.", RuntimeWarning
+                )
+        return temperatures
@@ -0,0 +1,340 @@
+# core/cost_model.py
+
+import copy
+import datetime
+import hashlib
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as np
+from scipy import optimize
+
+from core.memory_accounting import MemoryAccountant, MEGABYTE
+from core.operator_splitting import OperatorSplitting
+from core.run_cache import RESULT_NEUTRAL_SETTINGS, RunCache, code_version, normalize
+
+# Settings that change how long a run takes in total but not what a step or an export costs
+COST_NEUTRAL_SETTINGS = RESULT_NEUTRAL_SETTINGS + (
+    ('num_particles',),
+    ('total_time',),
+    ('seed',),
+    ('export_interval',),
+    ('single_point_export_interval',),
+    ('steady_state',),
+    ('memory_accounting',),
+    ('cost_model',),
+)
+# Costs fitted as a + b * N: per stage call, per macro step outside the stages, per export and once per run
+COST_TERMS = OperatorSplitting.STAGES + ('step', 'export', 'setup')
+CALIBRATION_VERSION = 1
+
+
+def fit_linear(counts, seconds):
+    """
+    Fit seconds = a + b * count by least squares with non-negative coefficients.
+    :return: tuple (a, b)
+    """
+    design = np.column_stack([np.ones(len(counts)), np.asarray(counts, dtype=float)])
+    coefficients, _ = optimize.nnls(design, np.asarray(seconds, dtype=float))
+    return float(coefficients[0]), float(coefficients[1])
+
+
+def format_duration(seconds):
+    """Format seconds as h:mm:ss, or with a unit below one minute."""
+    if seconds < 60:
+        return f"{seconds:.3g} s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class CostModel:
+    """
+    Predicts the wall time and peak memory of a run from short calibration runs.
+
+    Each calibration run builds the engine of the actual configuration with a
+    small particle count and times one warm-up and calibration_steps measured
+    macro steps, exporting after every step. The telemetry stage timers give
+    the cost of each transport, mixing and chemistry call; the remainder of the
+    step (flow field update, time step selection, population control, sorting)
+    and the export are timed around them. Every term is fitted as a + b * N
+    over the calibration particle counts; for chemistry b is the cost of one
+    particle integration. A run is then predicted from its number of macro
+    steps (export times are landed on exactly, as the engine does), the stage
+    calls per step of the operator splitting and its number of exports. Peak
+    memory comes from the memory projection. Both use the particle count
+    population control may grow to.
+
+    Calibrations are saved by a key of everything that changes the cost of a
+    step: the configuration without num_particles, total_time, the export
+    schedule and output locations, the mechanism contents, the flow grid
+    size, the code version and the host. Estimates for other particle counts,
+    total times or export intervals reuse them without measuring again.
+    Costs are measured at the start of the run; chemistry that stiffens later
+    (e.g. at ignition) makes the prediction optimistic, and a run ended early
+    at a steady state takes less.
+
+    Configuration ('cost_model'):
+        calibration_particles  particle counts of the calibration runs (at least two)
+        calibration_steps      measured macro steps per calibration run
+        calibration_file       JSON file the calibrations are kept in
+        particle_counts        particle counts to predict besides num_particles
+    """
+
+    def __init__(self, config):
+        settings = config.get('cost_model', {})
+        self.config = config
+        self.calibration_particles = sorted(set(settings.get('calibration_particles', [64, 256])))
+        self.calibration_steps = settings.get('calibration_steps', 3)
+        self.calibration_file = settings.get('calibration_file', 'cost_calibrations.json')
+        self.particle_counts = list(settings.get('particle_counts', []))
+        if len(self.calibration_particles) < 2 or self.calibration_particles[0] < 1:
+            raise ValueError("cost_model calibration_particles needs at least two distinct positive counts.")
+        if self.calibration_steps < 1:
+            raise ValueError("cost_model calibration_steps must be at least 1.")
+        self.calibration = None
+
+    def key(self):
+        """Return the calibration key of the configuration."""
+        settings = copy.deepcopy(self.config)
+        for path in COST_NEUTRAL_SETTINGS:
+            section = settings
+            for name in path[:-1]:
+                section = section.get(name, {})
+            if isinstance(section, dict):
+                section.pop(path[-1], None)
+
+        # The mechanism enters by content, the flow field by its grid size
+        mechanism_file = settings.pop('mechanism_file')
+        if os.path.exists(mechanism_file):
+            with open(mechanism_file, 'rb') as f:
+                mechanism = hashlib.sha256(f.read()).hexdigest()
+        else:
+            mechanism = mechanism_file
+        try:
+            with h5py.File(settings.pop('flow_field_file'), 'r') as f:
+                grid = [list(f[name].shape) for name in ('x', 'y', 'z', 'u')]
+        except Exception as e:
+            raise IOError(f"Error reading the flow grid size for the cost model: {e}")
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(normalize(settings), sort_keys=True).encode())
+        digest.update(f"mechanism {mechanism} grid {grid} code {code_version()}".encode())
+        digest.update(f"host {platform.node()} {platform.machine()} {os.cpu_count()}".encode())
+        return digest.hexdigest()[:24]
+
+    def load_calibration(self):
+        """Return the saved calibration of this configuration, or None."""
+        calibration = RunCache.read_json(self.calibration_file, {}).get(self.key())
+        if calibration is None or calibration.get('version') != CALIBRATION_VERSION:
+            return None
+        return calibration
+
+    def save_calibration(self, calibration):
+        calibrations = RunCache.read_json(self.calibration_file, {})
+        calibrations[self.key()] = calibration
+        directory = os.path.dirname(os.path.abspath(self.calibration_file))
+        os.makedirs(directory, exist_ok=True)
+        RunCache.write_json(self.calibration_file, calibrations)
+
+    def max_time_step(self):
+        """Longest macro step the run can take."""
+        settings = self.config.get('adaptive_time_step', {})
+        if settings.get('enabled', False):
+            return max(self.config['time_step'], settings.get('max_time_step', 1e-3))
+        return self.config['time_step']
+
+    def measured_steps(self):
+        """Measured steps per calibration run; enough for every stage to run at least once."""
+        return max(self.calibration_steps, *OperatorSplitting(self.config).intervals.values())
+
+    def calibration_config(self, num_particles, directory):
+        config = copy.deepcopy(self.config)
+        num_steps = self.measured_steps() + 1
+        config.update({
+            'num_particles': num_particles,
+            # Far enough away that no step is shortened to land on it
+            'total_time': 2.0 * (num_steps + 1) * self.max_time_step(),
+            'export_directory': os.path.join(directory, 'exports'),
+            'output_file': os.path.join(directory, 'simulation_output.h5'),
+        })
+        for section in ('telemetry', 'steady_state', 'memory_accounting', 'run_cache'):
+            config[section] = {'enabled': False}
+        return config
+
+    def calibration_run(self, create_engine, num_particles, samples):
+        """
+        Time one warm-up and the measured steps of an engine with num_particles particles.
+        :param samples: dict of cost term -> list of (particle count, seconds), extended in place
+        :return: list of the macro time steps taken
+        """
+        directory = tempfile.mkdtemp(prefix='cost_calibration.')
+        try:
+            start = time.perf_counter()
+            engine = create_engine(self.calibration_config(num_particles, directory))
+            samples['setup'].append((engine.total_particle_count(), time.perf_counter() - start))
+            time_steps = []
+            try:
+                metrics = engine.metrics
+                metrics.start_run(engine.total_time, engine.total_particle_count())
+                for step in range(self.measured_steps() + 1):
+                    count = engine.total_particle_count()
+                    step_start = time.perf_counter()
+                    engine.update_fluid_field()
+                    end_time = engine.select_time_step()
+                    engine.advance_stages()
+                    engine.time = end_time
+                    engine.current_step += 1
+                    engine.control_population()
+                    engine.sort_particles()
+                    export_start = time.perf_counter()
+                    # Export after every step to time the exports of the run, without
+                    # shortening the next step to land on an export time
+                    engine.next_export_time = engine.time
+                    engine.collect_data()
+                    engine.next_export_time = engine.total_time
+                    export_seconds = time.perf_counter() - export_start
+
+                    stage_seconds = dict(metrics.step_stage_seconds)
+                    stage_particles = dict(metrics.step_stage_particles)
+                    metrics.end_step(engine.time, engine.time_step, engine.total_particle_count())
+                    if step == 0:
+                        continue  # Warm-up
+                    for stage, seconds in stage_seconds.items():
+                        calls = stage_particles[stage] / count
+                        samples[stage].append((count, seconds / calls))
+                    step_seconds = export_start - step_start - sum(stage_seconds.values())
+                    samples['step'].append((count, max(step_seconds, 0.0)))
+                    samples['export'].append((count, export_seconds))
+                    time_steps.append(engine.time_step)
+            finally:
+                engine.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return time_steps
+
+    def calibrate(self, create_engine):
+        """
+        Measure the costs of this configuration and save them.
+        :param create_engine: callable building an engine from a config, e.g. SimulationEngine
+        :return: calibration dict
+        """
+        # Project the memory before the calibration engines inflate the runtime baseline
+        projection = MemoryAccountant(self.config).project()
+        components = projection['particle_state'] + projection['export_buffers']
+        samples = {term: [] for term in COST_TERMS}
+        time_steps = []
+        for num_particles in self.calibration_particles:
+            print(f"Calibrating with {num_particles} particles...")
+            time_steps += self.calibration_run(create_engine, num_particles, samples)
+
+        coefficients = {}
+        for term in COST_TERMS:
+            if not samples[term]:
+                raise RuntimeError(f"Cost model calibration recorded no '{term}' timings.")
+            counts, seconds = zip(*samples[term])
+            coefficients[term] = fit_linear(counts, seconds)
+        calibration = {
+            'version': CALIBRATION_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'calibration_particles': self.calibration_particles,
+            # The configured step, or the mean adaptive step of the calibration
+            'time_step': float(np.mean(time_steps)),
+            'coefficients': coefficients,
+            'memory': {
+                'fixed_bytes': projection['resident'] - components,
+                'bytes_per_particle': projection['bytes_per_particle'],
+            },
+        }
+        self.save_calibration(calibration)
+        return calibration
+
+    def stage_calls_per_step(self):
+        """Mean calls of each stage per macro step, over one cycle of the operator splitting intervals."""
+        splitting = OperatorSplitting(self.config)
+        cycle = math.lcm(*splitting.intervals.values())
+        calls = dict.fromkeys(OperatorSplitting.STAGES, 0)
+        for _ in range(cycle):
+            for stage, _, substeps in splitting.schedule(1.0):
+                calls[stage] += substeps
+        return {stage: count / cycle for stage, count in calls.items()}
+
+    def num_steps(self, time_step):
+        """Macro steps of the run, with the steps shortened to land on each export time."""
+        total_time = self.config['total_time']
+        export_interval = self.config.get('export_interval', 0.1)
+        num_exports = self.num_exports()
+        steps = num_exports * math.ceil(export_interval / time_step - 1e-9)
+        remainder = total_time - num_exports * export_interval
+        if remainder > 1e-12 * max(total_time, 1.0):
+            steps += math.ceil(remainder / time_step - 1e-9)
+        return steps
+
+    def num_exports(self):
+        return int(math.floor(self.config['total_time'] / self.config.get('export_interval', 0.1) + 1e-9))
+
+    def predict(self, num_particles):
+        """
+        Predict a run of the configuration with num_particles initial particles.
+        :return: dict with 'num_particles' (as grown by population control), 'steps', 'exports',
+                 'seconds' (per cost term), 'total_seconds' and 'peak_memory' in bytes
+        """
+        calibration = self.calibration
+        count = MemoryAccountant(dict(self.config, num_particles=num_particles)).projected_particle_count()
+
+        def cost(term):
+            a, b = calibration['coefficients'][term]
+            return a + b * count
+
+        steps = self.num_steps(calibration['time_step'])
+        exports = self.num_exports()
+        seconds = {stage: steps * calls * cost(stage) for stage, calls in self.stage_calls_per_step().items()}
+        seconds['step'] = steps * cost('step')
+        seconds['export'] = exports * cost('export')
+        seconds['setup'] = cost('setup')
+        memory = calibration['memory']
+        return {
+            'num_particles': count,
+            'steps': steps,
+            'exports': exports,
+            'seconds': seconds,
+            'total_seconds': sum(seconds.values()),
+            'peak_memory': memory['fixed_bytes'] + memory['bytes_per_particle'] * count,
+        }
+
+    def estimate(self, create_engine, particle_counts=None, recalibrate=False):
+        """
+        Predict the configured run and runs with other particle counts, calibrating only if needed.
+        :param create_engine: callable building an engine from a config, e.g. SimulationEngine
+        :param particle_counts: counts to predict besides num_particles (defaults to the configured ones)
+        :param recalibrate: measure again even if a calibration is saved
+        :return: list of predictions, the configured particle count first
+        """
+        self.calibration = None if recalibrate else self.load_calibration()
+        if self.calibration is None:
+            self.calibration = self.calibrate(create_engine)
+        else:
+            print(f"Using the calibration of {self.calibration['created']} from '{self.calibration_file}'.")
+        if particle_counts is None:
+            particle_counts = self.particle_counts
+        counts = [self.config.get('num_particles', 100)]
+        counts += [count for count in particle_counts if count not in counts]
+        predictions = [self.predict(count) for count in counts]
+
+        first = predictions[0]
+        print(f"Predicted run of {self.config['total_time']} s: {first['steps']} macro steps of "
+              f"{self.calibration['time_step']:.3g} s, {first['exports']} exports")
+        terms = ''.join(f"{term:>12}" for term in COST_TERMS)
+        print(f"{'particles':>12}{terms}{'total':>12}{'peak MB':>12}")
+        for prediction in predictions:
+            times = ''.join(f"{format_duration(prediction['seconds'][term]):>12}" for term in COST_TERMS)
+            print(f"{prediction['num_particles']:>12}{times}{format_duration(prediction['total_seconds']):>12}"
+                  f"{prediction['peak_memory'] / MEGABYTE:>12.1f}")
+        return predictions
@@ -0,0 +1,431 @@
+# core/domain_decomposition.py
+
+import traceback
+import multiprocessing as mp
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+
+from chemistry.tabulated_chemistry import TabulatedChemistry
+from core.engine import SimulationEngine
+from core.memory_accounting import MemoryAccountant
+from particles.particle_manager import spawn_seed_sequences
+from particles.spatial_ordering import MortonOrdering
+
+
+def load_flow_grid(flow_field_file):
+    """
+    Read only the grid axes of a flow field file.
+    :return: namespace with x, y, z arrays
+    """
+    try:
+        with h5py.File(flow_field_file, 'r') as f:
+            return SimpleNamespace(x=f['x'][:], y=f['y'][:], z=f['z'][:])
+    except Exception as e:
+        raise IOError(f"Error loading flow field grid: {e}")
+
+
+class SlabDecomposition:
+    """
+    Partition of the flow grid into slabs of whole grid cells along one axis.
+    Particles outside the grid belong to the first or last slab.
+    """
+
+    def __init__(self, grid, num_subdomains, axis=0, domain_bounds=((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))):
+        self.axis = axis
+        self.num_subdomains = num_subdomains
+        nodes = np.asarray((grid.x, grid.y, grid.z)[axis])
+        num_cells = len(nodes) - 1
+        if num_subdomains < 1 or num_subdomains > num_cells:
+            raise ValueError(f"Cannot split {num_cells} grid cells into {num_subdomains} subdomains.")
+        split_nodes = np.round(np.linspace(0, num_cells, num_subdomains + 1)).astype(int)
+        self.interior_edges = nodes[split_nodes[1:-1]]
+        self.domain_lower = np.asarray(domain_bounds[0], dtype=float)
+        self.domain_upper = np.asarray(domain_bounds[1], dtype=float)
+
+    def owner(self, positions):
+        """
+        Subdomain index that owns each position.
+        :param positions: numpy array of shape (N, 3)
+        :return: integer numpy array of shape (N,)
+        """
+        return np.searchsorted(self.interior_edges, positions[:, self.axis], side='right')
+
+    def subdomain_bounds(self, rank):
+        """Return the (lower, upper) corners of a subdomain, clipped to the particle domain."""
+        lower = self.domain_lower.copy()
+        upper = self.domain_upper.copy()
+        edges = np.concatenate(([-np.inf], self.interior_edges, [np.inf]))
+        lower[self.axis] = np.clip(edges[rank], self.domain_lower[self.axis], self.domain_upper[self.axis])
+        upper[self.axis] = np.clip(edges[rank + 1], self.domain_lower[self.axis], self.domain_upper[self.axis])
+        return lower, upper
+
+    def particle_shares(self, num_particles):
+        """
+        Split the particle count between subdomains in proportion to their volume.
+        :return: list of per-subdomain particle counts summing to num_particles
+        """
+        lengths = np.array([
+            np.subtract(*self.subdomain_bounds(rank)[::-1])[self.axis]
+            for rank in range(self.num_subdomains)
+        ])
+        exact = num_particles * lengths / lengths.sum()
+        shares = np.floor(exact).astype(int)
+        # Largest remainder rounding
+        for rank in np.argsort(exact - shares)[::-1][:num_particles - shares.sum()]:
+            shares[rank] += 1
+        return shares.tolist()
+
+
+class SubdomainWorker:
+    """
+    Owns the particles, chemistry and mixing of one subdomain. Runs inside a
+    worker process and answers commands from DomainDecomposedEngine.
+    """
+
+    def __init__(self, rank, config, seed_sequence, decomposition):
+        self.rank = rank
+        self.decomposition = decomposition
+        bounds = decomposition.subdomain_bounds(rank)
+        self.engine = SimulationEngine(config, seed_sequence=seed_sequence, particle_bounds=bounds)
+        self.memory_accountant = None
+
+    def memory(self):
+        """Measure the memory footprint of this worker process."""
+        if self.memory_accountant is None:
+            self.memory_accountant = MemoryAccountant(self.engine.config)
+        return self.memory_accountant.measure(self.engine)
+
+    def update_fluid_field(self, time):
+        self.engine.time = time
+        self.engine.fluid_solver.update_flow_field(time)
+
+    def set_time_step(self, time_step):
+        self.engine.time_step = time_step
+
+    def max_velocity(self):
+        """Return the fastest interpolated particle velocity as an array of shape (1, 3)."""
+        positions = self.engine.particle_manager.particle_positions()
+        if len(positions) == 0:
+            return np.zeros((0, 3))
+        velocities = self.engine.fluid_solver.get_velocities_at(positions)
+        return velocities[[np.argmax(np.linalg.norm(velocities, axis=1))]]
+
+    def transport(self, time_step):
+        """Move particles and pack those that left the subdomain, one batch per destination."""
+        self.engine.transport_particles(time_step)
+        manager = self.engine.particle_manager
+        owners = self.decomposition.owner(manager.particle_positions())
+        outgoing = {}
+        leaving = np.flatnonzero(owners != self.rank)
+        if len(leaving) == 0:
+            return outgoing
+        destinations = owners[leaving]
+        payload = manager.pack_particles(leaving)
+        for destination in np.unique(destinations):
+            selected = destinations == destination
+            outgoing[int(destination)] = {
+                'names': payload['names'],
+                **{key: payload[key][selected] for key in ('positions', 'velocities', 'weights', 'values', 'ids')}
+            }
+        return outgoing
+
+    def receive(self, payloads):
+        for payload in payloads:
+            self.engine.particle_manager.unpack_particles(payload)
+        return len(self.engine.particle_manager.particles)
+
+    def weighted_sums(self):
+        """Return the local weight and weighted scalar sums for the global mean."""
+        manager = self.engine.particle_manager
+        sums = {}
+        for particle in manager.particles:
+            for scalar, value in particle.properties.items():
+                sums[scalar] = sums.get(scalar, 0.0) + particle.weight * value
+        thermo = self.engine.thermo
+        if thermo is not None and manager.particles:
+            enthalpies = thermo.mixture_enthalpy(
+                manager.scalar_array(['temperature'])[:, 0], manager.scalar_array(thermo.species_names)
+            )
+            sums['enthalpy'] = float(np.sum(manager.particle_weights() * enthalpies))
+        return manager.total_weight(), sums
+
+    def mix(self, time_step, mean_properties):
+        self.engine.mix_particles(time_step, mean_properties)
+        return self.engine.max_mixing_rate
+
+    def react(self, time_step):
+        """Return the largest relative chemistry change over time_step, rescaled by the coordinator."""
+        return self.engine.react_particle_group(self.engine.particle_manager.particles, time_step)
+
+    def control_population(self):
+        self.engine.particle_manager.control_population(self.engine.fluid_solver)
+
+    def sort_particles(self):
+        self.engine.particle_manager.sort_particles(self.engine.fluid_solver)
+
+    def statistics(self, scalar_name):
+        """Return (total weight, weighted mean, weighted sum of squared deviations)."""
+        manager = self.engine.particle_manager
+        if not manager.particles:
+            return 0.0, 0.0, 0.0
+        values, weights = manager.scalar_values_and_weights(scalar_name)
+        total_weight = np.sum(weights)
+        mean_value = np.sum(weights * values) / total_weight
+        return total_weight, mean_value, np.sum(weights * (values - mean_value) ** 2)
+
+    def samples(self, scalar_names):
+        return self.engine.particle_samples(scalar_names)
+
+    def count(self):
+        return self.engine.total_particle_count()
+
+    def final_state(self):
+        return self.engine.final_state()
+
+
+def subdomain_worker_main(rank, config, seed_sequence, decomposition, connection):
+    """Entry point of a worker process: execute commands until 'stop'."""
+    try:
+        worker = SubdomainWorker(rank, config, seed_sequence, decomposition)
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+        return
+    connection.send(('ready', None))
+    while True:
+        command, args = connection.recv()
+        if command == 'stop':
+            worker.engine.close()
+            connection.send(('ok', None))
+            break
+        try:
+            connection.send(('ok', getattr(worker, command)(*args)))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+
+
+class DomainDecomposedEngine(SimulationEngine):
+    """
+    Runs the simulation with the flow grid split into slabs, one worker process
+    per slab. Each worker holds its own particles, chemistry and mixing model;
+    particles that cross a slab boundary during transport are migrated in one
+    batch per destination, and the means and statistics are reduced across
+    workers. Time stepping, operator splitting and exports stay in this process.
+
+    Without flow field sharing every worker loads its own copy of the full flow
+    field, not only its slab, so the flow field's memory grows with the number
+    of workers (and the memory projection counts num_workers copies). Setting
+    'flow_field_sharing' makes the workers attach to one node-wide copy instead.
+    """
+
+    def initialize_components(self, seed_sequence=None, particle_bounds=None):
+        config = self.config
+        settings = config.get('domain_decomposition', {})
+        num_workers = settings.get('num_workers', mp.cpu_count())
+        axis = settings.get('axis', 0)
+
+        # Only the grid is needed here; the workers load (or attach to) the full flow field
+        self.fluid_solver = load_flow_grid(config['flow_field_file'])
+        self.decomposition = SlabDecomposition(self.fluid_solver, num_workers, axis)
+        shares = self.decomposition.particle_shares(config.get('num_particles', 100))
+        seed_sequences = spawn_seed_sequences(config.get('seed'), num_workers)
+        self.population_controller_settings = config.get('population_control', {})
+        self.particle_ordering = MortonOrdering(config)
+
+        if config.get('chemistry_model', 'detailed') == 'tabulated':
+            # Build the table once here: the daemonic workers cannot start a generation
+            # pool, and would otherwise all generate the same table at once
+            TabulatedChemistry(config)
+
+        context = mp.get_context(settings.get('start_method'))
+        self.connections = []
+        self.processes = []
+        self.failed_ranks = set()
+        self.completed_state = None
+        for rank in range(num_workers):
+            # Interleaved particle IDs stay unique across workers
+            worker_config = dict(config, num_particles=shares[rank], particle_ids={'start': rank, 'stride': num_workers})
+            # The memory footprint of all workers is projected and reported by this process,
+            # which collects the workers' own measurements
+            worker_config['memory_accounting'] = dict(config.get('memory_accounting', {}), enabled=False)
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=subdomain_worker_main,
+                args=(rank, worker_config, seed_sequences[rank], self.decomposition, child_connection),
+                daemon=True,
+            )
+            process.start()
+            # Only the worker holds the child end, so its exit is seen here as EOF
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+        self.metrics.worker_pids = [process.pid for process in self.processes]
+        self.gather_replies()
+
+    def create_blocked_pipeline(self):
+        """Blocked execution does not apply: the workers run each stage on command."""
+        return None
+
+    def broadcast(self, command, *args):
+        """Send the same command to every worker and return their replies."""
+        for connection in self.connections:
+            connection.send((command, args))
+        return self.gather_replies()
+
+    def scatter(self, command, per_worker_args):
+        """Send a command with worker-specific arguments and return their replies."""
+        for connection, args in zip(self.connections, per_worker_args):
+            connection.send((command, args))
+        return self.gather_replies()
+
+    def gather_replies(self):
+        replies = []
+        errors = []
+        for rank, connection in enumerate(self.connections):
+            try:
+                status, result = connection.recv()
+            except EOFError:
+                status, result = 'error', "the worker process exited unexpectedly"
+            if status == 'error':
+                errors.append(f"Worker {rank} failed:\n{result}")
+                self.failed_ranks.add(rank)
+            replies.append(result)
+        if errors:
+            self.shutdown()
+            raise RuntimeError('\n'.join(errors))
+        return replies
+
+    def run(self):
+        try:
+            super().run()
+            # The workers stop with the run, so keep their particles for final_state
+            self.completed_state = self.final_state()
+        finally:
+            self.shutdown()
+
+    def worker_memory(self):
+        if not self.connections:
+            return []
+        return self.broadcast('memory')
+
+    def final_state(self):
+        if not self.connections:
+            return self.completed_state
+        states = [state for state in self.broadcast('final_state') if state['names']]
+        if not states:
+            return {'time': self.time, 'names': [], 'positions': np.zeros((0, 3)), 'velocities': np.zeros((0, 3)),
+                    'weights': np.zeros(0), 'values': np.zeros((0, 0)), 'ids': np.zeros(0, dtype=np.int64)}
+        names = states[0]['names']
+        merged = {'time': self.time, 'names': names}
+        for key in ('positions', 'velocities', 'weights', 'ids'):
+            merged[key] = np.concatenate([state[key] for state in states])
+        merged['values'] = np.vstack([
+            state['values'][:, [state['names'].index(name) for name in names]] for state in states
+        ])
+        return merged
+
+    def shutdown(self):
+        """Stop all worker processes."""
+        for rank, (connection, process) in enumerate(zip(self.connections, self.processes)):
+            if process.is_alive():
+                try:
+                    connection.send(('stop', ()))
+                    # A worker that reported an error may have exited already; don't wait for its reply
+                    if rank not in self.failed_ranks:
+                        connection.recv()
+                except (EOFError, OSError, BrokenPipeError):
+                    pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
+
+    def close(self):
+        self.shutdown()
+        self.data_exporter.close()
+
+    def update_fluid_field(self):
+        self.broadcast('update_fluid_field', self.time)
+
+    def select_time_step(self):
+        # The workers report their fastest particle; the controller only needs the maximum
+        velocities = np.vstack(self.broadcast('max_velocity') + [np.zeros((0, 3))])
+        previous_time_step = self.proposed_time_step if self.current_step > 0 else None
+        self.proposed_time_step = self.time_step_controller.propose_time_step(
+            previous_time_step, velocities, self.max_mixing_rate, self.chemistry_relative_change
+        )
+        end_time = self.time_step_controller.clip_to_boundaries(
+            self.time, self.proposed_time_step, (self.next_export_time, self.total_time)
+        )
+        self.time_step = end_time - self.time
+        self.broadcast('set_time_step', self.time_step)
+        return end_time
+
+    def transport_particles(self, time_step):
+        outgoing = self.broadcast('transport', time_step)
+        incoming = [[] for _ in self.connections]
+        for batches in outgoing:
+            for destination, payload in batches.items():
+                incoming[destination].append(payload)
+        self.scatter('receive', [(payloads,) for payloads in incoming])
+
+    def mix_particles(self, time_step, mean_properties=None):
+        if mean_properties is None:
+            mean_properties = self.global_mean_properties()
+        self.max_mixing_rate = max(self.broadcast('mix', time_step, mean_properties))
+
+    def global_mean_properties(self):
+        total_weight = 0.0
+        total_sums = {}
+        for weight, sums in self.broadcast('weighted_sums'):
+            total_weight += weight
+            for scalar, value in sums.items():
+                total_sums[scalar] = total_sums.get(scalar, 0.0) + value
+        return {scalar: value / total_weight for scalar, value in total_sums.items()}
+
+    def process_reactions(self, time_step):
+        # The maximum over all particles, per macro step, as in the serial engine
+        self.chemistry_relative_change = self.macro_step_change(max(self.broadcast('react', time_step)), time_step)
+
+    def control_population(self):
+        settings = self.population_controller_settings
+        if settings.get('enabled', False) and self.current_step % settings.get('interval', 1) == 0:
+            self.broadcast('control_population')
+
+    def sort_particles(self):
+        if self.particle_ordering.due(self.current_step):
+            self.broadcast('sort_particles')
+
+    def reduced_statistics(self, scalar_name):
+        """Combine per-worker weighted moments (Chan et al. parallel variance)."""
+        total_weight, mean_value, m2 = 0.0, 0.0, 0.0
+        for weight, local_mean, local_m2 in self.broadcast('statistics', scalar_name):
+            if weight == 0:
+                continue
+            combined_weight = total_weight + weight
+            delta = local_mean - mean_value
+            mean_value += delta * weight / combined_weight
+            m2 += local_m2 + delta ** 2 * total_weight * weight / combined_weight
+            total_weight = combined_weight
+        return total_weight, mean_value, m2
+
+    def compute_scalar_variance(self, scalar_name):
+        total_weight, _, m2 = self.reduced_statistics(scalar_name)
+        return m2 / total_weight
+
+    def compute_mean_scalar(self, scalar_name):
+        return self.reduced_statistics(scalar_name)[1]
+
+    def compute_rms_scalar(self, scalar_name):
+        return self.compute_scalar_variance(scalar_name) ** 0.5
+
+    def particle_samples(self, scalar_names):
+        replies = self.broadcast('samples', scalar_names)
+        positions = np.vstack([reply[0] for reply in replies])
+        samples = {name: np.concatenate([reply[1][name] for reply in replies]) for name in scalar_names}
+        return positions, samples
+
+    def total_particle_count(self):
+        return sum(self.broadcast('count'))
@@ -9,8 +9,16 @@ from fluid_solver.solver_interface import FluidSolverInterface
 from micromixing.adaptive_micromixing import AdaptiveMicromixingModel
 from tensor_utils.tensor_calculus import TensorCalculus
 from chemistry.kinetics import ChemicalKinetics
+from chemistry.tabulated_chemistry import TabulatedChemistry
+from chemistry.thermo import NasaThermo
 from monte_carlo.monte_carlo_simulation import MonteCarloSimulation
 from data_io.output_handler import LatexDataExporter
+from core.time_step_controller import AdaptiveTimeStepController
+from core.operator_splitting import OperatorSplitting
+from core.blocked_pipeline import BlockedPipeline
+from core.telemetry import SimulationMetrics, TelemetryServer
+from core.steady_state import SteadyStateMonitor
+from core.memory_accounting import MemoryAccountant
 
 from micromixing.iem_model import IEMModel
 from micromixing.curl_model import CurlModel
@@ -18,14 +26,15 @@ from micromixing.modified_curl_model import ModifiedCurlModel
 from micromixing.adaptive_micromixing import AdaptiveMicromixingModel
 
 class SimulationEngine:
-    def __init__(self, config):
+    def __init__(self, config, seed_sequence=None, particle_bounds=None):
         # Store configuration and initialize timing
         self.config = config
         self.time = 0.0  # Simulation start time
         self.start_time = time.time()  # Capture start time for computational timing
         self.time_step = config['time_step']
+        # Unclipped step the controller proposed; the base for the next step's growth
+        self.proposed_time_step = self.time_step
         self.total_time = config['total_time']
-        self.num_steps = int(self.total_time / self.time_step)
         self.current_step = 0
         self.last_export_time = 0.0  # Initialize export timing
         
@@ -39,19 +48,81 @@ class SimulationEngine:
         
         # Initialize LatexDataExporter with export directory
         export_directory = config.get('export_directory', 'latex_input')
-        self.data_exporter = LatexDataExporter(self.simulation_label, export_directory=export_directory)
+        # Particle snapshots (with particle IDs) are written to output_file at every export if enabled
+        self.write_snapshots = config.get('snapshots', {}).get('enabled', False)
+        self.data_exporter = LatexDataExporter(
+            self.simulation_label, export_directory=export_directory,
+            output_file=config.get('output_file', 'simulation_output.h5') if self.write_snapshots else None,
+        )
         
         # Set export interval and single-point export interval
         self.export_interval = config.get('export_interval', 0.1)
         self.single_point_export_interval = config.get('single_point_export_interval', 10)  # Default to every 10 steps
+
+        # Live metrics, served over a local endpoint while the run is in progress if telemetry is enabled
+        self.metrics = SimulationMetrics()
+        self.telemetry = TelemetryServer.from_config(config, self.metrics)
         
+        # Project the memory footprint and check it against the budget before allocating anything large
+        self.memory_accountant = MemoryAccountant.from_config(config)
+        if self.memory_accountant is not None:
+            self.memory_accountant.project()
+            self.memory_accountant.check_budget()
+
         # Initialize other components for simulation
-        self.particle_manager = ParticleManager(config)
+        self.initialize_components(seed_sequence, particle_bounds)
+
+        # Time-step control: the step is chosen each iteration and exports are
+        # scheduled in simulated time
+        self.time_step_controller = AdaptiveTimeStepController(config)
+        self.time_step_controller.set_grid_spacing(self.fluid_solver)
+        self.next_export_time = self.export_interval
+        self.max_mixing_rate = 0.0
+        self.chemistry_relative_change = 0.0
+        self.time_tolerance = 1e-12 * max(self.total_time, 1.0)
+
+        # Operator splitting between the transport, mixing and chemistry stages
+        self.operator_splitting = OperatorSplitting(config)
+        self.stage_functions = {
+            'transport': self.transport_particles,
+            'mixing': self.mix_particles,
+            'chemistry': self.process_reactions,
+        }
+        self.blocked_pipeline = self.create_blocked_pipeline()
+
+        # The run ends at total_time, or earlier once the tracked statistics are steady
+        self.steady_state = SteadyStateMonitor.from_config(config)
+        self.stop_reason = None
+
+        if self.memory_accountant is not None:
+            self.report_memory()
+
+    def initialize_components(self, seed_sequence=None, particle_bounds=None):
+        """
+        Create the particle, flow, chemistry and mixing components.
+        :param seed_sequence: optional SeedSequence for the particle random streams
+        :param particle_bounds: optional (lower, upper) corners of the initial particle box
+        """
+        config = self.config
+        self.particle_manager = ParticleManager(config, seed_sequence=seed_sequence, bounds=particle_bounds)
         self.fluid_solver = FluidSolverInterface(config)
         self.tensor_calculus = TensorCalculus(config)
-        self.chemistry = ChemicalKinetics(config)
+        if config.get('chemistry_model', 'detailed') == 'tabulated':
+            self.chemistry = TabulatedChemistry(config)
+        else:
+            self.chemistry = ChemicalKinetics(config)
         self.monte_carlo = MonteCarloSimulation(config)
 
+        # Mix enthalpy rather than temperature, if configured
+        enthalpy_mixing = config.get('enthalpy_mixing', {})
+        self.thermo = None
+        if enthalpy_mixing.get('enabled', False):
+            self.thermo = NasaThermo(
+                self.particle_manager.gas,
+                tolerance=enthalpy_mixing.get('tolerance', 1e-6),
+                max_iterations=enthalpy_mixing.get('max_iterations', 50),
+            )
+
         # Initialize micromixing model based on config
         model_type = config.get("micromixing_model", "adaptive")
         if model_type == "iem":
@@ -63,97 +134,323 @@ class SimulationEngine:
         else:
             self.micromixing_model = AdaptiveMicromixingModel(config)
 
-
     def collect_data(self):
         """Collects and exports continuous and single-point metrics once per interval."""
 
-        # Continuous metrics - export once per interval
-        if self.time - self.last_export_time >= self.export_interval:
-            particles = self.particle_manager.particles
+        # Continuous metrics - export once per interval of simulated time
+        if self.time >= self.next_export_time - self.time_tolerance or self.stop_reason == 'steady_state':
             scalar_variance = self.compute_scalar_variance('temperature')
             mean_temperature = self.compute_mean_scalar('temperature')
             rms_temperature = self.compute_rms_scalar('temperature')
             co_concentration = self.compute_mean_scalar('CO')
+            positions, samples = self.particle_samples(('temperature', 'CO'))
             
             # Prepare data for exports
             variance_data = [(self.time, scalar_variance)]
-            mean_temp_data = [(p.position[0], p.properties['temperature']) for p in particles]
-            rms_temp_data = [(p.position[1], p.properties['temperature']) for p in particles]
-            co_concentration_data = [(p.position[0], p.properties.get('CO', np.nan)) for p in particles]
+            mean_temp_data = list(zip(positions[:, 0], samples['temperature']))
+            rms_temp_data = list(zip(positions[:, 1], samples['temperature']))
+            co_concentration_data = list(zip(positions[:, 0], samples['CO']))
 
             # Export data
-            self.data_exporter.export_scalar_variance_decay(variance_data)
-            self.data_exporter.export_mean_temperature_profiles(mean_temp_data)
-            self.data_exporter.export_rms_temperature_fluctuations(rms_temp_data)
-            self.data_exporter.export_mean_co_concentration(co_concentration_data)
+            with self.metrics.export():
+                self.data_exporter.export_scalar_variance_decay(variance_data)
+                self.data_exporter.export_mean_temperature_profiles(mean_temp_data)
+                self.data_exporter.export_rms_temperature_fluctuations(rms_temp_data)
+                self.data_exporter.export_mean_co_concentration(co_concentration_data)
+                if self.write_snapshots:
+                    self.data_exporter.save_state(self.time, self.final_state())
             
+            if self.memory_accountant is not None:
+                self.report_memory()
+
             self.last_export_time = self.time  # Update last export time
+            while self.next_export_time <= self.time + self.time_tolerance:
+                self.next_export_time += self.export_interval
 
         # Single-point metrics - only export/update when the simulation completes or for specific intervals
-        if self.time >= self.total_time or self.current_step % self.single_point_export_interval == 0:
+        finished = self.stop_reason is not None
+        if self.time >= self.total_time or finished or self.current_step % self.single_point_export_interval == 0:
             total_computational_time = time.time() - self.start_time
-            particle_count_info = self.particle_manager.total_particle_count()
+            particle_count_info = self.total_particle_count()
             
             # Append single-point metrics
             self.data_exporter.append_single_data_point("computational_times.dat", "Total Computational Time", total_computational_time)
             self.data_exporter.append_single_data_point("particle_count.dat", "Total Particle Count", particle_count_info)
 
-    def transport_and_mix_particles(self):
-        self.particle_manager.move_particles(self.time_step, self.fluid_solver)
-
-        mean_properties = self.particle_manager.mean_scalar_values()
+        # Record why and when the run ended if it could have ended early
+        if finished and self.steady_state is not None:
+            self.data_exporter.append_single_data_point("termination_time.dat", "Termination Time", self.time)
+            self.data_exporter.append_single_data_point("termination_reason.dat", "Termination Reason", self.stop_reason)
 
-        # Apply the micromixing model to each pair or individual particle based on model type
-        for particle in self.particle_manager.particles:
-            position = particle.position
-            strain_tensor = self.tensor_calculus.compute_rate_of_strain(position, self.fluid_solver)
-            self.micromixing_model.apply_mixing(particle, strain_tensor, mean_properties)
+    def report_memory(self):
+        """Measure the memory footprint and write the memory report to the export directory."""
+        self.memory_accountant.report(self)
+        self.memory_accountant.export(self.data_exporter)
 
+    def worker_memory(self):
+        """Memory measurements of worker processes; a serial run has none."""
+        return []
 
     def run(self):
         print("Starting simulation...")
         start_time = time.time()
+        self.metrics.start_run(self.total_time, self.total_particle_count())
+        if self.telemetry is not None:
+            address = self.telemetry.start()
+            print(f"Serving telemetry metrics at {address}")
+        try:
+            self.run_steps()
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.stop()
+        print(f"\nSimulation completed in {time.time() - start_time:.2f} seconds.")
+
+    def run_steps(self):
         with tqdm(
-            total=self.num_steps,
-            desc=f't = {self.time:.2f}s)',
-            unit='step',
-            bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}] - Simulated Time: {postfix}'
+            total=self.total_time,
+            desc='Simulated time',
+            unit='s',
+            bar_format='{l_bar}{bar}| {n:.4f}/{total:.4f} s [{elapsed}<{remaining}] - dt: {postfix}'
         ) as pbar:
-            while self.time < self.total_time:
+            while self.time < self.total_time - self.time_tolerance:
                 self.update_fluid_field()
-                self.transport_and_mix_particles()
-                self.process_reactions()
-                self.collect_data()  # Collect all necessary data
-                self.time += self.time_step
+                end_time = self.select_time_step()
+                # Deferred stages catch up before every export, so snapshots hold the full state
+                self.advance_stages(flush=end_time >= min(self.next_export_time, self.total_time) - self.time_tolerance)
+                self.time = end_time
                 self.current_step += 1
-                pbar.set_postfix_str(f"{self.time:.2f}s")
-                pbar.update(1)
-        print(f"\nSimulation completed in {time.time() - start_time:.2f} seconds.")
+                self.control_population()
+                self.sort_particles()
+                if self.check_steady_state():
+                    self.stop_reason = 'steady_state'
+                elif self.time >= self.total_time - self.time_tolerance:
+                    self.stop_reason = 'total_time'
+                self.collect_data()  # Collect all necessary data
+                self.metrics.end_step(self.time, self.time_step, self.total_particle_count())
+                pbar.set_postfix_str(f"{self.time_step:.2e}s")
+                pbar.update(self.time - pbar.n)
+                if self.stop_reason == 'steady_state':
+                    print(f"\nStatistically steady state reached at t = {self.time:.6g} s.")
+                    break
+
+    def check_steady_state(self):
+        """Sample the steady state monitor if due and return True once the run may end early."""
+        monitor = self.steady_state
+        if monitor is None or not monitor.due(self.current_step):
+            return False
+        monitor.add_sample(self.time, {name: self.steady_state_quantity(name) for name in monitor.quantities})
+        # Stage time deferred by the operator splitting must be applied before the run ends
+        if any(self.operator_splitting.pending_time.values()):
+            return False
+        return monitor.converged()
+
+    def steady_state_quantity(self, name):
+        """Evaluate a tracked quantity such as 'mean_temperature' or 'variance_CO'."""
+        statistic, _, scalar_name = name.partition('_')
+        if statistic == 'mean':
+            return self.compute_mean_scalar(scalar_name)
+        if statistic == 'rms':
+            return self.compute_rms_scalar(scalar_name)
+        return self.compute_scalar_variance(scalar_name)
+
+    def select_time_step(self):
+        """
+        Choose the time step for the coming step and return the time it ends at.
+        The step is shortened to land exactly on the next export time or total_time;
+        the unclipped proposal is kept as the growth base, so a short landing step
+        does not cut the steps after it.
+        """
+        velocities = self.fluid_solver.get_velocities_at(self.particle_manager.particle_positions())
+        previous_time_step = self.proposed_time_step if self.current_step > 0 else None
+        self.proposed_time_step = self.time_step_controller.propose_time_step(
+            previous_time_step, velocities, self.max_mixing_rate, self.chemistry_relative_change
+        )
+        end_time = self.time_step_controller.clip_to_boundaries(
+            self.time, self.proposed_time_step, (self.next_export_time, self.total_time)
+        )
+        self.time_step = end_time - self.time
+        return end_time
+
+    def close(self):
+        """Release resources held by the components (e.g. a shared flow field)."""
+        self.fluid_solver.close()
+        self.data_exporter.close()
 
     def update_fluid_field(self):
         self.fluid_solver.update_flow_field(self.time)
 
-    def transport_and_mix_particles(self):
-        self.particle_manager.move_particles(self.time_step, self.fluid_solver)
+    def create_blocked_pipeline(self):
+        """Return the chunked stage pipeline if blocked execution is enabled, else None."""
+        settings = self.config.get('blocked_execution', {})
+        if not settings.get('enabled', False):
+            return None
+        return BlockedPipeline(self, settings.get('chunk_size', 1024))
+
+    def advance_stages(self, flush=False):
+        """
+        Run the transport, mixing and chemistry stages scheduled for this step.
+        :param flush: also run the stages deferred by the operator splitting
+        """
+        plan = self.operator_splitting.schedule(self.time_step, flush)
+        if not any(stage == 'chemistry' for stage, _, _ in plan):
+            self.metrics.record_chemistry_skip(self.metrics.particles)
+        if self.blocked_pipeline is not None:
+            self.blocked_pipeline.advance(plan)
+            return
+        for stage, stage_time_step, substeps in plan:
+            for _ in range(substeps):
+                with self.timed_stage(stage, self.metrics.particles):
+                    self.stage_functions[stage](stage_time_step / substeps)
+
+    def timed_stage(self, stage, num_particles):
+        """Return a context that records one stage call over num_particles particles in the metrics."""
+        if stage == 'chemistry':
+            self.metrics.record_chemistry(self.config.get('chemistry_model', 'detailed'), num_particles)
+        return self.metrics.stage(stage, num_particles)
+
+    def control_population(self):
+        controller = self.particle_manager.population_controller
+        if controller.enabled and self.current_step % controller.interval == 0:
+            self.particle_manager.control_population(self.fluid_solver)
+
+    def sort_particles(self):
+        """Reorder the particles along the Morton curve of the flow grid, if due."""
+        if self.particle_manager.ordering.due(self.current_step):
+            self.particle_manager.sort_particles(self.fluid_solver)
+
+    def transport_particles(self, time_step):
+        self.particle_manager.move_particles(time_step, self.fluid_solver)
+
+    def mix_particles(self, time_step, mean_properties=None):
+        if mean_properties is None:
+            mean_properties = self.mixing_means()
+        # Strain tensors of the whole population from one batched velocity evaluation, as in blocked execution
+        strains = self.tensor_calculus.compute_rates_of_strain(
+            self.particle_manager.particle_positions(), self.fluid_solver
+        )
+        self.max_mixing_rate = self.mix_particle_group(
+            self.particle_manager.particles, time_step, mean_properties, strains
+        )
+
+    def mixing_means(self):
+        """Return the mean scalars the particles mix towards (with the mean enthalpy for enthalpy mixing)."""
         mean_properties = self.particle_manager.mean_scalar_values()
-        for particle in self.particle_manager.particles:
-            S = self.tensor_calculus.compute_rate_of_strain(particle.position, self.fluid_solver)
-            self.micromixing_model.apply_mixing(particle, S, mean_properties)
+        if self.thermo is not None and self.particle_manager.particles:
+            manager = self.particle_manager
+            enthalpies = self.thermo.mixture_enthalpy(
+                manager.scalar_array(['temperature'])[:, 0], manager.scalar_array(self.thermo.species_names)
+            )
+            weights = manager.particle_weights()
+            mean_properties['enthalpy'] = float(np.sum(weights * enthalpies) / np.sum(weights))
+        return mean_properties
+
+    def mix_particle_group(self, particles, time_step, mean_properties, strains=None):
+        """
+        Mix the given particles towards the mean scalars.
+        :param strains: optional rate-of-strain tensors of the particles, shape (N, 3, 3)
+        :return: largest micromixing rate in the group
+        """
+        if self.thermo is not None:
+            return self.mix_enthalpy(particles, time_step, mean_properties, strains)
+        return self.apply_mixing_model(particles, time_step, mean_properties, strains)
 
-    def process_reactions(self):
-        self.chemistry.react_particles(self.particle_manager.particles)
+    def mix_enthalpy(self, particles, time_step, mean_properties, strains=None):
+        """
+        Mix the particle enthalpy instead of the temperature and recover the
+        temperature of the mixed state. The enthalpy (J/kg) is mixed as an
+        explicit 'enthalpy' scalar that exists only while the model runs.
+        :param mean_properties: mean scalars including the mean 'enthalpy'
+        :return: largest micromixing rate in the group
+        """
+        if not particles:
+            return 0.0
+        manager = self.particle_manager
+        species_names = self.thermo.species_names
+        temperatures = manager.scalar_array(['temperature'], particles)[:, 0]
+        enthalpies = self.thermo.mixture_enthalpy(temperatures, manager.scalar_array(species_names, particles))
+
+        manager.set_scalar('enthalpy', enthalpies, particles)
+        max_mixing_rate = self.apply_mixing_model(particles, time_step, mean_properties, strains)
+        mixed = manager.scalar_array(['enthalpy'] + species_names, particles)
+        for particle in particles:
+            del particle.properties['enthalpy']
+        manager.set_scalar(
+            'temperature', self.thermo.temperature_from_enthalpy(mixed[:, 0], mixed[:, 1:], temperatures), particles
+        )
+        return max_mixing_rate
+
+    def apply_mixing_model(self, particles, time_step, mean_properties, strains=None):
+        mixing_rates = []
+        for k, particle in enumerate(particles):
+            if strains is None:
+                S = self.tensor_calculus.compute_rate_of_strain(particle.position, self.fluid_solver)
+            else:
+                S = strains[k]
+            mixing_rates.append(self.micromixing_model.apply_mixing(particle, S, mean_properties, time_step))
+        return max((rate for rate in mixing_rates if rate is not None), default=0.0)
+
+    def process_reactions(self, time_step):
+        relative_change = self.react_particle_group(self.particle_manager.particles, time_step)
+        self.chemistry_relative_change = self.macro_step_change(relative_change, time_step)
+
+    def react_particle_group(self, particles, time_step):
+        """
+        Advance the chemistry of the given particles.
+        :return: largest relative chemistry change over time_step (0 unless adaptive time stepping is enabled)
+        """
+        if self.time_step_controller.enabled:
+            previous_state = self.time_step_controller.chemistry_state(particles)
+        self.chemistry.react_particles(particles, time_step)
+        if not self.time_step_controller.enabled:
+            return 0.0
+        current_state = self.time_step_controller.chemistry_state(particles)
+        return self.time_step_controller.relative_change(previous_state, current_state)
+
+    def macro_step_change(self, relative_change, time_step):
+        """
+        Express a relative chemistry change over time_step per proposed macro step, since
+        chemistry may run sub- or multi-cycled and the step taken may have been clipped to an export.
+        """
+        return relative_change * self.proposed_time_step / time_step
+
+    def final_state(self):
+        """
+        Return the particle state, e.g. to cache the result of a run.
+        :return: dict with time, scalar names and arrays of positions, velocities, weights, values and particle IDs
+        """
+        manager = self.particle_manager
+        names = list(manager.particles[0].properties) if manager.particles else []
+        return {
+            'time': self.time,
+            'names': names,
+            'positions': manager.particle_positions(),
+            'velocities': np.array([p.velocity for p in manager.particles], dtype=float).reshape(-1, 3),
+            'weights': manager.particle_weights(),
+            'values': manager.scalar_array(names),
+            'ids': manager.particle_ids(),
+        }
+
+    def particle_samples(self, scalar_names):
+        """
+        Return particle positions and per-particle values of the given scalars.
+        :return: tuple (positions of shape (N, 3), dict of scalar name -> array of shape (N,))
+        """
+        particles = self.particle_manager.particles
+        positions = self.particle_manager.particle_positions()
+        samples = {
+            name: np.array([p.properties.get(name, np.nan) for p in particles], dtype=float)
+            for name in scalar_names
+        }
+        return positions, samples
+
+    def total_particle_count(self):
+        return self.particle_manager.total_particle_count()
 
     def compute_scalar_variance(self, scalar_name):
-        values = [p.properties[scalar_name] for p in self.particle_manager.particles]
-        mean_val = sum(values) / len(values)
-        return sum((val - mean_val) ** 2 for val in values) / len(values)
+        return self.particle_manager.weighted_variance(scalar_name)
 
     def compute_mean_scalar(self, scalar_name):
-        values = [p.properties[scalar_name] for p in self.particle_manager.particles]
-        return sum(values) / len(values)
+        return self.particle_manager.weighted_mean(scalar_name)
 
     def compute_rms_scalar(self, scalar_name):
-        values = [p.properties[scalar_name] for p in self.particle_manager.particles]
-        mean_val = sum(values) / len(values)
-        return (sum((val - mean_val) ** 2 for val in values) / len(values)) ** 0.5
-
+        return self.particle_manager.weighted_variance(scalar_name) ** 0.5
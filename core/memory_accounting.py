@@ -0,0 +1,385 @@
+# core/memory_accounting.py
+
+import multiprocessing as mp
+import sys
+import tracemalloc
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from core.telemetry import resident_memory_bytes
+from particles.particle_manager import ParticleManager
+
+COMPONENTS = ('flow_field', 'particle_state', 'chemistry', 'export_buffers')
+MEGABYTE = 1024 ** 2
+
+
+def owned_arrays(obj, depth=2):
+    """
+    Yield the numpy arrays reachable from an object's attributes (and from
+    lists, tuples and dicts of them, e.g. the grid and values of an interpolator).
+    """
+    if isinstance(obj, np.ndarray):
+        yield obj
+        return
+    if depth < 0:
+        return
+    if isinstance(obj, dict):
+        items = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        items = obj
+    elif hasattr(obj, '__dict__'):
+        items = vars(obj).values()
+    else:
+        return
+    for item in items:
+        yield from owned_arrays(item, depth - 1)
+
+
+def array_bytes(*objects):
+    """Bytes of the distinct array buffers reachable from the objects; shared buffers count once."""
+    buffers = {}
+    for obj in objects:
+        for array in owned_arrays(obj):
+            owner = array
+            while isinstance(owner.base, np.ndarray):
+                owner = owner.base
+            buffers[id(owner)] = owner.nbytes
+    return sum(buffers.values())
+
+
+def particle_bytes(particle, seen=None):
+    """
+    Resident bytes of one particle: the object, its position and velocity and its
+    scalars. Scalars in memmap rows are file backed and not counted.
+    :param seen: set of ids of scalar objects already counted (e.g. floats shared
+                 by particles that have not reacted yet)
+    """
+    seen = set() if seen is None else seen
+    size = sys.getsizeof(particle) + sys.getsizeof(vars(particle))
+    for array in (particle.position, particle.velocity):
+        size += sys.getsizeof(array) + (array.nbytes if array.base is not None else 0)
+
+    def scalar_bytes(values):
+        total = 0
+        for value in values:
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+        return total
+
+    properties = particle.properties
+    if isinstance(properties, dict):
+        return size + sys.getsizeof(properties) + scalar_bytes(properties.values())
+    size += sys.getsizeof(properties) + sys.getsizeof(properties.values)
+    if properties.slot is None and properties.values.base is not None:
+        size += properties.values.nbytes
+    if properties.sparse:
+        size += sys.getsizeof(properties.sparse) + scalar_bytes(properties.sparse.values())
+    return size
+
+
+def traced_bytes(function):
+    """Return (result, bytes still allocated) of a call, measured with tracemalloc."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def traced_peak_bytes(function):
+    """Return the peak bytes allocated during a call, measured with tracemalloc."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+_export_bytes_per_particle = None
+
+
+def export_bytes_per_particle(num_samples=2000):
+    """
+    Peak bytes per particle of the buffers one continuous export builds (particle
+    samples, row lists and data frames, as in SimulationEngine.collect_data),
+    measured once per process.
+    """
+    global _export_bytes_per_particle
+    if _export_bytes_per_particle is None:
+        positions = np.random.default_rng(0).random((num_samples, 3))
+        samples = {'temperature': positions[:, 0] * 1000.0, 'CO': positions[:, 1] * 0.01}
+
+        def build_buffers():
+            sampled = (positions.copy(), {name: values.copy() for name, values in samples.items()})
+            rows = [
+                list(zip(sampled[0][:, 0], sampled[1]['temperature'])),
+                list(zip(sampled[0][:, 1], sampled[1]['temperature'])),
+                list(zip(sampled[0][:, 0], sampled[1]['CO'])),
+            ]
+            frame = pd.DataFrame(rows[0], columns=['x', 'value']).dropna().sort_values(by='x')
+            return sampled, rows, frame
+
+        _export_bytes_per_particle = traced_peak_bytes(build_buffers) / num_samples
+    return _export_bytes_per_particle
+
+
+class MemoryAccountant:
+    """
+    Projects and measures the memory footprint of a run by component: the flow
+    field (velocity arrays and interpolators), the particle state, chemistry
+    caches (tables, thermodynamic coefficients) and export buffers.
+
+    Before the components are created, the footprint of the full run is
+    projected: flow field arrays from the dataset shapes in the flow field file,
+    particle bytes from a probe population measured with tracemalloc, and the
+    particle count from num_particles (raised to what population control may
+    split up to). If the projected resident size exceeds budget_mb the run
+    fails at once instead of being killed by the OS hours later. At startup and
+    at every export interval the actual footprint is measured from the
+    component arrays, a sample of particles and the process RSS; the remainder
+    of the RSS (interpreter, libraries, Cantera's native state) is reported as
+    unaccounted. Memmap-backed particle state is file backed and reported
+    separately from the resident total.
+
+    Configuration ('memory_accounting'):
+        enabled           project, check and report the memory footprint
+        budget_mb         resident memory budget of the run (null for no check)
+        tracemalloc       keep tracemalloc running to report traced Python allocations
+        probe_particles   particles created to project the bytes per particle
+        sample_particles  particles sampled to measure the bytes per particle
+    """
+
+    def __init__(self, config):
+        settings = config.get('memory_accounting', {})
+        self.config = config
+        self.budget_mb = settings.get('budget_mb')
+        self.trace = settings.get('tracemalloc', False)
+        self.probe_particles = settings.get('probe_particles', 256)
+        self.sample_particles = settings.get('sample_particles', 256)
+        if self.probe_particles < 1 or self.sample_particles < 1:
+            raise ValueError("memory_accounting probe_particles and sample_particles must be at least 1.")
+        self.projection = None
+        self.reports = []
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the configured accountant, or None if memory accounting is disabled."""
+        if not config.get('memory_accounting', {}).get('enabled', False):
+            return None
+        return cls(config)
+
+    def num_processes(self):
+        """Processes that each hold the flow field and the Python runtime."""
+        settings = self.config.get('domain_decomposition', {})
+        if not settings.get('enabled', False):
+            return 1
+        return settings.get('num_workers') or mp.cpu_count()
+
+    def projected_particle_count(self):
+        """Particle count of the run; population control may split up to n_min particles into each occupied cell."""
+        num_particles = self.config.get('num_particles', 100)
+        settings = self.config.get('population_control', {})
+        if not settings.get('enabled', False):
+            return num_particles
+        with h5py.File(self.config['flow_field_file'], 'r') as f:
+            coarsening = settings.get('grid_coarsening', 1)
+            num_cells = np.prod([max(len(f[name][::coarsening]) - 1, 1) for name in ('x', 'y', 'z')])
+        return max(num_particles, settings.get('n_min', 2) * min(int(num_cells), num_particles))
+
+    def projected_flow_field_bytes(self):
+        """Bytes of the flow field arrays one process loads, from the dataset shapes."""
+        try:
+            with h5py.File(self.config['flow_field_file'], 'r') as f:
+                names = ['x', 'y', 'z', 'u', 'v', 'w']
+                size = sum(f[name].size * f[name].dtype.itemsize for name in names)
+                if self.config.get('flow_field_time_dependent', False):
+                    # Fields interpolated to the current time
+                    size += f['times'].size * f['times'].dtype.itemsize
+                    size += sum(f[name][0].size * 8 for name in ('u', 'v', 'w'))
+        except Exception as e:
+            raise IOError(f"Error reading flow field shapes for the memory projection: {e}")
+        if self.config.get('flow_field_sharing', {}).get('mode'):
+            # One node-wide copy, however many processes attach to it
+            return size / self.num_processes()
+        return size
+
+    def projected_chemistry_bytes(self, num_species):
+        """
+        Bytes of the chemistry table, estimated from its resolution, and of the
+        NASA-7 coefficients of enthalpy mixing. Cantera's native state is not included.
+        """
+        size = 0
+        if self.config.get('chemistry_model', 'detailed') == 'tabulated':
+            settings = self.config.get('tabulated_chemistry', {})
+            grid = settings.get('mixture_fraction_grid')
+            num_mixture_fractions = len(grid) if grid is not None else settings.get('mixture_fraction_points', 21)
+            # Temperature, mass fractions, source term and reactor time per table entry
+            size += num_mixture_fractions * settings.get('progress_points', 51) * (num_species + 3) * 8
+        if self.config.get('enthalpy_mixing', {}).get('enabled', False):
+            size += 2 * num_species * 6 * 8
+        return size
+
+    def projected_bytes_per_particle(self, manager):
+        """
+        Traced bytes per particle of a probe population whose scalars all differ,
+        as after a chemistry step.
+        :param manager: ParticleManager of the run's configuration without particles
+        :return: tuple (resident bytes, file-backed bytes) per particle
+        """
+        manager.config['num_particles'] = self.probe_particles
+        rng = np.random.default_rng(0)
+
+        def create_particles():
+            particles = manager.initialize_particles()
+            for particle in particles:
+                for name in list(particle.properties):
+                    value = particle.properties[name]
+                    # A new float object even for zeros, as chemistry produces
+                    particle.properties[name] = value * (1.0 + 1e-6 * rng.random())
+                particle.velocity = np.zeros(3)
+            return particles
+
+        particles, size = traced_bytes(create_particles)
+        file_backed = 0
+        layout = manager.state_layout
+        if layout is not None and layout.arena is not None:
+            file_backed = len(layout.names) * layout.dtype.itemsize
+        del particles
+        return size / self.probe_particles, file_backed
+
+    def project(self):
+        """
+        Project the footprint of the full run.
+        :return: dict of component bytes, 'resident' total, 'file_backed', 'num_particles' and 'bytes_per_particle'
+        """
+        num_processes = self.num_processes()
+        num_particles = self.projected_particle_count()
+        manager = ParticleManager(dict(self.config, num_particles=0))
+        particle_bytes_each, file_backed_each = self.projected_bytes_per_particle(manager)
+        export_bytes = export_bytes_per_particle()
+        baseline = resident_memory_bytes() or 0
+        projection = {
+            'flow_field': self.projected_flow_field_bytes() * num_processes,
+            'particle_state': particle_bytes_each * num_particles,
+            'chemistry': self.projected_chemistry_bytes(manager.gas.n_species) * num_processes,
+            'export_buffers': export_bytes * num_particles,
+            # Interpreter, libraries and mechanism, as loaded in this process so far
+            'runtime': baseline * num_processes,
+            'file_backed': file_backed_each * num_particles,
+            'num_particles': num_particles,
+            'bytes_per_particle': particle_bytes_each + export_bytes,
+        }
+        projection['resident'] = sum(projection[name] for name in COMPONENTS + ('runtime',))
+        self.projection = projection
+        parts = ', '.join(f"{name} {projection[name] / MEGABYTE:.1f} MB" for name in COMPONENTS + ('runtime',))
+        print(f"Projected memory footprint of {num_particles} particles: "
+              f"{projection['resident'] / MEGABYTE:.1f} MB ({parts})")
+        return projection
+
+    def check_budget(self, projection=None):
+        """Raise RuntimeError if the projected resident footprint exceeds the budget."""
+        projection = self.projection if projection is None else projection
+        if self.budget_mb is None or projection['resident'] <= self.budget_mb * MEGABYTE:
+            return
+        breakdown = ', '.join(
+            f"{name} {projection[name] / MEGABYTE:.1f} MB" for name in COMPONENTS + ('runtime',)
+        )
+        raise RuntimeError(
+            f"Projected memory footprint {projection['resident'] / MEGABYTE:.1f} MB of "
+            f"{projection['num_particles']} particles exceeds the budget of {self.budget_mb} MB ({breakdown})."
+        )
+
+    def measure(self, engine):
+        """
+        Measure the current footprint of an engine's components.
+        :return: dict of component bytes, 'rss', 'unaccounted', 'file_backed', 'num_particles',
+                 'bytes_per_particle' (None without local particles) and 'traced' (None unless tracing)
+        """
+        manager = getattr(engine, 'particle_manager', None)
+        particles = manager.particles if manager is not None else []
+        if particles:
+            step = max(1, len(particles) // self.sample_particles)
+            sample = particles[::step]
+            seen = set()
+            particle_bytes_each = sum(particle_bytes(particle, seen) for particle in sample) / len(sample)
+        else:
+            particle_bytes_each = None
+        export_bytes = export_bytes_per_particle()
+        num_particles = len(particles) if manager is not None else engine.total_particle_count()
+        file_backed = 0
+        if manager is not None and manager.state_layout is not None and manager.state_layout.arena is not None:
+            arena = manager.state_layout.arena
+            file_backed = sum(block.nbytes for block in arena.blocks)
+
+        measurement = {
+            'flow_field': array_bytes(engine.fluid_solver),
+            'particle_state': (particle_bytes_each or 0.0) * len(particles),
+            'chemistry': array_bytes(getattr(engine, 'chemistry', None), getattr(engine, 'thermo', None)),
+            'export_buffers': export_bytes * num_particles,
+            'file_backed': file_backed,
+            'num_particles': num_particles,
+            'bytes_per_particle': None if particle_bytes_each is None else particle_bytes_each + export_bytes,
+            'traced': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        }
+        measurement['rss'] = resident_memory_bytes() or 0
+        workers = engine.worker_memory()
+        if workers:
+            self.add_worker_measurements(measurement, workers, export_bytes)
+        measurement['unaccounted'] = max(measurement['rss'] - sum(measurement[name] for name in COMPONENTS), 0)
+        return measurement
+
+    @staticmethod
+    def add_worker_measurements(measurement, workers, export_bytes):
+        """
+        Add the footprints the worker processes of a decomposed run measured themselves.
+        The export buffers stay those of this process, which gathers the exports.
+        """
+        for name in ('flow_field', 'particle_state', 'chemistry', 'file_backed', 'rss'):
+            measurement[name] += sum(worker[name] for worker in workers)
+        num_particles = sum(worker['num_particles'] for worker in workers)
+        if num_particles:
+            measurement['bytes_per_particle'] = measurement['particle_state'] / num_particles + export_bytes
+        traced = [worker['traced'] for worker in workers if worker['traced'] is not None]
+        if traced:
+            measurement['traced'] = (measurement['traced'] or 0) + sum(traced)
+
+    def report(self, engine):
+        """Measure, print and record the footprint at the engine's current time."""
+        measurement = self.measure(engine)
+        measurement['time'] = engine.time
+        self.reports.append(measurement)
+        parts = ', '.join(f"{name} {measurement[name] / MEGABYTE:.1f} MB" for name in COMPONENTS)
+        print(f"Memory at t = {engine.time:.4g} s: RSS {measurement['rss'] / MEGABYTE:.1f} MB ({parts}, "
+              f"unaccounted {measurement['unaccounted'] / MEGABYTE:.1f} MB)")
+        return measurement
+
+    def export(self, data_exporter):
+        """Write the footprint history and the projected and actual bytes per particle."""
+        columns = ['Time', 'RSS', 'Flow Field', 'Particle State', 'Chemistry', 'Export Buffers', 'Unaccounted',
+                   'File Backed']
+        keys = ['time', 'rss', *COMPONENTS, 'unaccounted', 'file_backed']
+        data_exporter.export_data("memory_report.dat", columns, [[report[key] for key in keys] for report in self.reports])
+        if self.projection is not None:
+            data_exporter.append_single_data_point(
+                "bytes_per_particle_projected.dat", "Projected Bytes per Particle", self.projection['bytes_per_particle']
+            )
+        if self.reports and self.reports[-1]['bytes_per_particle'] is not None:
+            data_exporter.append_single_data_point(
+                "bytes_per_particle_actual.dat", "Actual Bytes per Particle", self.reports[-1]['bytes_per_particle']
+            )
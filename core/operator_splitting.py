@@ -0,0 +1,74 @@
+# core/operator_splitting.py
+
+class OperatorSplitting:
+    """
+    Schedules the transport, mixing and chemistry stages within one macro step.
+
+    Configuration ('operator_splitting'):
+        scheme     'lie' (A B C) or 'strang' (A/2 B/2 C B/2 A/2)
+        order      stage order, e.g. ["transport", "mixing", "chemistry"]
+        substeps   per-stage number of substeps inside each of its calls
+        intervals  per-stage number of macro steps to accumulate before the
+                   stage runs once over the accumulated time; deferred time
+                   is flushed on steps that end on an export or the end of the run
+    """
+
+    STAGES = ('transport', 'mixing', 'chemistry')
+    SCHEMES = ('lie', 'strang')
+
+    def __init__(self, config):
+        self.config = config
+        settings = config.get('operator_splitting', {})
+        self.scheme = settings.get('scheme', 'lie')
+        self.order = list(settings.get('order', self.STAGES))
+        substeps = settings.get('substeps', {})
+        intervals = settings.get('intervals', {})
+        self.substeps = {stage: int(substeps.get(stage, 1)) for stage in self.STAGES}
+        self.intervals = {stage: int(intervals.get(stage, 1)) for stage in self.STAGES}
+        self.validate()
+
+        # Time and macro steps accumulated by stages that run less often than every macro step
+        self.pending_time = {stage: 0.0 for stage in self.STAGES}
+        self.pending_steps = {stage: 0 for stage in self.STAGES}
+
+    def validate(self):
+        if self.scheme not in self.SCHEMES:
+            raise ValueError(f"Unknown operator splitting scheme '{self.scheme}'. Expected one of {self.SCHEMES}.")
+        if sorted(self.order) != sorted(self.STAGES):
+            raise ValueError(f"Operator splitting order must contain each of {self.STAGES} exactly once.")
+        for stage in self.STAGES:
+            if self.substeps[stage] < 1 or self.intervals[stage] < 1:
+                raise ValueError(f"Operator splitting substeps and intervals for '{stage}' must be at least 1.")
+
+    def segments(self, time_step):
+        """
+        Return the (stage, time step) sequence of one macro step before deferral.
+        """
+        if self.scheme == 'lie':
+            return [(stage, time_step) for stage in self.order]
+        outer = [(stage, 0.5 * time_step) for stage in self.order[:-1]]
+        return outer + [(self.order[-1], time_step)] + outer[::-1]
+
+    def schedule(self, time_step, flush=False):
+        """
+        Plan one macro step.
+        :param time_step: macro time step
+        :param flush: run every stage with its deferred time, e.g. on a step that ends
+                      on an export time or on the last step of the run
+        :return: list of (stage, stage time step, number of substeps)
+        """
+        due = {}
+        for stage in self.STAGES:
+            self.pending_steps[stage] += 1
+            due[stage] = flush or self.pending_steps[stage] >= self.intervals[stage]
+            if due[stage]:
+                self.pending_steps[stage] = 0
+        plan = []
+        for stage, stage_time_step in self.segments(time_step):
+            if not due[stage]:
+                self.pending_time[stage] += stage_time_step
+                continue
+            stage_time_step += self.pending_time[stage]
+            self.pending_time[stage] = 0.0
+            plan.append((stage, stage_time_step, self.substeps[stage]))
+        return plan
@@ -0,0 +1,323 @@
+# core/run_cache.py
+
+import copy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as np
+import cantera as ct
+import pandas as pd
+
+from data_io.output_handler import LatexDataExporter
+
+# Settings that only say where results go or how they are computed, not what they are
+RESULT_NEUTRAL_SETTINGS = (
+    ('run_cache',),
+    ('export_directory',),
+    ('output_file',),
+    ('flow_field_sharing',),
+    ('uncertainty_quantification',),
+    ('telemetry',),
+    ('tabulated_chemistry', 'cache_directory'),
+    ('tabulated_chemistry', 'num_workers'),
+)
+SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_EXCLUDED_DIRECTORIES = ('tests', 'benchmarks', '__pycache__')
+
+_code_version = None
+
+
+def code_version():
+    """
+    Hash of the simulation source files and the versions of the numerical libraries
+    (computed once per process).
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for directory, subdirectories, files in os.walk(SOURCE_ROOT):
+            subdirectories[:] = sorted(
+                name for name in subdirectories if name not in SOURCE_EXCLUDED_DIRECTORIES and not name.startswith('.')
+            )
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    path = os.path.join(directory, name)
+                    digest.update(os.path.relpath(path, SOURCE_ROOT).encode())
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        digest.update(f"cantera {ct.__version__} numpy {np.__version__}".encode())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def normalize(value):
+    """Normalize a config value so equal settings hash equally (e.g. 1 and 1.0)."""
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return str(value)
+
+
+class RunCache:
+    """
+    Content-addressed cache of finished runs.
+
+    A run is keyed by a hash of the normalized configuration (without the
+    output locations and other result-neutral settings), the contents of the
+    mechanism and flow field files and the code version. An entry holds the
+    run's exports and its final particle state; a run with a matching key
+    copies the exports into its export directory instead of simulating.
+    Files of single data points (label / value rows shared between runs) are
+    merged by label, as LatexDataExporter does. Entries are evicted least
+    recently used first when the cache exceeds its size or entry limit.
+    Runs without a seed are not reproducible and are never cached, nor are
+    runs that write particle snapshots.
+
+    Configuration ('run_cache'):
+        enabled      reuse and store runs
+        directory    cache directory
+        max_size_mb  size limit of all entries (null for no limit)
+        max_entries  entry limit (null for no limit)
+    """
+
+    def __init__(self, directory='run_cache', max_size_mb=None, max_entries=None):
+        self.directory = directory
+        self.max_size = None if max_size_mb is None else max_size_mb * 1024 ** 2
+        self.max_entries = max_entries
+        self.entries_directory = os.path.join(directory, 'entries')
+        self.checksum_file = os.path.join(directory, 'checksums.json')
+        os.makedirs(self.entries_directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the configured cache, or None if caching is disabled."""
+        settings = config.get('run_cache', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(settings.get('directory', 'run_cache'), settings.get('max_size_mb'), settings.get('max_entries'))
+
+    def file_checksum(self, path):
+        """
+        SHA-256 of a file. Checksums are remembered by path, size and
+        modification time, so large flow fields are only read once.
+        """
+        path = os.path.abspath(path)
+        status = os.stat(path)
+        stamp = [status.st_size, status.st_mtime_ns]
+        checksums = self.read_json(self.checksum_file, {})
+        if checksums.get(path, {}).get('stamp') == stamp:
+            return checksums[path]['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        checksums[path] = {'stamp': stamp, 'sha256': digest.hexdigest()}
+        self.write_json(self.checksum_file, checksums)
+        return checksums[path]['sha256']
+
+    def key(self, config):
+        """
+        Return the cache key of a run configuration, or None if the run is not reproducible.
+        """
+        if config.get('seed') is None:
+            return None
+        if config.get('snapshots', {}).get('enabled', False):
+            # Snapshots go to output_file, outside the exports an entry replays
+            return None
+        settings = copy.deepcopy(config)
+        for path in RESULT_NEUTRAL_SETTINGS:
+            section = settings
+            for name in path[:-1]:
+                section = section.get(name, {})
+            if isinstance(section, dict):
+                section.pop(path[-1], None)
+
+        # Input files enter by content rather than by path
+        mechanism_file = settings.pop('mechanism_file')
+        if os.path.exists(mechanism_file):
+            mechanism = self.file_checksum(mechanism_file)
+        else:
+            # A mechanism shipped with Cantera, covered by the Cantera version
+            mechanism = mechanism_file
+        flow_field = self.file_checksum(settings.pop('flow_field_file'))
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(normalize(settings), sort_keys=True).encode())
+        digest.update(f"mechanism {mechanism} flow field {flow_field} code {code_version()}".encode())
+        return digest.hexdigest()[:24]
+
+    def entry_path(self, key):
+        return os.path.join(self.entries_directory, key)
+
+    def lookup(self, key):
+        """Return the entry directory for key and mark it as used, or None on a miss."""
+        if key is None:
+            return None
+        path = self.entry_path(key)
+        manifest_file = os.path.join(path, 'manifest.json')
+        manifest = self.read_json(manifest_file, None)
+        if manifest is None:
+            return None
+        manifest['last_used'] = time.time()
+        self.write_json(manifest_file, manifest)
+        return path
+
+    def store(self, key, export_directory, state, single_point_files=()):
+        """
+        Store a finished run under key and evict old entries if over the limits.
+        :param export_directory: directory holding only this run's exports
+        :param state: final particle state from SimulationEngine.final_state
+        :param single_point_files: export files of label / value rows
+        """
+        staging = tempfile.mkdtemp(prefix=f".{key}.", dir=self.entries_directory)
+        try:
+            shutil.copytree(export_directory, os.path.join(staging, 'exports'))
+            self.write_state(os.path.join(staging, 'final_state.h5'), state)
+            size = sum(
+                os.path.getsize(os.path.join(directory, name))
+                for directory, _, files in os.walk(staging) for name in files
+            )
+            now = time.time()
+            self.write_json(os.path.join(staging, 'manifest.json'), {
+                'key': key,
+                'created': now,
+                'last_used': now,
+                'size': size,
+                'single_point_files': sorted(single_point_files),
+            })
+            try:
+                os.rename(staging, self.entry_path(key))
+            except OSError:
+                # Another process stored the same run first
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise IOError(f"Error storing run in cache: {e}")
+        self.evict()
+        return self.entry_path(key)
+
+    def entries(self):
+        """Return the manifests of all complete entries, least recently used first."""
+        manifests = []
+        for name in os.listdir(self.entries_directory):
+            if name.startswith('.'):
+                continue
+            manifest = self.read_json(os.path.join(self.entries_directory, name, 'manifest.json'), None)
+            if manifest is not None:
+                manifests.append(manifest)
+        return sorted(manifests, key=lambda manifest: manifest['last_used'])
+
+    def evict(self):
+        """Remove least recently used entries until the cache is within its limits."""
+        manifests = self.entries()
+        total_size = sum(manifest['size'] for manifest in manifests)
+        evicted = []
+        while manifests and (
+            (self.max_size is not None and total_size > self.max_size)
+            or (self.max_entries is not None and len(manifests) > self.max_entries)
+        ):
+            manifest = manifests.pop(0)
+            shutil.rmtree(self.entry_path(manifest['key']), ignore_errors=True)
+            total_size -= manifest['size']
+            evicted.append(manifest['key'])
+        return evicted
+
+    def replay_exports(self, key, export_directory):
+        """Copy a cached run's exports into export_directory."""
+        path = self.entry_path(key)
+        manifest = self.read_json(os.path.join(path, 'manifest.json'), {})
+        self.copy_exports(os.path.join(path, 'exports'), export_directory, manifest.get('single_point_files', ()))
+
+    @staticmethod
+    def copy_exports(source, export_directory, single_point_files=()):
+        """
+        Copy export files, merging files of single data points into existing ones by label.
+        """
+        os.makedirs(export_directory, exist_ok=True)
+        for name in sorted(os.listdir(source)):
+            if name in single_point_files:
+                rows = pd.read_csv(os.path.join(source, name), sep="\t", header=None).values
+                for label, data_point in rows:
+                    LatexDataExporter(label, export_directory).append_single_data_point(name, label, data_point)
+            else:
+                shutil.copy2(os.path.join(source, name), os.path.join(export_directory, name))
+
+    def run(self, config, create_engine):
+        """
+        Return the final state of the run described by config, simulating only on a cache miss.
+        :param create_engine: callable building an engine from a config, e.g. SimulationEngine
+        :return: tuple (final state dict, True if it came from the cache)
+        """
+        export_directory = config.get('export_directory', 'latex_input')
+        key = self.key(config)
+        if self.lookup(key) is not None:
+            self.replay_exports(key, export_directory)
+            return self.read_state(os.path.join(self.entry_path(key), 'final_state.h5')), True
+
+        if key is None:
+            engine = create_engine(config)
+            try:
+                engine.run()
+                return engine.final_state(), False
+            finally:
+                engine.close()
+
+        # Run into an empty export directory so the entry holds only this run's files
+        staging = tempfile.mkdtemp(prefix='exports.', dir=self.directory)
+        try:
+            engine = create_engine(dict(config, export_directory=staging))
+            try:
+                engine.run()
+                state = engine.final_state()
+                single_point_files = engine.data_exporter.single_point_files
+            finally:
+                engine.close()
+            self.copy_exports(staging, export_directory, single_point_files)
+            self.store(key, staging, state, single_point_files)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return state, False
+
+    @staticmethod
+    def write_state(path, state):
+        with h5py.File(path, 'w') as f:
+            f.attrs['time'] = state['time']
+            f.create_dataset('names', data=np.array(state['names'], dtype=h5py.string_dtype()))
+            for name in ('positions', 'velocities', 'weights', 'values', 'ids'):
+                f.create_dataset(name, data=state[name])
+
+    @staticmethod
+    def read_state(path):
+        try:
+            with h5py.File(path, 'r') as f:
+                state = {name: f[name][:] for name in ('positions', 'velocities', 'weights', 'values', 'ids')}
+                state['names'] = [name.decode() if isinstance(name, bytes) else name for name in f['names'][:]]
+                state['time'] = float(f.attrs['time'])
+        except Exception as e:
+            raise IOError(f"Error reading cached run state: {e}")
+        return state
+
+    @staticmethod
+    def read_json(path, default):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def write_json(path, data):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
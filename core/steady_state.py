@@ -0,0 +1,135 @@
+# core/steady_state.py
+
+import collections
+
+import numpy as np
+from scipy import stats
+
+STATIONARITY_TESTS = ('relative_change', 'batch_means')
+
+
+class SteadyStateMonitor:
+    """
+    Detects when the tracked scalar statistics have become statistically steady.
+
+    Every sample_interval steps the engine records statistics of the particle
+    population such as 'mean_temperature', 'variance_temperature' or 'mean_CO'.
+    The last window samples are tested for stationarity:
+
+    relative_change  the means of the first and second half of the window
+                     differ by less than the tolerance
+    batch_means      the window is split into num_batches batches; the
+                     Student-t confidence half width of the batch means and
+                     the drift between the window halves are both within the
+                     tolerance
+
+    The tolerance of a quantity is max(absolute_tolerance, relative_tolerance * |window mean|).
+    The run may end once every quantity passes and min_time has been simulated.
+
+    Configuration ('steady_state'):
+        enabled             end the run early at a statistically steady state
+        quantities          e.g. ["mean_temperature", "variance_temperature", "mean_CO"]
+        test                'relative_change' or 'batch_means'
+        window              number of samples tested
+        sample_interval     steps between samples
+        relative_tolerance  number or dict per quantity
+        absolute_tolerance  number or dict per quantity
+        num_batches         batches of the batch means test
+        confidence_level    confidence level of the batch means test
+        min_time            simulated time before the run may end early
+    """
+
+    STATISTICS = ('mean', 'variance', 'rms')
+
+    def __init__(self, config):
+        settings = config.get('steady_state', {})
+        self.quantities = list(settings.get('quantities', ['mean_temperature', 'variance_temperature', 'mean_CO']))
+        for name in self.quantities:
+            if name.partition('_')[0] not in self.STATISTICS or not name.partition('_')[2]:
+                raise ValueError(f"Unknown steady state quantity '{name}'. Expected one of "
+                                 f"{', '.join(self.STATISTICS)}_<scalar>.")
+        self.test = settings.get('test', 'relative_change')
+        if self.test not in STATIONARITY_TESTS:
+            raise ValueError(f"Unknown stationarity test '{self.test}'. Expected one of {STATIONARITY_TESTS}.")
+        self.window = settings.get('window', 20)
+        self.sample_interval = settings.get('sample_interval', 1)
+        self.relative_tolerance = settings.get('relative_tolerance', 1e-3)
+        self.absolute_tolerance = settings.get('absolute_tolerance', 0.0)
+        self.num_batches = settings.get('num_batches', 5)
+        self.confidence_level = settings.get('confidence_level', 0.95)
+        self.min_time = settings.get('min_time', 0.0)
+        if self.window < 2 or self.sample_interval < 1:
+            raise ValueError("Steady state window must be at least 2 and sample_interval at least 1.")
+        if self.test == 'batch_means' and not 2 <= self.num_batches <= self.window:
+            raise ValueError("Steady state num_batches must be between 2 and the window length.")
+
+        self.times = collections.deque(maxlen=self.window)
+        self.samples = collections.deque(maxlen=self.window)
+        self.converged_time = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the configured monitor, or None if steady state detection is disabled."""
+        if not config.get('steady_state', {}).get('enabled', False):
+            return None
+        return cls(config)
+
+    def due(self, step):
+        return step % self.sample_interval == 0
+
+    def tolerance(self, name, mean):
+        relative = self.relative_tolerance
+        absolute = self.absolute_tolerance
+        if isinstance(relative, dict):
+            relative = relative.get(name, 0.0)
+        if isinstance(absolute, dict):
+            absolute = absolute.get(name, 0.0)
+        return max(absolute, relative * abs(mean))
+
+    def add_sample(self, time, values):
+        """
+        Record the tracked quantities at a simulated time.
+        :param values: dict of quantity name -> value
+        """
+        self.times.append(time)
+        self.samples.append([values[name] for name in self.quantities])
+
+    def status(self):
+        """
+        Test the current window.
+        :return: dict of quantity name -> dict with 'mean', 'change', 'half_width',
+                 'tolerance' and 'steady', or None until the window is full
+        """
+        if len(self.samples) < self.window:
+            return None
+        samples = np.array(self.samples)
+        half = self.window // 2
+        means = samples.mean(axis=0)
+        changes = np.abs(samples[-half:].mean(axis=0) - samples[:half].mean(axis=0))
+        if self.test == 'batch_means':
+            batch_means = np.array([batch.mean(axis=0) for batch in np.array_split(samples, self.num_batches)])
+            quantile = stats.t.ppf(0.5 + 0.5 * self.confidence_level, self.num_batches - 1)
+            half_widths = quantile * batch_means.std(axis=0, ddof=1) / np.sqrt(self.num_batches)
+        else:
+            half_widths = np.zeros(len(self.quantities))
+        result = {}
+        for k, name in enumerate(self.quantities):
+            tolerance = self.tolerance(name, means[k])
+            result[name] = {
+                'mean': float(means[k]),
+                'change': float(changes[k]),
+                'half_width': float(half_widths[k]),
+                'tolerance': tolerance,
+                'steady': bool(changes[k] <= tolerance and half_widths[k] <= tolerance),
+            }
+        return result
+
+    def converged(self):
+        """Return True once every quantity is steady and min_time has passed."""
+        if not self.times or self.times[-1] < self.min_time:
+            return False
+        status = self.status()
+        if status is None or not all(entry['steady'] for entry in status.values()):
+            return False
+        self.converged_time = self.times[-1]
+        return True
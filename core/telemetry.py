@@ -0,0 +1,272 @@
+# core/telemetry.py
+
+import collections
+import contextlib
+import http.server
+import os
+import socketserver
+import sys
+import threading
+import time
+
+METRIC_PREFIX = 'iroh'
+
+
+def resident_memory_bytes(pid=None):
+    """
+    Resident set size of a process in bytes, or None if it cannot be read.
+    Reads /proc/<pid>/statm; without /proc, only the peak RSS of this process is available.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid is not None and pid != os.getpid():
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class SimulationMetrics:
+    """
+    Live counters and gauges of a running simulation.
+
+    The engine updates the metrics from the simulation thread; render() may be
+    called from the telemetry server thread at any time and returns a
+    consistent snapshot in the Prometheus text exposition format.
+    """
+
+    def __init__(self, step_window=20):
+        """
+        :param step_window: number of recent steps the step rate is averaged over
+        """
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.steps = 0
+        self.simulated_time = 0.0
+        self.total_time = 0.0
+        self.time_step = 0.0
+        self.particles = 0
+        self.step_times = collections.deque(maxlen=step_window + 1)
+        self.stage_particles = collections.defaultdict(int)
+        self.stage_seconds = collections.defaultdict(float)
+        self.stage_throughput = {}
+        self.step_stage_particles = collections.defaultdict(int)
+        self.step_stage_seconds = collections.defaultdict(float)
+        self.chemistry_integrations = collections.defaultdict(int)
+        self.chemistry_skips = 0
+        self.exports = 0
+        self.export_seconds = 0.0
+        self.exports_in_progress = 0
+        self.worker_pids = []
+
+    def start_run(self, total_time, num_particles):
+        with self.lock:
+            self.total_time = total_time
+            self.particles = num_particles
+            self.step_times.clear()
+            self.step_times.append(time.perf_counter())
+
+    @contextlib.contextmanager
+    def stage(self, stage, num_particles):
+        """Time one call of a stage over num_particles particles."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.step_stage_particles[stage] += num_particles
+                self.step_stage_seconds[stage] += elapsed
+
+    def record_chemistry(self, model, num_particles):
+        """Count particles whose chemistry was advanced by the given model ('detailed' or 'tabulated')."""
+        with self.lock:
+            self.chemistry_integrations[model] += num_particles
+
+    def record_chemistry_skip(self, num_particles):
+        """Count particles whose chemistry was deferred to a later macro step."""
+        with self.lock:
+            self.chemistry_skips += num_particles
+
+    @contextlib.contextmanager
+    def export(self):
+        """Track one export of data files."""
+        start = time.perf_counter()
+        with self.lock:
+            self.exports_in_progress += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.exports_in_progress -= 1
+                self.exports += 1
+                self.export_seconds += time.perf_counter() - start
+
+    def end_step(self, simulated_time, time_step, num_particles):
+        """Close a macro step: update the step rate and the per-stage throughput of this step."""
+        with self.lock:
+            self.steps += 1
+            self.simulated_time = simulated_time
+            self.time_step = time_step
+            self.particles = num_particles
+            self.step_times.append(time.perf_counter())
+            for stage, seconds in self.step_stage_seconds.items():
+                particles = self.step_stage_particles[stage]
+                self.stage_particles[stage] += particles
+                self.stage_seconds[stage] += seconds
+                self.stage_throughput[stage] = particles / seconds if seconds > 0 else 0.0
+            self.step_stage_particles.clear()
+            self.step_stage_seconds.clear()
+
+    def step_rate(self):
+        """Macro steps per wall-clock second over the recent steps."""
+        if len(self.step_times) < 2:
+            return 0.0
+        elapsed = self.step_times[-1] - self.step_times[0]
+        return (len(self.step_times) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {float(value)!r}" if label_text else f"{name} {float(value)!r}")
+
+        memory = [({'process': 'main'}, resident_memory_bytes())]
+        memory += [({'process': f"worker_{rank}"}, resident_memory_bytes(pid)) for rank, pid in enumerate(self.worker_pids)]
+
+        with self.lock:
+            metric('steps_total', 'counter', 'Macro steps completed.', [({}, self.steps)])
+            metric('step_rate', 'gauge', 'Macro steps per second over the recent steps.', [({}, self.step_rate())])
+            metric('simulated_time_seconds', 'gauge', 'Current simulated time.', [({}, self.simulated_time)])
+            metric('total_time_seconds', 'gauge', 'Simulated time at which the run ends.', [({}, self.total_time)])
+            metric('time_step_seconds', 'gauge', 'Time step of the last macro step.', [({}, self.time_step)])
+            metric('particles', 'gauge', 'Number of particles.', [({}, self.particles)])
+            metric('wall_time_seconds', 'gauge', 'Wall-clock time since the engine was created.',
+                   [({}, time.time() - self.start_time)])
+            metric('stage_particles_per_second', 'gauge', 'Particles processed per second by each stage in the last step.',
+                   [({'stage': stage}, value) for stage, value in sorted(self.stage_throughput.items())])
+            metric('stage_particles_total', 'counter', 'Particles processed by each stage.',
+                   [({'stage': stage}, value) for stage, value in sorted(self.stage_particles.items())])
+            metric('stage_seconds_total', 'counter', 'Wall-clock time spent in each stage.',
+                   [({'stage': stage}, value) for stage, value in sorted(self.stage_seconds.items())])
+            metric('chemistry_integrations_total', 'counter', 'Particle chemistry advances by chemistry model.',
+                   [({'model': model}, value) for model, value in sorted(self.chemistry_integrations.items())])
+            metric('chemistry_skips_total', 'counter',
+                   'Particle chemistry advances deferred by the operator splitting interval.', [({}, self.chemistry_skips)])
+            metric('export_queue_depth', 'gauge', 'Exports waiting or being written.', [({}, self.exports_in_progress)])
+            metric('exports_total', 'counter', 'Exports of data files written.', [({}, self.exports)])
+            metric('export_seconds_total', 'counter', 'Wall-clock time spent writing exports.', [({}, self.export_seconds)])
+        metric('resident_memory_bytes', 'gauge', 'Resident set size of the simulation processes.',
+               [(labels, value) for labels, value in memory if value is not None])
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise print over the progress bar
+        pass
+
+
+class TCPMetricsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixMetricsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            request, _ = super().get_request()
+            # BaseHTTPRequestHandler expects a (host, port) client address
+            return request, ('local', 0)
+
+
+class TelemetryServer:
+    """
+    Serves SimulationMetrics at /metrics over HTTP from a background thread.
+
+    The server listens on a local TCP address (loopback by default) or on a
+    Unix socket, so node monitoring (e.g. a Prometheus scraper) can follow long
+    runs without attaching a profiler. Only the standard library is used.
+
+    Configuration ('telemetry'):
+        enabled      serve metrics while the simulation runs
+        host         address to listen on
+        port         TCP port (0 picks a free port)
+        unix_socket  path of a Unix socket to listen on instead of host and port
+    """
+
+    def __init__(self, metrics, host='127.0.0.1', port=9464, unix_socket=None):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.server = None
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, config, metrics):
+        """Return the configured server, or None if telemetry is disabled."""
+        settings = config.get('telemetry', {})
+        if not settings.get('enabled', False):
+            return None
+        return cls(metrics, settings.get('host', '127.0.0.1'), settings.get('port', 9464), settings.get('unix_socket'))
+
+    @property
+    def address(self):
+        """Socket path or (host, port) the server listens on."""
+        if self.server is None:
+            return None
+        return self.unix_socket if self.unix_socket else self.server.server_address[:2]
+
+    def start(self):
+        try:
+            if self.unix_socket:
+                if not hasattr(socketserver, 'UnixStreamServer'):
+                    raise ValueError("Unix sockets are not available on this platform.")
+                if os.path.exists(self.unix_socket):
+                    os.remove(self.unix_socket)
+                self.server = UnixMetricsServer(self.unix_socket, MetricsRequestHandler)
+            else:
+                self.server = TCPMetricsServer((self.host, self.port), MetricsRequestHandler)
+        except OSError as e:
+            raise RuntimeError(f"Could not start the telemetry server: {e}")
+        self.server.metrics = self.metrics
+        self.thread = threading.Thread(target=self.server.serve_forever, name='telemetry', daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+        self.server = None
+        self.thread = None
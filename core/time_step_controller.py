@@ -0,0 +1,112 @@
+# core/time_step_controller.py
+
+import numpy as np
+
+class AdaptiveTimeStepController:
+    """
+    Chooses the global time step from CFL, micromixing and chemistry limits.
+    With adaptation disabled the configured time_step is used, but steps are
+    still shortened so that the run lands exactly on export and end times.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        settings = config.get('adaptive_time_step', {})
+        self.enabled = settings.get('enabled', False)
+        self.base_time_step = config['time_step']
+        self.min_time_step = settings.get('min_time_step', self.base_time_step * 1e-2)
+        self.max_time_step = settings.get('max_time_step', self.base_time_step * 1e2)
+        self.cfl = settings.get('cfl', 0.5)
+        self.max_mixing_fraction = settings.get('max_mixing_fraction', 0.1)
+        self.max_relative_change = settings.get('max_relative_change', 0.05)
+        self.species_floor = settings.get('species_floor', 1e-3)
+        self.max_growth = settings.get('max_growth', 1.5)
+        if self.min_time_step > self.max_time_step:
+            raise ValueError("adaptive_time_step: 'min_time_step' must not exceed 'max_time_step'.")
+        self.grid_spacing = None
+
+    def set_grid_spacing(self, fluid_solver):
+        """
+        Use the smallest spacing of the flow grid as the CFL length scale.
+        :param fluid_solver: an instance of FluidSolverInterface
+        """
+        spacings = [np.min(np.diff(axis)) for axis in (fluid_solver.x, fluid_solver.y, fluid_solver.z) if len(axis) > 1]
+        self.grid_spacing = min(spacings) if spacings else None
+
+    def propose_time_step(self, previous_time_step, velocities, mixing_rate, relative_change):
+        """
+        Propose the next time step from the stability and accuracy limits.
+        :param previous_time_step: time step of the last step (None on the first step)
+        :param velocities: numpy array of shape (N, 3) of interpolated particle velocities
+        :param mixing_rate: largest micromixing rate omega of the last step
+        :param relative_change: largest relative chemistry change of the last step
+        :return: proposed time step (float)
+        """
+        if not self.enabled:
+            return self.base_time_step
+
+        if previous_time_step is None:
+            previous_time_step = self.base_time_step
+            limits = [self.base_time_step]
+        else:
+            limits = [previous_time_step * self.max_growth]
+
+        # CFL limit on the interpolated velocity
+        if self.grid_spacing is not None and len(velocities) > 0:
+            max_speed = np.max(np.linalg.norm(velocities, axis=1))
+            if max_speed > 0:
+                limits.append(self.cfl * self.grid_spacing / max_speed)
+
+        # Mixing limit: omega * dt should stay small
+        if mixing_rate > 0:
+            limits.append(self.max_mixing_fraction / mixing_rate)
+
+        # Chemistry limit: scale the last step by the ratio of target to observed change
+        if relative_change > 0:
+            limits.append(previous_time_step * self.max_relative_change / relative_change)
+
+        return float(np.clip(min(limits), self.min_time_step, self.max_time_step))
+
+    @staticmethod
+    def clip_to_boundaries(current_time, time_step, boundaries):
+        """
+        Shorten the step so that it ends exactly on the next boundary it would cross.
+        :param current_time: simulated time at the start of the step
+        :param time_step: proposed time step
+        :param boundaries: iterable of times (export times, total_time) to land on
+        :return: simulated time at the end of the step
+        """
+        end_time = current_time + time_step
+        # Boundaries a round-off away from the end are snapped to, avoiding sliver steps
+        snap_tolerance = 1e-6 * time_step
+        for boundary in boundaries:
+            if current_time < boundary <= end_time + snap_tolerance:
+                end_time = boundary
+        return end_time
+
+    def chemistry_state(self, particles):
+        """
+        Gather temperature and species mass fractions for the chemistry limit.
+        :param particles: list of Particle objects
+        :return: numpy array of shape (N, 1 + number of species), temperature first
+        """
+        if not particles:
+            return np.zeros((0, 1))
+        names = [name for name in particles[0].properties if name not in ('temperature', 'pressure')]
+        return np.array([
+            [particle.properties['temperature']] + [particle.properties[name] for name in names]
+            for particle in particles
+        ])
+
+    def relative_change(self, previous_state, current_state):
+        """
+        Largest relative change of temperature or species between two states.
+        Species changes are relative to max(Y, species_floor) so that trace
+        species do not dominate the limit.
+        """
+        if previous_state.size == 0 or previous_state.shape != current_state.shape:
+            return 0.0
+        temperature_change = np.abs(current_state[:, 0] - previous_state[:, 0]) / np.abs(previous_state[:, 0])
+        species_scale = np.maximum(np.abs(previous_state[:, 1:]), self.species_floor)
+        species_change = np.abs(current_state[:, 1:] - previous_state[:, 1:]) / species_scale
+        return float(max(np.max(temperature_change), np.max(species_change, initial=0.0)))
@@ -1,23 +1,74 @@
+import argparse
+import json
+
 import h5py
 import numpy as np
 
-# Define the grid and a simple velocity field
-x = np.linspace(0, 1, 10)
-y = np.linspace(0, 1, 10)
-z = np.linspace(0, 1, 10)
-
-# Example: Uniform flow in x-direction, zero in y and z
-u = np.ones((10, 10, 10))  # Velocity in x-direction
-v = np.zeros((10, 10, 10))  # Velocity in y-direction
-w = np.zeros((10, 10, 10))  # Velocity in z-direction
-
-# Save to HDF5
-with h5py.File('flow_field_data.h5', 'w') as f:
-    f.create_dataset('x', data=x)
-    f.create_dataset('y', data=y)
-    f.create_dataset('z', data=z)
-    f.create_dataset('u', data=u)
-    f.create_dataset('v', data=v)
-    f.create_dataset('w', data=w)
-
-print("Mock flow field file 'flow_field_data.h5' created.")
+from fluid_solver.synthetic_turbulence import SyntheticTurbulenceGenerator
+
+
+def create_uniform_flow_field(output_file):
+    # Define the grid and a simple velocity field
+    x = np.linspace(0, 1, 10)
+    y = np.linspace(0, 1, 10)
+    z = np.linspace(0, 1, 10)
+
+    # Example: Uniform flow in x-direction, zero in y and z
+    u = np.ones((10, 10, 10))  # Velocity in x-direction
+    v = np.zeros((10, 10, 10))  # Velocity in y-direction
+    w = np.zeros((10, 10, 10))  # Velocity in z-direction
+
+    # Save to HDF5
+    with h5py.File(output_file, 'w') as f:
+        f.create_dataset('x', data=x)
+        f.create_dataset('y', data=y)
+        f.create_dataset('z', data=z)
+        f.create_dataset('u', data=u)
+        f.create_dataset('v', data=v)
+        f.create_dataset('w', data=w)
+
+    print(f"Mock flow field file '{output_file}' created.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a flow field file for the particle solver.")
+    parser.add_argument('--output', default='flow_field_data.h5')
+    parser.add_argument('--synthetic', action='store_true', help="divergence-free synthetic turbulence")
+    parser.add_argument('--config', help="take the synthetic turbulence settings from a simulation config file")
+    parser.add_argument('--resolution', type=int, nargs=3, default=[64, 64, 64])
+    parser.add_argument('--domain-size', type=float, nargs=3, default=[1.0, 1.0, 1.0])
+    parser.add_argument('--rms-velocity', type=float, default=1.0)
+    parser.add_argument('--peak-wavenumber', type=float, default=4.0)
+    parser.add_argument('--mean-velocity', type=float, nargs=3, default=[0.0, 0.0, 0.0])
+    parser.add_argument('--times', type=float, nargs='*', help="output times of a time-dependent field")
+    parser.add_argument('--slab-size', type=int, default=8)
+    parser.add_argument('--dtype', choices=('float64', 'float32'), default='float64')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if not args.synthetic:
+        create_uniform_flow_field(args.output)
+        return
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    else:
+        config = {
+            'synthetic_turbulence': {
+                'resolution': args.resolution,
+                'domain_size': args.domain_size,
+                'rms_velocity': args.rms_velocity,
+                'peak_wavenumber': args.peak_wavenumber,
+                'mean_velocity': args.mean_velocity,
+                'times': args.times or None,
+                'slab_size': args.slab_size,
+                'dtype': args.dtype,
+                'seed': args.seed,
+            }
+        }
+    SyntheticTurbulenceGenerator(config).generate(args.output)
+    print(f"Synthetic turbulence flow field file '{args.output}' created.")
+
+
+if __name__ == "__main__":
+    main()
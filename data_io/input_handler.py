@@ -119,6 +119,12 @@ class InputHandler:
         """
         return self.config.get('diffusivity', 1e-5)
 
+    def get_seed(self):
+        """
+        Return the random seed (None if the run is not seeded).
+        """
+        return self.config.get('seed')
+
     def get_flow_field_time_dependent(self):
         """
         Return whether the flow field is time-dependent.
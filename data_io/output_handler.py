@@ -8,10 +8,18 @@ import pandas as pd
 import numpy as np
 import h5py
 
+def snapshot_label(time):
+    """Label of the snapshot at a simulated time, precise enough to tell short export intervals apart."""
+    return f"{time:.10g}"
+
+
 class LatexDataExporter:
-    def __init__(self, simulation_label, export_directory="latex_input"):
+    def __init__(self, simulation_label, export_directory="latex_input", output_file=None):
         self.simulation_label = simulation_label
         self.export_directory = export_directory  # Directly use export_directory as a string
+        self.output_file_path = output_file  # HDF5 file of particle snapshots, opened on the first save
+        self.output_file = None
+        self.single_point_files = set()  # Files of label / data point rows shared between runs
         if not os.path.exists(self.export_directory):
             os.makedirs(self.export_directory)
 
@@ -23,6 +31,7 @@ class LatexDataExporter:
 
     def append_single_data_point(self, filename, label, data_point):
         """Appends or updates a single data point in a .dat file without headers."""
+        self.single_point_files.add(filename)
         file_path = os.path.join(self.export_directory, filename)
 
         # Load existing data if file exists
@@ -50,48 +59,46 @@ class LatexDataExporter:
         self.export_data("mean_temperature_profiles.dat", ["Axial Position", "Temperature"], data)
 
     # Simulation state export
-    def save_state(self, time, particles):
-        """Saves particle positions and properties to HDF5 and triggers .dat exports if required."""
-        group_name = f"time_{time:.2f}"
+    def save_state(self, time, state):
+        """
+        Saves a particle snapshot to the HDF5 output file as group time_<t> and exports it as a .dat file.
+        The 'ids' dataset holds the stable particle IDs, so particles can be matched between
+        snapshots however the particle list was reordered in between.
+        :param state: dict with 'names', 'positions' (N, 3), 'values' (N, S) and 'ids' (N,),
+                      as returned by SimulationEngine.final_state
+        """
+        if self.output_file is None:
+            # A run starts a new snapshot file
+            self.output_file = h5py.File(self.output_file_path, 'w')
+        group_name = f"time_{snapshot_label(time)}"
         count = 0
         while group_name in self.output_file:
             count += 1
-            group_name = f"time_{time:.2f}_{count}"
-        
-        group = self.output_file.create_group(group_name)
-        positions = np.array([particle.position for particle in particles])
-        properties = [particle.properties for particle in particles]
-        
-        scalar_names = properties[0].keys()
-        for name in scalar_names:
-            data = np.array([prop[name] for prop in properties])
-            group.create_dataset(name, data=data)
+            group_name = f"time_{snapshot_label(time)}_{count}"
 
-        group.create_dataset('positions', data=positions)
+        group = self.output_file.create_group(group_name)
+        names = list(state['names'])
+        values = np.asarray(state['values'], dtype=float).reshape(len(state['ids']), len(names))
+        for k, name in enumerate(names):
+            group.create_dataset(name, data=values[:, k])
+        group.create_dataset('positions', data=state['positions'])
+        group.create_dataset('ids', data=np.asarray(state['ids'], dtype=np.int64))
+        self.output_file.flush()
 
         # Export additional data files
-        self.export_dat_files(time, positions, properties)
-
-    def export_dat_files(self, time, positions, properties):
-        """Exports particle data to a .dat file for each time step as needed."""
-        time_str = f"{time:.2f}"
-        scalar_names = properties[0].keys()
-        data = positions
-        headers = ['x', 'y', 'z']
-        
-        # Append scalar properties to data for export
-        for name in scalar_names:
-            scalar_data = np.array([prop[name] for prop in properties]).reshape(-1, 1)
-            data = np.hstack((data, scalar_data))
-            headers.append(name)
-        
-        # Drop rows with NaN values, sort by the first axis
-        data = data[~np.isnan(data).any(axis=1)]
-        data = data[data[:, 0].argsort()]
-
-        # Save sorted and cleaned .dat file
+        self.export_dat_files(time, state['positions'], names, values, state['ids'])
+
+    def export_dat_files(self, time, positions, names, values, ids):
+        """Exports one snapshot to a .dat file, one row per particle with its ID."""
+        time_str = snapshot_label(time)
+        data = pd.DataFrame(values, columns=names)
+        data.insert(0, 'id', np.asarray(ids, dtype=np.int64))
+        for axis, name in enumerate(('x', 'y', 'z')):
+            data.insert(axis, name, np.asarray(positions, dtype=float)[:, axis])
+
+        # Save the rows without NaN values, sorted by the first axis
         data_file = f"{self.simulation_label}_data_{time_str}.dat"
-        self.export_data(data_file, headers, data)
+        self.export_data(data_file, list(data.columns), data)
 
     # Specific export functions for data types
     def export_scalar_variance_decay(self, data):
@@ -126,4 +133,6 @@ class LatexDataExporter:
 
     def close(self):
         """Closes the HDF5 file to finalize output."""
-        self.output_file.close()
+        if self.output_file is not None:
+            self.output_file.close()
+            self.output_file = None
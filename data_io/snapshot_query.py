@@ -0,0 +1,284 @@
+# data_io/snapshot_query.py
+
+import os
+import re
+
+import h5py
+import numpy as np
+
+# Snapshot groups are written as time_<t> with an optional _<n> suffix for repeated times
+SNAPSHOT_PATTERN = re.compile(r'^time_([-+0-9.eE]+?)(?:_(\d+))?$')
+INDEX_VERSION = 1
+
+
+class SnapshotIndex:
+    """
+    Indexed queries over the particle snapshots of a simulation output file.
+
+    Each snapshot group (time_<t>, holding 'positions' and one dataset per
+    scalar) is split into blocks of rows (the HDF5 chunks, if the datasets are
+    chunked). The index records per block its row range, the bounding box of
+    the positions and the min / max of every scalar, and per dataset its byte
+    offset in the file if it is stored contiguously. A query only reads the
+    blocks of the selected snapshots whose bounds can contain matching
+    particles: contiguous datasets through a memory map, chunked ones through
+    hyperslab reads. Particles stored in spatial order (e.g. Morton order)
+    give tight block boxes and therefore few blocks per query.
+
+    The index is built once and saved next to the data file; it is rebuilt when
+    the data file changes.
+    """
+
+    def __init__(self, data_file, index_file=None, block_rows=4096):
+        """
+        :param data_file: HDF5 file with time_<t> snapshot groups
+        :param index_file: where to keep the index (defaults to <data_file>.index.h5)
+        :param block_rows: rows per block of unchunked datasets
+        """
+        self.data_file_path = os.path.abspath(data_file)
+        self.index_file = index_file if index_file is not None else f"{data_file}.index.h5"
+        self.block_rows = int(block_rows)
+        if self.block_rows < 1:
+            raise ValueError("Snapshot index block_rows must be at least 1.")
+        try:
+            self.data_file = h5py.File(data_file, 'r')
+        except Exception as e:
+            raise IOError(f"Error opening simulation output: {e}")
+        self.memory_maps = {}
+        self.rows_read = 0  # Rows read by queries, to judge how selective the index is
+
+        self.snapshots = self.load_index()
+        if self.snapshots is None:
+            self.snapshots = self.build_index()
+            self.save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.memory_maps.clear()
+        self.data_file.close()
+
+    def source_stamp(self):
+        status = os.stat(self.data_file_path)
+        return [status.st_size, status.st_mtime_ns]
+
+    def build_index(self):
+        """
+        Scan all snapshots once, block by block.
+        :return: list of snapshot entries sorted by time
+        """
+        entries = []
+        for name, group in self.data_file.items():
+            match = SNAPSHOT_PATTERN.match(name)
+            if not match or not isinstance(group, h5py.Group) or 'positions' not in group:
+                continue
+            positions = group['positions']
+            scalar_names = sorted(
+                key for key, dataset in group.items()
+                if key != 'positions' and isinstance(dataset, h5py.Dataset) and dataset.shape == positions.shape[:1]
+            )
+            num_rows = positions.shape[0]
+            block_rows = positions.chunks[0] if positions.chunks else self.block_rows
+            starts = np.arange(0, num_rows, block_rows)
+            blocks = np.column_stack([starts, np.minimum(starts + block_rows, num_rows)]).astype(np.int64)
+            lower = np.empty((len(blocks), 3))
+            upper = np.empty((len(blocks), 3))
+            scalar_min = np.empty((len(blocks), len(scalar_names)))
+            scalar_max = np.empty((len(blocks), len(scalar_names)))
+            for b, (start, stop) in enumerate(blocks):
+                block = positions[start:stop]
+                lower[b] = block.min(axis=0)
+                upper[b] = block.max(axis=0)
+                for k, scalar_name in enumerate(scalar_names):
+                    values = group[scalar_name][start:stop]
+                    scalar_min[b, k] = np.nanmin(values) if not np.isnan(values).all() else np.nan
+                    scalar_max[b, k] = np.nanmax(values) if not np.isnan(values).all() else np.nan
+            offsets = {key: self.dataset_offset(group[key]) for key in ['positions'] + scalar_names}
+            entries.append({
+                'group': name,
+                'time': float(match.group(1)),
+                'order': int(match.group(2) or 0),
+                'num_particles': int(num_rows),
+                'scalar_names': scalar_names,
+                'offsets': offsets,
+                'blocks': blocks,
+                'lower': lower,
+                'upper': upper,
+                'scalar_min': scalar_min,
+                'scalar_max': scalar_max,
+            })
+        return sorted(entries, key=lambda entry: (entry['time'], entry['order']))
+
+    @staticmethod
+    def dataset_offset(dataset):
+        """Byte offset of a contiguous, uncompressed dataset in the file, or -1."""
+        if dataset.chunks is not None or dataset.compression is not None:
+            return -1
+        offset = dataset.id.get_offset()
+        return -1 if offset is None else int(offset)
+
+    def save_index(self):
+        """Write the index next to the data file (kept in memory only if that is not possible)."""
+        temporary = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            with h5py.File(temporary, 'w') as f:
+                f.attrs['version'] = INDEX_VERSION
+                f.attrs['source_stamp'] = self.source_stamp()
+                f.attrs['block_rows'] = self.block_rows
+                for entry in self.snapshots:
+                    group = f.create_group(entry['group'])
+                    for key in ('time', 'order', 'num_particles'):
+                        group.attrs[key] = entry[key]
+                    group.attrs['scalar_names'] = np.array(entry['scalar_names'], dtype=h5py.string_dtype())
+                    group.attrs['offset_names'] = np.array(list(entry['offsets']), dtype=h5py.string_dtype())
+                    group.attrs['offsets'] = np.array(list(entry['offsets'].values()), dtype=np.int64)
+                    for key in ('blocks', 'lower', 'upper', 'scalar_min', 'scalar_max'):
+                        group.create_dataset(key, data=entry[key])
+            os.replace(temporary, self.index_file)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def load_index(self):
+        """Return the saved index, or None if there is none or it is out of date."""
+        try:
+            with h5py.File(self.index_file, 'r') as f:
+                if (f.attrs.get('version') != INDEX_VERSION
+                        or list(f.attrs['source_stamp']) != self.source_stamp()
+                        or f.attrs['block_rows'] != self.block_rows):
+                    return None
+                entries = []
+                for name, group in f.items():
+                    entry = {
+                        'group': name,
+                        'time': float(group.attrs['time']),
+                        'order': int(group.attrs['order']),
+                        'num_particles': int(group.attrs['num_particles']),
+                        'scalar_names': [str(key) for key in group.attrs['scalar_names']],
+                        'offsets': dict(zip((str(key) for key in group.attrs['offset_names']),
+                                            (int(offset) for offset in group.attrs['offsets']))),
+                    }
+                    for key in ('blocks', 'lower', 'upper', 'scalar_min', 'scalar_max'):
+                        entry[key] = group[key][:]
+                    entries.append(entry)
+        except (OSError, KeyError):
+            return None
+        return sorted(entries, key=lambda entry: (entry['time'], entry['order']))
+
+    def times(self):
+        """Return the snapshot times in order."""
+        return np.array([entry['time'] for entry in self.snapshots])
+
+    def entries_at(self, time=None):
+        """Return the index entries of one snapshot time, a sequence of times, or all snapshots."""
+        if time is None:
+            return self.snapshots
+        wanted = {float(t) for t in np.atleast_1d(time)}
+        return [entry for entry in self.snapshots if entry['time'] in wanted]
+
+    def bounds(self, time=None):
+        """
+        Return the (lower, upper) corners of the particle positions of the selected snapshots.
+        :param time: one snapshot time, a sequence of times, or None for all snapshots
+        """
+        entries = [entry for entry in self.entries_at(time) if len(entry['blocks'])]
+        if not entries:
+            raise ValueError("No particles in the selected snapshots.")
+        lower = np.min([entry['lower'].min(axis=0) for entry in entries], axis=0)
+        upper = np.max([entry['upper'].max(axis=0) for entry in entries], axis=0)
+        return lower, upper
+
+    def scalar_range(self, scalar_name, time=None):
+        """
+        Return the (min, max) of a scalar over the selected snapshots, from the index alone.
+        :param time: one snapshot time, a sequence of times, or None for all snapshots
+        """
+        entries = [
+            entry for entry in self.entries_at(time)
+            if scalar_name in entry['scalar_names'] and len(entry['blocks'])
+        ]
+        if not entries:
+            raise ValueError(f"Scalar '{scalar_name}' is not in the selected snapshots.")
+        lower = min(np.nanmin(entry['scalar_min'][:, entry['scalar_names'].index(scalar_name)]) for entry in entries)
+        upper = max(np.nanmax(entry['scalar_max'][:, entry['scalar_names'].index(scalar_name)]) for entry in entries)
+        return float(lower), float(upper)
+
+    def read_rows(self, entry, name, start, stop):
+        """Read rows of a snapshot dataset, memory-mapped if it is stored contiguously."""
+        self.rows_read += stop - start
+        dataset = self.data_file[entry['group']][name]
+        offset = entry['offsets'].get(name, -1)
+        if offset < 0:
+            return dataset[start:stop]
+        key = (entry['group'], name)
+        if key not in self.memory_maps:
+            self.memory_maps[key] = np.memmap(
+                self.data_file_path, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape
+            )
+        return np.array(self.memory_maps[key][start:stop])
+
+    def query(self, scalar_names, box=None, time_range=None, value_range=None):
+        """
+        Return the particles of the selected snapshots inside a box.
+        :param scalar_names: scalar name or list of names to return
+        :param box: optional (lower, upper) corners; particles on the faces are included
+        :param time_range: optional (t0, t1) of snapshot times, inclusive
+        :param value_range: optional (low, high) bounds on the first scalar
+        :return: dict with 'time' (N,), 'positions' (N, 3) and one (N,) array per scalar
+        """
+        if isinstance(scalar_names, str):
+            scalar_names = [scalar_names]
+        scalar_names = list(scalar_names)
+        if box is not None:
+            box_lower, box_upper = (np.asarray(corner, dtype=float) for corner in box)
+        results = {'time': [], 'positions': [], **{name: [] for name in scalar_names}}
+
+        for entry in self.snapshots:
+            if time_range is not None and not time_range[0] <= entry['time'] <= time_range[1]:
+                continue
+            missing = [name for name in scalar_names if name not in entry['scalar_names']]
+            if missing:
+                raise ValueError(f"Scalars {missing} are not in snapshot '{entry['group']}'.")
+
+            # Blocks whose bounds can hold matching particles
+            selected = np.ones(len(entry['blocks']), dtype=bool)
+            if box is not None:
+                selected &= np.all((entry['lower'] <= box_upper) & (entry['upper'] >= box_lower), axis=1)
+            if value_range is not None:
+                column = entry['scalar_names'].index(scalar_names[0])
+                selected &= (entry['scalar_max'][:, column] >= value_range[0]) & (entry['scalar_min'][:, column] <= value_range[1])
+
+            for start, stop in self.merge_blocks(entry['blocks'][selected]):
+                positions = self.read_rows(entry, 'positions', start, stop)
+                values = {name: self.read_rows(entry, name, start, stop) for name in scalar_names}
+                mask = np.ones(stop - start, dtype=bool)
+                if box is not None:
+                    mask &= np.all((positions >= box_lower) & (positions <= box_upper), axis=1)
+                if value_range is not None:
+                    first = values[scalar_names[0]]
+                    mask &= (first >= value_range[0]) & (first <= value_range[1])
+                count = int(mask.sum())
+                if count == 0:
+                    continue
+                results['time'].append(np.full(count, entry['time']))
+                results['positions'].append(positions[mask])
+                for name in scalar_names:
+                    results[name].append(values[name][mask])
+
+        empty = {'time': np.zeros(0), 'positions': np.zeros((0, 3)), **{name: np.zeros(0) for name in scalar_names}}
+        return {key: np.concatenate(parts) if parts else empty[key] for key, parts in results.items()}
+
+    @staticmethod
+    def merge_blocks(blocks):
+        """Merge adjacent row ranges so consecutive blocks are read in one access."""
+        merged = []
+        for start, stop in blocks:
+            if merged and merged[-1][1] == start:
+                merged[-1][1] = int(stop)
+            else:
+                merged.append([int(start), int(stop)])
+        return merged
@@ -0,0 +1,223 @@
+# fluid_solver/shared_flow_field.py
+
+import os
+import json
+import fcntl
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+import h5py
+import numpy as np
+
+FLOW_FIELD_DATASETS = ('x', 'y', 'z', 'u', 'v', 'w', 'times')
+
+
+def open_shared_segment(name, create=False, size=0):
+    """
+    Open a named shared-memory segment without registering it with the
+    multiprocessing resource tracker, whose cleanup would unlink the segment
+    when any attached process exits. Lifetime is managed by SharedFlowField.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no 'track' argument
+        segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+def unlink_shared_segment(segment):
+    """Remove a segment opened with open_shared_segment."""
+    if not hasattr(segment, '_track'):
+        # Python < 3.13 unregisters on unlink, so register it back first
+        resource_tracker.register(segment._name, 'shared_memory')
+    segment.unlink()
+
+
+class SharedFlowField:
+    """
+    Flow field arrays loaded from HDF5 once per node and attached read-only,
+    without copying, by every process that uses the same file.
+
+    Modes:
+        shared_memory  arrays live in named POSIX shared-memory segments
+        memmap         arrays are written once as .npy files and memory-mapped
+
+    A JSON manifest next to a lock file records the array layout and the PID
+    of every attachment. The first process creates the arrays, later ones
+    attach, and the last release removes them (unless 'persistent' keeps a
+    memmap cache on disk for later runs). PIDs of processes that died without
+    releasing (killed, crashed) are dropped on every attach and release, so
+    their storage is still removed.
+    """
+
+    MODES = ('shared_memory', 'memmap')
+
+    def __init__(self, flow_field_file, mode='shared_memory', directory=None, persistent=False):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown flow field sharing mode '{mode}'. Expected one of {self.MODES}.")
+        self.flow_field_file = os.path.abspath(flow_field_file)
+        self.mode = mode
+        self.persistent = persistent
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'iroh_flow_fields')
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Key the shared copy on the file identity so a rewritten file is not reused
+        stat = os.stat(self.flow_field_file)
+        identity = f"{self.flow_field_file}:{stat.st_size}:{stat.st_mtime_ns}:{mode}"
+        self.name = 'iroh_' + hashlib.sha1(identity.encode()).hexdigest()[:12]
+        self.manifest_file = os.path.join(self.directory, f"{self.name}.json")
+        self.lock_file = os.path.join(self.directory, f"{self.name}.lock")
+
+        self.arrays = {}
+        self.segments = []
+        self.attached = False
+        self.attach()
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return None
+        with open(self.manifest_file, 'r') as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        temporary_file = self.manifest_file + '.tmp'
+        with open(temporary_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temporary_file, self.manifest_file)
+
+    @staticmethod
+    def live_pids(pids):
+        """Return the PIDs of processes that are still running (one entry per attachment)."""
+        alive = []
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                continue
+            except PermissionError:
+                pass
+            alive.append(pid)
+        return alive
+
+    def attach(self):
+        """Attach to the shared arrays, creating them from the HDF5 file if needed."""
+        with self.locked():
+            manifest = self.read_manifest()
+            if manifest is not None:
+                manifest['pids'] = self.live_pids(manifest.get('pids', []))
+                if not manifest['pids'] and not (self.mode == 'memmap' and self.persistent):
+                    # Left behind by processes that died attached: start from a fresh copy
+                    self.remove_storage(manifest['layout'])
+                    manifest = None
+            if manifest is None:
+                manifest = {'layout': self.create(), 'pids': []}
+            manifest['pids'].append(os.getpid())
+            self.open_arrays(manifest['layout'])
+            self.write_manifest(manifest)
+        self.attached = True
+
+    def create(self):
+        """Copy every dataset of the flow field file into shared storage."""
+        layout = {}
+        try:
+            with h5py.File(self.flow_field_file, 'r') as f:
+                for key in FLOW_FIELD_DATASETS:
+                    if key not in f:
+                        continue
+                    dataset = f[key]
+                    layout[key] = {'shape': list(dataset.shape), 'dtype': dataset.dtype.str}
+                    if self.mode == 'shared_memory':
+                        segment = open_shared_segment(
+                            f"{self.name}_{key}", create=True, size=max(dataset.nbytes, 1)
+                        )
+                        target = np.ndarray(dataset.shape, dtype=dataset.dtype, buffer=segment.buf)
+                        dataset.read_direct(target)
+                        del target
+                        segment.close()
+                    else:
+                        target = np.lib.format.open_memmap(
+                            self.array_file(key), mode='w+', dtype=dataset.dtype, shape=dataset.shape
+                        )
+                        dataset.read_direct(target)
+                        target.flush()
+                        del target
+        except Exception as e:
+            raise IOError(f"Error loading flow field data into shared storage: {e}")
+        return layout
+
+    def array_file(self, key):
+        return os.path.join(self.directory, f"{self.name}_{key}.npy")
+
+    def open_arrays(self, layout):
+        for key, entry in layout.items():
+            if self.mode == 'shared_memory':
+                segment = open_shared_segment(f"{self.name}_{key}")
+                self.segments.append(segment)
+                array = np.ndarray(tuple(entry['shape']), dtype=np.dtype(entry['dtype']), buffer=segment.buf)
+            else:
+                array = np.load(self.array_file(key), mmap_mode='r')
+            array.flags.writeable = False
+            self.arrays[key] = array
+
+    def release(self):
+        """
+        Drop this process's reference. The caller must not hold views of the
+        arrays afterwards; the last reference removes the shared storage.
+        """
+        if not self.attached:
+            return
+        self.arrays = {}
+        for segment in self.segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Views are still alive somewhere; the mapping goes away with them
+                pass
+        with self.locked():
+            manifest = self.read_manifest()
+            pids = [] if manifest is None else self.live_pids(manifest.get('pids', []))
+            if os.getpid() in pids:
+                pids.remove(os.getpid())
+            if pids:
+                manifest['pids'] = pids
+                self.write_manifest(manifest)
+            elif manifest is not None:
+                if self.mode == 'memmap' and self.persistent:
+                    manifest['pids'] = []
+                    self.write_manifest(manifest)
+                else:
+                    self.remove_storage(manifest['layout'])
+                    os.remove(self.manifest_file)
+        self.segments = []
+        self.attached = False
+
+    def remove_storage(self, layout):
+        for key in layout:
+            if self.mode == 'shared_memory':
+                try:
+                    segment = open_shared_segment(f"{self.name}_{key}")
+                    segment.close()
+                    unlink_shared_segment(segment)
+                except FileNotFoundError:
+                    pass
+            elif os.path.exists(self.array_file(key)):
+                os.remove(self.array_file(key))
+
+    def reference_count(self):
+        """Return the number of live attachments."""
+        with self.locked():
+            manifest = self.read_manifest()
+        return 0 if manifest is None else len(self.live_pids(manifest.get('pids', [])))
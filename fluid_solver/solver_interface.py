@@ -3,11 +3,15 @@
 import h5py
 import numpy as np
 from scipy.interpolate import RegularGridInterpolator
+from fluid_solver.shared_flow_field import SharedFlowField
+
 class FluidSolverInterface:
     def __init__(self, config):
         self.config = config
         self.flow_field_file = config['flow_field_file']
         self.time_dependent = config.get('flow_field_time_dependent', False)
+        self.sharing = config.get('flow_field_sharing', {})
+        self.shared_flow_field = None
         self.flow_field_data = None
         self.velocity_interpolator = None
         self.load_flow_field_data()
@@ -16,6 +20,9 @@ class FluidSolverInterface:
         """
         Load the flow field data from the specified file.
         """
+        if self.sharing.get('mode'):
+            self.attach_shared_flow_field()
+            return
         try:
             with h5py.File(self.flow_field_file, 'r') as f:
                 # Assuming the HDF5 file contains datasets 'x', 'y', 'z', 'u', 'v', 'w'
@@ -36,6 +43,37 @@ class FluidSolverInterface:
         except Exception as e:
             raise IOError(f"Error loading flow field data: {e}")
 
+    def attach_shared_flow_field(self):
+        """
+        Attach to a node-wide shared copy of the flow field (created on first use).
+        The arrays and the interpolators built on them are read-only views.
+        """
+        self.shared_flow_field = SharedFlowField(
+            self.flow_field_file,
+            mode=self.sharing['mode'],
+            directory=self.sharing.get('directory'),
+            persistent=self.sharing.get('persistent', False),
+        )
+        arrays = self.shared_flow_field.arrays
+        self.x, self.y, self.z = arrays['x'], arrays['y'], arrays['z']
+        self.u, self.v, self.w = arrays['u'], arrays['v'], arrays['w']
+        if self.time_dependent:
+            self.times = arrays['times']
+        else:
+            self.create_interpolator()
+
+    def close(self):
+        """
+        Release the shared flow field, if any. The solver cannot be used afterwards.
+        """
+        if self.shared_flow_field is None:
+            return
+        for name in ('u_interp', 'v_interp', 'w_interp', 'x', 'y', 'z', 'u', 'v', 'w', 'times'):
+            if hasattr(self, name):
+                delattr(self, name)
+        self.shared_flow_field.release()
+        self.shared_flow_field = None
+
     def create_interpolator(self):
         """
         Create interpolator functions for u, v, w components.
@@ -106,3 +144,16 @@ class FluidSolverInterface:
         v = self.v_interp(position).item()
         w = self.w_interp(position).item()
         return np.array([u, v, w])
+
+    def get_velocities_at(self, positions):
+        """
+        Return the interpolated velocity at a batch of positions.
+        :param positions: numpy array of shape (N, 3)
+        :return: numpy array of shape (N, 3) containing velocity components (u, v, w)
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        return np.column_stack((
+            self.u_interp(positions),
+            self.v_interp(positions),
+            self.w_interp(positions),
+        ))
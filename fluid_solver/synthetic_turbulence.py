@@ -0,0 +1,200 @@
+# fluid_solver/synthetic_turbulence.py
+
+import os
+import tempfile
+
+import h5py
+import numpy as np
+
+
+class SyntheticTurbulenceGenerator:
+    """
+    Divergence-free synthetic turbulence in a periodic box, written to a flow
+    field HDF5 file (x, y, z, u, v, w and optionally times).
+
+    Each Fourier mode gets a random complex vector projected onto the plane
+    normal to its wavevector (so the field is solenoidal) with an amplitude
+    from the Passot-Pouquet spectrum E(k) ~ (k/kp)^4 exp(-2 (k/kp)^2). The field
+    is rescaled to the requested rms velocity per component.
+
+    The inverse FFT is done out of core in two passes over slabs: pass one
+    transforms planes of constant kz along x and y into a scratch HDF5 file,
+    pass two reads x-slabs back and finishes the real transform along z
+    straight into the chunked output. Peak memory is a few slabs, so 512^3
+    fields do not need to fit in memory. Random numbers are drawn per kz plane,
+    so the result does not depend on the slab size.
+
+    A time-dependent field advances the phase of each mode at a random
+    frequency of order u' |k|, which keeps the spectrum and the divergence.
+
+    Configuration ('synthetic_turbulence'):
+        resolution         [nx, ny, nz]
+        domain_size        [Lx, Ly, Lz]; grid points are at i * L / n
+        rms_velocity       per-component rms velocity u'
+        peak_wavenumber    spectrum peak in units of 2 pi / min(L)
+        mean_velocity      mean flow added to the fluctuations
+        times              list of output times, or null for a steady field
+        slab_size          planes per slab in both passes
+        dtype              'float64' or 'float32' velocity datasets
+        seed               random seed (defaults to the run seed)
+        scratch_directory  where the temporary spectral file is written
+    """
+
+    def __init__(self, config):
+        settings = config.get('synthetic_turbulence', {})
+        resolution = settings.get('resolution', [64, 64, 64])
+        if np.isscalar(resolution):
+            resolution = [resolution] * 3
+        self.resolution = tuple(int(n) for n in resolution)
+        self.domain_size = tuple(float(length) for length in settings.get('domain_size', [1.0, 1.0, 1.0]))
+        self.rms_velocity = settings.get('rms_velocity', 1.0)
+        self.peak_wavenumber = settings.get('peak_wavenumber', 4.0)
+        self.mean_velocity = np.asarray(settings.get('mean_velocity', [0.0, 0.0, 0.0]), dtype=float)
+        self.times = settings.get('times')
+        self.slab_size = int(settings.get('slab_size', 8))
+        self.dtype = np.dtype(settings.get('dtype', 'float64'))
+        self.seed = settings.get('seed')
+        self.scratch_directory = settings.get('scratch_directory')
+        if self.seed is None:
+            self.seed = config.get('seed')
+        if self.seed is None:
+            self.seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+        if min(self.resolution) < 2 or self.slab_size < 1:
+            raise ValueError("Synthetic turbulence needs at least 2 points per direction and a positive slab size.")
+
+        nx, ny, nz = self.resolution
+        lx, ly, lz = self.domain_size
+        self.kx = 2.0 * np.pi * np.fft.fftfreq(nx, d=lx / nx)
+        self.ky = 2.0 * np.pi * np.fft.fftfreq(ny, d=ly / ny)
+        self.kz = 2.0 * np.pi * np.fft.rfftfreq(nz, d=lz / nz)
+        self.peak = 2.0 * np.pi * self.peak_wavenumber / min(self.domain_size)
+
+    def grid(self):
+        """Return the x, y, z coordinates of the periodic grid."""
+        return tuple(
+            np.arange(n) * length / n for n, length in zip(self.resolution, self.domain_size)
+        )
+
+    def spectral_plane(self, kz_index, time=0.0):
+        """
+        Return the half-spectrum velocity coefficients on one plane of constant kz.
+        :return: complex numpy array of shape (3, nx, ny)
+        """
+        nx, ny, nz = self.resolution
+        rng = np.random.default_rng([self.seed, kz_index])
+        kx = self.kx[:, None]
+        ky = self.ky[None, :]
+        kz = self.kz[kz_index]
+        magnitude_squared = kx ** 2 + ky ** 2 + kz ** 2
+        magnitude = np.sqrt(magnitude_squared)
+
+        noise = rng.standard_normal((3, nx, ny)) + 1j * rng.standard_normal((3, nx, ny))
+        frequencies = self.rms_velocity * magnitude * rng.uniform(0.5, 1.5, size=(nx, ny))
+
+        # Remove the component along k: k . u_hat = 0
+        wavevector = (np.broadcast_to(kx, (nx, ny)), np.broadcast_to(ky, (nx, ny)), np.full((nx, ny), kz))
+        nonzero = magnitude_squared > 0.0
+        parallel = np.divide(sum(k * n for k, n in zip(wavevector, noise)), magnitude_squared,
+                             out=np.zeros((nx, ny), dtype=complex), where=nonzero)
+        coefficients = np.stack([n - k * parallel for k, n in zip(wavevector, noise)])
+        ratio = magnitude / self.peak
+        spectrum = ratio ** 4 * np.exp(-2.0 * ratio ** 2) / (4.0 * np.pi)
+        amplitude = np.sqrt(np.divide(spectrum, magnitude_squared, out=np.zeros((nx, ny)), where=nonzero))
+
+        # No mean mode and no Nyquist modes, whose conjugate partners are not represented
+        if nx % 2 == 0:
+            amplitude[nx // 2, :] = 0.0
+        if ny % 2 == 0:
+            amplitude[:, ny // 2] = 0.0
+        if nz % 2 == 0 and kz_index == nz // 2:
+            amplitude[:] = 0.0
+
+        coefficients *= amplitude
+        if time:
+            coefficients *= np.exp(1j * frequencies * time)
+        return coefficients
+
+    def transform_planes(self, scratch, time, accumulate_energy):
+        """
+        Pass one: inverse transform planes of constant kz along x and y into scratch.
+        :return: summed squared velocity of all points (before scaling), if accumulate_energy
+        """
+        nx, ny, nz = self.resolution
+        num_planes = len(self.kz)
+        energy = 0.0
+        for start in range(0, num_planes, self.slab_size):
+            stop = min(start + self.slab_size, num_planes)
+            block = np.empty((3, nx, ny, stop - start), dtype=complex)
+            for offset, kz_index in enumerate(range(start, stop)):
+                plane = self.spectral_plane(kz_index, time)
+                if accumulate_energy:
+                    energy += self.plane_energy(plane, kz_index)
+                block[..., offset] = np.fft.ifft2(plane, axes=(1, 2))
+            scratch[..., start:stop] = block
+        return energy
+
+    def plane_energy(self, plane, kz_index):
+        """
+        Contribution of one kz plane to sum(u^2) over the grid (Parseval). The
+        kz = 0 plane enters symmetrized, as irfft only uses its real part.
+        """
+        nx, ny, nz = self.resolution
+        num_points = nx * ny * nz
+        if kz_index == 0:
+            mirrored = np.conj(np.roll(plane[:, ::-1, ::-1], 1, axis=(1, 2)))
+            return np.sum(np.abs(0.5 * (plane + mirrored)) ** 2) / num_points
+        return 2.0 * np.sum(np.abs(plane) ** 2) / num_points
+
+    def write_slabs(self, scratch, datasets, time_index, scale):
+        """Pass two: finish the transform along z for x-slabs and write the velocity."""
+        nx, ny, nz = self.resolution
+        for start in range(0, nx, self.slab_size):
+            stop = min(start + self.slab_size, nx)
+            velocity = np.fft.irfft(scratch[:, start:stop], n=nz, axis=-1)
+            for component, dataset in enumerate(datasets):
+                values = (scale * velocity[component] + self.mean_velocity[component]).astype(self.dtype)
+                if time_index is None:
+                    dataset[start:stop] = values
+                else:
+                    dataset[time_index, start:stop] = values
+
+    def generate(self, output_file):
+        """
+        Write the synthetic flow field to output_file.
+        :return: output_file
+        """
+        nx, ny, nz = self.resolution
+        times = None if self.times is None else np.asarray(self.times, dtype=float)
+        shape = self.resolution if times is None else (len(times),) + self.resolution
+        chunks = (min(self.slab_size, nx), ny, nz) if times is None else (1, min(self.slab_size, nx), ny, nz)
+
+        scratch_handle, scratch_file = tempfile.mkstemp(suffix='.h5', dir=self.scratch_directory)
+        os.close(scratch_handle)
+        try:
+            with h5py.File(output_file, 'w') as f, h5py.File(scratch_file, 'w') as s:
+                for name, values in zip(('x', 'y', 'z'), self.grid()):
+                    f.create_dataset(name, data=values)
+                if times is not None:
+                    f.create_dataset('times', data=times)
+                datasets = [f.create_dataset(name, shape=shape, dtype=self.dtype, chunks=chunks) for name in ('u', 'v', 'w')]
+                f.attrs['rms_velocity'] = self.rms_velocity
+                f.attrs['peak_wavenumber'] = self.peak_wavenumber
+                f.attrs['seed'] = self.seed
+
+                scratch = s.create_dataset(
+                    'spectrum', shape=(3, nx, ny, len(self.kz)), dtype=complex,
+                    chunks=(1, min(self.slab_size, nx), ny, min(self.slab_size, len(self.kz)))
+                )
+                scale = None
+                for time_index, time in enumerate([0.0] if times is None else times):
+                    energy = self.transform_planes(scratch, time, accumulate_energy=scale is None)
+                    if scale is None:
+                        # Normalize once so every output time shares the same amplitude
+                        mean_square = energy / (nx * ny * nz) / 3.0
+                        scale = self.rms_velocity / np.sqrt(mean_square) if mean_square > 0 else 0.0
+                    self.write_slabs(scratch, datasets, None if times is None else time_index, scale)
+        except Exception as e:
+            raise IOError(f"Error generating synthetic flow field: {e}")
+        finally:
+            os.remove(scratch_file)
+        return output_file
@@ -7,15 +7,18 @@ class AdaptiveMicromixingModel:
         self.config = config
         self.micromixing_constant = config.get('micromixing_constant', 1.0)
 
-    def apply_mixing(self, particle, rate_of_strain_tensor, mean_properties):
+    def apply_mixing(self, particle, rate_of_strain_tensor, mean_properties, time_step=None):
         """
         Apply micromixing to a particle based on the rate-of-strain tensor and mean properties.
         :param particle: Particle object
         :param rate_of_strain_tensor: numpy array of shape (3, 3)
         :param mean_properties: dict of mean scalar properties
+        :param time_step: mixing time step (defaults to the configured time_step)
+        :return: micromixing rate used for the particle (float)
         """
         micromixing_rate = self.compute_micromixing_rate(rate_of_strain_tensor)
-        self.mix_particle(particle, micromixing_rate, mean_properties)
+        self.mix_particle(particle, micromixing_rate, mean_properties, time_step)
+        return micromixing_rate
 
     def compute_micromixing_rate(self, rate_of_strain_tensor):
         """
@@ -37,14 +40,15 @@ class AdaptiveMicromixingModel:
 
         return micromixing_rate
 
-    def mix_particle(self, particle, micromixing_rate, mean_properties):
+    def mix_particle(self, particle, micromixing_rate, mean_properties, time_step=None):
         """
         Update particle properties to simulate micromixing effects.
         :param particle: Particle object
         :param micromixing_rate: micromixing rate (float)
         :param mean_properties: dict of mean scalar properties
+        :param time_step: mixing time step (defaults to the configured time_step)
         """
-        dt = self.config['time_step']
+        dt = self.config['time_step'] if time_step is None else time_step
         for scalar in particle.properties:
             # Update scalar property using IEM model
             phi_particle = particle.properties[scalar]
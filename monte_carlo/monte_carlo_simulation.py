@@ -1,11 +1,77 @@
 # monte_carlo/monte_carlo_simulation.py
 
 import numpy as np
+from scipy.stats import qmc
 
 class MonteCarloSimulation:
+    """
+    Draws samples of one or several random inputs.
+
+    Configuration:
+        num_samples   default number of samples
+        sampling      'random' (plain Monte Carlo), 'sobol' (scrambled Sobol
+                      sequence) or 'lhs' (Latin hypercube)
+        seed          seed of the sampling stream
+    """
+
+    SAMPLING_METHODS = ('random', 'sobol', 'lhs')
+
     def __init__(self, config):
         self.num_samples = config.get('num_samples', 1000)
+        self.sampling = config.get('sampling', 'random')
+        if self.sampling not in self.SAMPLING_METHODS:
+            raise ValueError(
+                f"Unknown sampling method '{self.sampling}'. Expected one of {', '.join(self.SAMPLING_METHODS)}."
+            )
+        self.rng = np.random.default_rng(config.get('seed'))
 
     def perform_sampling(self, distribution):
-        samples = distribution.rvs(size=self.num_samples)
-        return samples
+        if self.sampling == 'random':
+            samples = distribution.rvs(size=self.num_samples, random_state=self.rng)
+            return samples
+        return distribution.ppf(self.create_sampler(1).random(self.num_samples)[:, 0])
+
+    def create_sampler(self, dimension, seed=None):
+        """
+        Return a sampler of the unit hypercube with a random(n) method. Repeated
+        calls of a Sobol sampler continue the sequence; Latin hypercube and
+        random samplers draw a new independent design each call.
+        :param dimension: number of random inputs
+        :param seed: seed or Generator (defaults to the simulation stream)
+        """
+        seed = self.rng if seed is None else seed
+        if self.sampling == 'sobol':
+            return qmc.Sobol(dimension, scramble=True, seed=seed)
+        if self.sampling == 'lhs':
+            return qmc.LatinHypercube(dimension, seed=seed)
+        return UniformSampler(dimension, seed)
+
+    def sample_parameters(self, distributions, num_samples=None, sampler=None):
+        """
+        Draw joint samples of independent inputs by mapping unit hypercube points
+        through the inverse CDF of each distribution.
+        :param distributions: list of frozen scipy.stats distributions
+        :param num_samples: number of samples (defaults to num_samples)
+        :param sampler: sampler from create_sampler, to continue a sequence
+        :return: numpy array of shape (num_samples, len(distributions))
+        """
+        num_samples = self.num_samples if num_samples is None else num_samples
+        if sampler is None:
+            sampler = self.create_sampler(len(distributions))
+        points = sampler.random(num_samples)
+        # Keep the inverse CDF finite for unbounded distributions
+        points = np.clip(points, 1e-12, 1.0 - 1e-12)
+        return np.column_stack([
+            distribution.ppf(points[:, k]) for k, distribution in enumerate(distributions)
+        ]).reshape(num_samples, len(distributions))
+
+
+class UniformSampler:
+    """Plain pseudo-random points in the unit hypercube, with the qmc sampler interface."""
+
+    def __init__(self, dimension, seed=None):
+        self.dimension = dimension
+        self.rng = np.random.default_rng(seed)
+
+    def random(self, n=1):
+        return self.rng.random((n, self.dimension))
@@ -0,0 +1,282 @@
+# monte_carlo/uncertainty_ensemble.py
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import numpy as np
+from scipy import stats
+
+from monte_carlo.monte_carlo_simulation import MonteCarloSimulation
+
+COMPOSITION_PATH = 'initial_conditions.composition.'
+OUTPUT_STATISTICS = ('mean', 'rms', 'variance')
+
+
+def make_distribution(spec):
+    """
+    Build a frozen scipy.stats distribution from a config entry such as
+    {"distribution": "uniform", "loc": 1150.0, "scale": 100.0}.
+    """
+    spec = dict(spec)
+    name = spec.pop('distribution', 'uniform')
+    distribution = getattr(stats, name, None)
+    if not isinstance(distribution, stats.rv_continuous):
+        raise ValueError(f"Unknown continuous distribution '{name}'.")
+    return distribution(**spec)
+
+
+def apply_parameters(config, names, values):
+    """
+    Return a copy of config with the sampled values set at their dotted paths,
+    e.g. 'initial_conditions.temperature' or 'micromixing_constant'. If any
+    species of the initial composition is sampled, the composition is
+    renormalized to sum to one.
+    """
+    member_config = copy.deepcopy(config)
+    for name, value in zip(names, values):
+        *parents, key = name.split('.')
+        section = member_config
+        for parent in parents:
+            section = section.setdefault(parent, {})
+        section[key] = float(value)
+    if any(name.startswith(COMPOSITION_PATH) for name in names):
+        composition = member_config['initial_conditions']['composition']
+        total = sum(composition.values())
+        if total <= 0:
+            raise ValueError("Sampled initial composition has no positive mass fractions.")
+        member_config['initial_conditions']['composition'] = {
+            species: fraction / total for species, fraction in composition.items()
+        }
+    return member_config
+
+
+def state_output(state, name):
+    """Evaluate an output such as 'mean_temperature' or 'rms_CO' on a final particle state."""
+    statistic, _, scalar_name = name.partition('_')
+    if statistic not in OUTPUT_STATISTICS:
+        raise ValueError(f"Unknown ensemble output '{name}'. Expected one of {', '.join(OUTPUT_STATISTICS)}_<scalar>.")
+    values = state['values'][:, state['names'].index(scalar_name)]
+    weights = state['weights']
+    mean_value = np.sum(weights * values) / np.sum(weights)
+    if statistic == 'mean':
+        return float(mean_value)
+    variance = float(np.sum(weights * (values - mean_value) ** 2) / np.sum(weights))
+    return variance ** 0.5 if statistic == 'rms' else variance
+
+
+def run_member(task):
+    """
+    Run one ensemble member to completion in this process, or reuse it from
+    the run cache if one is configured.
+    :param task: dict with 'config' (member configuration) and 'outputs' (output names)
+    :return: list of output values, in the order of task['outputs']
+    """
+    from core.engine import SimulationEngine
+    from core.run_cache import RunCache
+
+    cache = RunCache.from_config(task['config'])
+    if cache is not None:
+        state, _ = cache.run(task['config'], SimulationEngine)
+    else:
+        engine = SimulationEngine(task['config'])
+        try:
+            engine.run()
+            state = engine.final_state()
+        finally:
+            engine.close()
+    return [state_output(state, name) for name in task['outputs']]
+
+
+class UncertaintyEnsemble:
+    """
+    Uncertainty quantification over sampled simulation inputs.
+
+    Ensemble members are drawn with MonteCarloSimulation (scrambled Sobol or
+    Latin hypercube points mapped through the inverse CDF of each input) and run
+    in a process pool. The inputs are split into num_replicates independently
+    randomized sequences; the spread of the replicate means gives a Student-t
+    confidence interval for each output, which plain QMC point sets do not
+    provide. Sampling proceeds in rounds that double the members of every
+    replicate (keeping Sobol sets at powers of two) and stops as soon as every
+    confidence interval meets its tolerance, or before max_members is exceeded.
+
+    Configuration ('uncertainty_quantification'):
+        parameters           dotted config path -> distribution spec, e.g.
+                             "initial_conditions.temperature": {"distribution": "norm", "loc": 1200, "scale": 20}
+        outputs              e.g. ["mean_temperature", "rms_temperature", "mean_CO"]
+        sampling             'sobol', 'lhs' or 'random'
+        num_replicates       independent randomizations (at least 2)
+        initial_samples      members per replicate in the first round
+        max_members          upper bound on the total number of members
+        confidence_level     e.g. 0.95
+        relative_tolerance   target half width relative to |mean| (number or dict per output)
+        absolute_tolerance   target half width (number or dict per output)
+        num_workers          process pool size (1 runs members in this process)
+        output_directory     exports of the members and the ensemble results file
+        seed                 seed of the sampling and member streams (defaults to the run seed)
+    """
+
+    def __init__(self, config):
+        settings = config.get('uncertainty_quantification', {})
+        self.config = config
+        parameters = settings.get('parameters', {})
+        if not parameters:
+            raise ValueError("Uncertainty quantification needs at least one sampled parameter.")
+        self.names = list(parameters)
+        self.distributions = [make_distribution(spec) for spec in parameters.values()]
+        self.outputs = list(settings.get('outputs', ['mean_temperature']))
+        for name in self.outputs:
+            if name.partition('_')[0] not in OUTPUT_STATISTICS:
+                raise ValueError(f"Unknown ensemble output '{name}'.")
+        self.sampling = settings.get('sampling', 'sobol')
+        self.num_replicates = settings.get('num_replicates', 8)
+        self.initial_samples = settings.get('initial_samples', 4)
+        self.max_members = settings.get('max_members', 1024)
+        self.confidence_level = settings.get('confidence_level', 0.95)
+        self.relative_tolerance = settings.get('relative_tolerance', 0.01)
+        self.absolute_tolerance = settings.get('absolute_tolerance', 0.0)
+        self.num_workers = settings.get('num_workers')
+        self.output_directory = settings.get('output_directory', 'uncertainty_ensemble')
+        seed = settings.get('seed')
+        if seed is None:
+            seed = config.get('seed')
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.monte_carlo = MonteCarloSimulation({'sampling': self.sampling, 'seed': seed})
+
+        if self.num_replicates < 2:
+            raise ValueError("Confidence intervals need at least 2 replicates.")
+        if self.initial_samples < 1 or (self.sampling == 'sobol' and self.initial_samples & (self.initial_samples - 1)):
+            raise ValueError("initial_samples must be positive (and a power of two for Sobol sampling).")
+
+        self.parameter_values = np.zeros((0, len(self.names)))
+        self.output_values = np.zeros((0, len(self.outputs)))
+        self.replicates = np.zeros(0, dtype=int)
+        self.history = []
+
+    def tolerance(self, name, mean):
+        """Return the target confidence half width of one output."""
+        relative = self.relative_tolerance
+        absolute = self.absolute_tolerance
+        if isinstance(relative, dict):
+            relative = relative.get(name, 0.0)
+        if isinstance(absolute, dict):
+            absolute = absolute.get(name, 0.0)
+        return max(absolute, relative * abs(mean))
+
+    def member_tasks(self, values, first_index):
+        """Build the member configurations for a block of sampled parameter values."""
+        seeds = self.seed_sequence.spawn(len(values))
+        tasks = []
+        for offset, (row, seed_sequence) in enumerate(zip(values, seeds)):
+            member_config = apply_parameters(self.config, self.names, row)
+            member_config['seed'] = int(seed_sequence.generate_state(1)[0])
+            member_config['export_directory'] = os.path.join(self.output_directory, f"member_{first_index + offset:05d}")
+            tasks.append({'config': member_config, 'outputs': self.outputs})
+        return tasks
+
+    def evaluate_members(self, tasks, evaluate):
+        if self.num_workers == 1:
+            return [evaluate(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            return list(executor.map(evaluate, tasks))
+
+    def statistics(self):
+        """
+        Return the ensemble mean, confidence half width and member standard
+        deviation of every output, from the current members.
+        :return: dict of output name -> dict
+        """
+        replicate_means = np.array([
+            self.output_values[self.replicates == r].mean(axis=0) for r in range(self.num_replicates)
+        ])
+        mean = replicate_means.mean(axis=0)
+        standard_error = replicate_means.std(axis=0, ddof=1) / np.sqrt(self.num_replicates)
+        quantile = stats.t.ppf(0.5 + 0.5 * self.confidence_level, self.num_replicates - 1)
+        spread = self.output_values.std(axis=0, ddof=1)
+        num_members = len(self.output_values)
+        return {
+            name: {
+                'mean': float(mean[k]),
+                'half_width': float(quantile * standard_error[k]),
+                'std': float(spread[k]),
+                # Half width plain Monte Carlo would give with the same members
+                'monte_carlo_half_width': float(stats.norm.ppf(0.5 + 0.5 * self.confidence_level) * spread[k] / np.sqrt(num_members)),
+                'tolerance': self.tolerance(name, mean[k]),
+            }
+            for k, name in enumerate(self.outputs)
+        }
+
+    def run(self, evaluate=run_member):
+        """
+        Sample and run ensemble members until the confidence intervals of all
+        outputs meet their tolerance.
+        :param evaluate: picklable function of a member task returning the output values
+        :return: dict with 'statistics', 'converged', 'num_members' and 'history'
+        """
+        samplers = [
+            self.monte_carlo.create_sampler(len(self.names), seed=np.random.default_rng(seed_sequence))
+            for seed_sequence in self.seed_sequence.spawn(self.num_replicates)
+        ]
+        batch = self.initial_samples
+        converged = False
+        while True:
+            values = np.concatenate([
+                self.monte_carlo.sample_parameters(self.distributions, batch, sampler) for sampler in samplers
+            ])
+            replicates = np.repeat(np.arange(self.num_replicates), batch)
+            results = self.evaluate_members(self.member_tasks(values, len(self.output_values)), evaluate)
+
+            self.parameter_values = np.concatenate([self.parameter_values, values])
+            self.output_values = np.concatenate([self.output_values, np.asarray(results, dtype=float)])
+            self.replicates = np.concatenate([self.replicates, replicates])
+
+            statistics = self.statistics()
+            self.history.append({'num_members': len(self.output_values), 'statistics': statistics})
+            self.report(statistics)
+            converged = all(entry['half_width'] <= entry['tolerance'] for entry in statistics.values())
+            # Double every replicate, as long as the next round stays within max_members
+            batch = len(self.output_values) // self.num_replicates
+            if converged or len(self.output_values) + batch * self.num_replicates > self.max_members:
+                break
+
+        return {
+            'statistics': statistics,
+            'converged': converged,
+            'num_members': len(self.output_values),
+            'history': self.history,
+        }
+
+    def report(self, statistics):
+        print(f"Ensemble of {len(self.output_values)} members:")
+        for name, entry in statistics.items():
+            print(f"  {name}: {entry['mean']:.6g} +/- {entry['half_width']:.3g} "
+                  f"(target {entry['tolerance']:.3g}, plain MC +/- {entry['monte_carlo_half_width']:.3g})")
+
+    def save_results(self, output_file=None):
+        """
+        Write the member inputs and outputs and the convergence history to HDF5.
+        :return: path of the written file
+        """
+        if output_file is None:
+            output_file = os.path.join(self.output_directory, 'ensemble_results.h5')
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        try:
+            with h5py.File(output_file, 'w') as f:
+                f.create_dataset('parameters', data=self.parameter_values)
+                f['parameters'].attrs['names'] = self.names
+                f.create_dataset('outputs', data=self.output_values)
+                f['outputs'].attrs['names'] = self.outputs
+                f.create_dataset('replicates', data=self.replicates)
+                f.attrs['sampling'] = self.sampling
+                f.attrs['confidence_level'] = self.confidence_level
+                history = f.create_group('history')
+                history.create_dataset('num_members', data=[entry['num_members'] for entry in self.history])
+                for key in ('mean', 'half_width'):
+                    history.create_dataset(key, data=[
+                        [entry['statistics'][name][key] for name in self.outputs] for entry in self.history
+                    ])
+        except Exception as e:
+            raise IOError(f"Error saving ensemble results: {e}")
+        return output_file
@@ -3,13 +3,25 @@
 import numpy as np
 
 class Particle:
-    def __init__(self, position, properties):
+    def __init__(self, position, properties, weight=1.0, particle_id=None):
         self.position = np.array(position)
         self.properties = properties.copy()
         self.velocity = np.zeros(3)
+        self.weight = weight  # Statistical weight of the notional particle
+        self.particle_id = particle_id  # Stable identity, assigned by the ParticleManager
 
     def update_position(self, displacement):
         self.position += displacement
 
     def update_properties(self, new_properties):
         self.properties.update(new_properties)
+
+    def split(self):
+        """
+        Split the particle into two identical halves.
+        :return: the new particle (without an ID); this particle keeps the other half of the weight
+        """
+        self.weight *= 0.5
+        twin = Particle(self.position, self.properties, self.weight)
+        twin.velocity = self.velocity.copy()
+        return twin
@@ -3,14 +3,55 @@
 import numpy as np
 import cantera as ct
 from particles.particle import Particle
+from particles.particle_storage import StateLayout
+from particles.transport_integrators import TransportIntegrator
+from particles.population_control import PopulationController
+from particles.spatial_ordering import MortonOrdering
+
+
+def spawn_seed_sequences(seed, num_streams):
+    """
+    Spawn independent seed sequences from the run seed.
+    :param seed: integer seed from the configuration (None draws fresh entropy)
+    :param num_streams: number of streams, e.g. one per worker process
+    :return: list of numpy.random.SeedSequence
+    """
+    return np.random.SeedSequence(seed).spawn(num_streams)
+
 
 class ParticleManager:
-    def __init__(self, config):
+    def __init__(self, config, seed_sequence=None, bounds=None):
         self.config = config
         self.diffusivity = config.get('diffusivity', 1e-5)
+        self.integrator = TransportIntegrator(config)
+        self.population_controller = PopulationController(config)
+        self.ordering = MortonOrdering(config)
+
+        # Particle IDs: a worker of a decomposed run numbers its particles start, start + stride, ...
+        id_settings = config.get('particle_ids', {})
+        self.next_particle_id = id_settings.get('start', 0)
+        self.particle_id_stride = id_settings.get('stride', 1)
+
+        # Box that initial positions are drawn from (the unit cube by default)
+        if bounds is None:
+            bounds = (np.zeros(3), np.ones(3))
+        self.bounds = (np.asarray(bounds[0], dtype=float), np.asarray(bounds[1], dtype=float))
+
+        # Random streams: a single-process run uses the first spawned stream so
+        # that it matches worker 0 of a split run with the same seed
+        if seed_sequence is None:
+            seed_sequence = spawn_seed_sequences(config.get('seed'), 1)[0]
+        self.seed_sequence = seed_sequence
+        init_sequence, transport_sequence, population_sequence = seed_sequence.spawn(3)
+        self.init_rng = np.random.default_rng(init_sequence)
+        self.transport_rng = np.random.default_rng(transport_sequence)
+        self.population_rng = np.random.default_rng(population_sequence)
         
         # Initialize Cantera gas object first
         self.gas = ct.Solution(config['mechanism_file'])
+
+        # Compact array storage of the particle scalars, if configured
+        self.state_layout = StateLayout.from_config(config, ['temperature', 'pressure'] + self.gas.species_names)
         
         # Now initialize particles after self.gas is defined
         self.particles = self.initialize_particles()
@@ -36,45 +77,191 @@ class ParticleManager:
         # Create full composition dictionary with all species in the mechanism
         full_composition = {species: initial_composition.get(species, 0.0) for species in self.gas.species_names}
 
-        for _ in range(num_particles):
-            position = self.random_initial_position()
+        positions = self.random_initial_positions(num_particles)
+        for position in positions:
             properties = {
                 'temperature': temperature,
                 'pressure': pressure,
                 **full_composition  # Set species mass fractions
             }
-            particle = Particle(position, properties)
+            particle = Particle(position, self.make_properties(properties))
             initial_particles.append(particle)
+        self.assign_ids(initial_particles)
         return initial_particles
+
+    def assign_ids(self, particles):
+        """Give each particle without an ID a new, never reused one."""
+        for particle in particles:
+            if particle.particle_id is None:
+                particle.particle_id = self.next_particle_id
+                self.next_particle_id += self.particle_id_stride
+
+    def particle_ids(self):
+        """Return the IDs of all particles as an (N,) array, in the current particle order."""
+        return np.array([particle.particle_id for particle in self.particles], dtype=np.int64)
+
+    def sort_particles(self, fluid_solver):
+        """
+        Reorder the particles along the Morton curve of the flow grid, and their
+        compact state rows with them. Particle IDs are unchanged.
+        :param fluid_solver: an instance of FluidSolverInterface providing the grid
+        """
+        if self.ordering.grid is None:
+            self.ordering.set_grid(fluid_solver)
+        order = self.ordering.order(self.particle_positions())
+        self.particles = [self.particles[i] for i in order]
+        if self.state_layout is not None:
+            self.state_layout.pack([particle.properties for particle in self.particles])
+
+    def make_properties(self, properties):
+        """Return particle properties in the configured storage format."""
+        if self.state_layout is None:
+            return properties
+        return self.state_layout.create(properties)
     
     def move_particles(self, time_step, fluid_solver):
-        for particle in self.particles:
-            velocity = fluid_solver.get_velocity_at(particle.position)
-            stochastic_disp = self.get_stochastic_displacement(time_step)
-            total_displacement = velocity * time_step + stochastic_disp
-            particle.update_position(total_displacement)
+        positions = self.particle_positions()
+        noise = self.get_stochastic_displacement(time_step, len(self.particles))
+        displacements, velocities = self.integrator.step(
+            positions, time_step, fluid_solver.get_velocities_at, noise
+        )
+        for particle, displacement, velocity in zip(self.particles, displacements, velocities):
+            particle.update_position(displacement)
             particle.velocity = velocity
 
-    def get_stochastic_displacement(self, time_step):
+    def particle_positions(self):
+        """Return the positions of all particles as an (N, 3) array."""
+        return np.array([particle.position for particle in self.particles], dtype=float).reshape(-1, 3)
+
+    def get_stochastic_displacement(self, time_step, num_particles=None):
+        """
+        Draw Wiener displacements from the transport stream.
+        :param time_step: transport time step
+        :param num_particles: if given, draw an (N, 3) block instead of a single (3,) vector
+        :return: numpy array of displacements
+        """
         sigma = np.sqrt(2 * self.diffusivity * time_step)
-        return np.random.normal(0, sigma, size=3)
+        size = 3 if num_particles is None else (num_particles, 3)
+        return self.transport_rng.normal(0, sigma, size=size)
 
     def mean_scalar_values(self):
-        num_particles = len(self.particles)
+        """Return the weighted mean of every scalar property."""
+        total_weight = self.total_weight()
         scalar_sums = {}
         for particle in self.particles:
             for scalar, value in particle.properties.items():
-                scalar_sums[scalar] = scalar_sums.get(scalar, 0.0) + value
+                scalar_sums[scalar] = scalar_sums.get(scalar, 0.0) + particle.weight * value
 
-        mean_values = {scalar: total / num_particles for scalar, total in scalar_sums.items()}
+        mean_values = {scalar: total / total_weight for scalar, total in scalar_sums.items()}
         return mean_values
 
+    def weighted_mean(self, scalar_name):
+        """Return the weighted mean of one scalar property."""
+        values, weights = self.scalar_values_and_weights(scalar_name)
+        return float(np.sum(weights * values) / np.sum(weights))
+
+    def weighted_variance(self, scalar_name):
+        """Return the weighted (population) variance of one scalar property."""
+        values, weights = self.scalar_values_and_weights(scalar_name)
+        mean_value = np.sum(weights * values) / np.sum(weights)
+        return float(np.sum(weights * (values - mean_value) ** 2) / np.sum(weights))
+
+    def scalar_values_and_weights(self, scalar_name):
+        values = np.array([particle.properties[scalar_name] for particle in self.particles], dtype=float)
+        weights = np.array([particle.weight for particle in self.particles], dtype=float)
+        return values, weights
+
+    def scalar_array(self, names, particles=None):
+        """
+        Return the values of the given scalars (missing scalars read as 0).
+        :param particles: particles to read (all particles by default)
+        :return: numpy array of shape (N, len(names))
+        """
+        particles = self.particles if particles is None else particles
+        layout = self.state_layout
+        if layout is not None and all(name in layout.index for name in names):
+            columns = [layout.index[name] for name in names]
+            if not particles:
+                return np.zeros((0, len(names)))
+            return np.stack([particle.properties.values for particle in particles])[:, columns].astype(float)
+        return np.array(
+            [[particle.properties.get(name, 0.0) for name in names] for particle in particles], dtype=float
+        ).reshape(-1, len(names))
+
+    def set_scalar(self, name, values, particles=None):
+        """Assign one scalar from a sequence of values, one per particle (all particles by default)."""
+        for particle, value in zip(self.particles if particles is None else particles, values):
+            particle.properties[name] = float(value)
+
+    def particle_weights(self):
+        """Return the statistical weights of all particles as an (N,) array."""
+        return np.array([particle.weight for particle in self.particles], dtype=float)
+
+    def total_weight(self):
+        """Returns the summed statistical weight of all particles."""
+        return sum(particle.weight for particle in self.particles)
+
+    def control_population(self, fluid_solver):
+        """
+        Split and merge particles so each flow-grid cell holds between n_min and n_max.
+        :param fluid_solver: an instance of FluidSolverInterface providing the grid
+        """
+        if self.population_controller.cell_edges is None:
+            self.population_controller.set_grid(fluid_solver)
+        self.particles = self.population_controller.apply(self.particles, self.population_rng)
+        self.assign_ids(self.particles)
+
     def random_initial_position(self):
-        x = np.random.uniform(0, 1)
-        y = np.random.uniform(0, 1)
-        z = np.random.uniform(0, 1)
-        return [x, y, z]
+        return self.random_initial_positions(1)[0].tolist()
+
+    def random_initial_positions(self, num_particles):
+        """Draw an (N, 3) block of uniform positions in the initialization box."""
+        lower, upper = self.bounds
+        return self.init_rng.uniform(lower, upper, size=(num_particles, 3))
+
+    def get_rng_state(self):
+        """Return the state of the random streams, e.g. for a checkpoint."""
+        return {
+            'init': self.init_rng.bit_generator.state,
+            'transport': self.transport_rng.bit_generator.state,
+            'population': self.population_rng.bit_generator.state,
+        }
+
+    def set_rng_state(self, state):
+        """Restore random streams saved with get_rng_state."""
+        self.init_rng.bit_generator.state = state['init']
+        self.transport_rng.bit_generator.state = state['transport']
+        self.population_rng.bit_generator.state = state['population']
+
+
+    def pack_particles(self, indices):
+        """
+        Remove the given particles and pack them into arrays for migration.
+        :param indices: indices into self.particles
+        :return: dict of numpy arrays (positions, velocities, weights, values) and scalar names
+        """
+        index_set = set(int(i) for i in indices)
+        leaving = [self.particles[i] for i in sorted(index_set)]
+        self.particles = [p for i, p in enumerate(self.particles) if i not in index_set]
+        names = list(leaving[0].properties) if leaving else []
+        return {
+            'names': names,
+            'positions': np.array([p.position for p in leaving], dtype=float).reshape(-1, 3),
+            'velocities': np.array([p.velocity for p in leaving], dtype=float).reshape(-1, 3),
+            'weights': np.array([p.weight for p in leaving], dtype=float),
+            'values': np.array([[p.properties[name] for name in names] for p in leaving], dtype=float),
+            'ids': np.array([p.particle_id for p in leaving], dtype=np.int64),
+        }
 
+    def unpack_particles(self, payload):
+        """Append particles from a payload created by pack_particles."""
+        names = payload['names']
+        for position, velocity, weight, values, particle_id in zip(
+            payload['positions'], payload['velocities'], payload['weights'], payload['values'], payload['ids']
+        ):
+            particle = Particle(position, self.make_properties(dict(zip(names, values.tolist()))), weight, int(particle_id))
+            particle.velocity = velocity.copy()
+            self.particles.append(particle)
 
     def total_particle_count(self):
         """Returns the total count of particles managed."""
@@ -0,0 +1,238 @@
+# particles/particle_storage.py
+
+import os
+import shutil
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class StateLayout:
+    """
+    Names and precision of the dense per-particle state, shared by all particles.
+
+    Configuration ('particle_storage'):
+        format            'dict' (plain dicts, the default) or 'array'
+        precision         'float64' or 'float32' storage for the 'array' format
+        excluded_species  species held at zero: they take no dense slot, the
+                          chemistry switches off every reaction involving them
+                          and writes to them are dropped
+        backing           'memory' (one small array per particle) or 'memmap' (rows of
+                          file-backed blocks, so the state can be paged out of core)
+        block_rows        particles per memmap block
+        memmap_directory  where the memmap blocks are created (a temporary directory)
+    """
+
+    FORMATS = ('dict', 'array')
+    PRECISIONS = {'float64': np.float64, 'float32': np.float32}
+    BACKINGS = ('memory', 'memmap')
+
+    def __init__(self, names, precision='float64', excluded_species=(), backing='memory', block_rows=65536,
+                 memmap_directory=None):
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown particle storage precision '{precision}'. Expected one of {tuple(self.PRECISIONS)}.")
+        if backing not in self.BACKINGS:
+            raise ValueError(f"Unknown particle storage backing '{backing}'. Expected one of {self.BACKINGS}.")
+        self.excluded_species = frozenset(excluded_species)
+        self.names = [name for name in names if name not in self.excluded_species]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.precision = precision
+        self.dtype = np.dtype(self.PRECISIONS[precision])
+        self.arena = None
+        if backing == 'memmap':
+            self.arena = StateArena(len(self.names), self.dtype, block_rows, memmap_directory)
+
+    @staticmethod
+    def configured_exclusions(config):
+        """Return the species held at zero by the configured storage (none for the dict format)."""
+        settings = config.get('particle_storage', {})
+        if settings.get('format', 'dict') == 'dict':
+            return frozenset()
+        return frozenset(settings.get('excluded_species', ()))
+
+    @classmethod
+    def from_config(cls, config, names):
+        """
+        Build the layout for the given scalar names, or return None for the dict format.
+        :param names: scalar names, e.g. ['temperature', 'pressure', *species]
+        """
+        settings = config.get('particle_storage', {})
+        storage_format = settings.get('format', 'dict')
+        if storage_format not in cls.FORMATS:
+            raise ValueError(f"Unknown particle storage format '{storage_format}'. Expected one of {cls.FORMATS}.")
+        if storage_format == 'dict':
+            return None
+        unknown = set(settings.get('excluded_species', ())) - set(names)
+        if unknown:
+            raise ValueError(f"Excluded species not in the mechanism: {sorted(unknown)}")
+        composition = config.get('initial_conditions', {}).get('composition', {})
+        present = sorted(name for name in settings.get('excluded_species', ()) if composition.get(name, 0.0) != 0.0)
+        if present:
+            raise ValueError(f"Excluded species are in the initial composition: {present}")
+        return cls(
+            names,
+            settings.get('precision', 'float64'),
+            settings.get('excluded_species', ()),
+            backing=settings.get('backing', 'memory'),
+            block_rows=settings.get('block_rows', 65536),
+            memmap_directory=settings.get('memmap_directory'),
+        )
+
+    def allocate(self):
+        """
+        Return a zeroed state row and its arena slot (None unless memmap backed).
+        """
+        if self.arena is None:
+            return np.zeros(len(self.names), dtype=self.dtype), None
+        return self.arena.allocate()
+
+    def create(self, properties):
+        """Return ParticleProperties holding the given mapping of scalar values."""
+        compact = ParticleProperties(self)
+        compact.update(properties)
+        return compact
+
+    def pack(self, properties):
+        """
+        Store the dense state of the given ParticleProperties contiguously, in list
+        order: in one new array, or in the arena rows they already hold.
+        """
+        if not properties:
+            return
+        values = np.stack([entry.values for entry in properties])
+        if self.arena is None:
+            for entry, row in zip(properties, values):
+                entry.values = row
+            return
+        slots = sorted(entry.slot for entry in properties)
+        for entry, slot, row in zip(properties, slots, values):
+            entry.slot = slot
+            entry.values = self.arena.row(slot)
+            entry.values[:] = row
+
+
+class StateArena:
+    """
+    Particle state rows carved out of file-backed blocks (np.memmap), so the
+    operating system can page the state of large populations to disk. A
+    block is added whenever all rows are taken; rows of discarded particles
+    are reused. The block files are deleted with the arena.
+    """
+
+    def __init__(self, width, dtype, block_rows=65536, directory=None):
+        if block_rows < 1:
+            raise ValueError("Memmap block_rows must be at least 1.")
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.block_rows = int(block_rows)
+        self.directory = tempfile.mkdtemp(prefix='particle_state_', dir=directory)
+        self.blocks = []
+        self.free_slots = []
+        self.next_slot = 0
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def allocate(self):
+        """Return (row view, slot) of an unused state row."""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.next_slot == len(self.blocks) * self.block_rows:
+                path = os.path.join(self.directory, f"block_{len(self.blocks):05d}.dat")
+                self.blocks.append(np.memmap(path, dtype=self.dtype, mode='w+', shape=(self.block_rows, self.width)))
+            slot = self.next_slot
+            self.next_slot += 1
+        row = self.row(slot)
+        row[:] = 0
+        return row, slot
+
+    def row(self, slot):
+        return self.blocks[slot // self.block_rows][slot % self.block_rows]
+
+    def release(self, slot):
+        self.free_slots.append(slot)
+
+    def rows_in_use(self):
+        return self.next_slot - len(self.free_slots)
+
+    def close(self):
+        self.blocks = []
+        self._cleanup()
+
+
+class ParticleProperties(MutableMapping):
+    """
+    Dict-like particle scalars backed by one array of the layout's precision.
+
+    Values are read back as Python floats, so arithmetic on them (mixing,
+    chemistry) runs in float64 and is only rounded when stored. Excluded species
+    always read as 0.0 and writes to them are dropped; the chemistry never
+    produces them. Scalars not in the layout are kept in a small per-particle
+    dict. Iteration yields the dense names followed by the sparse entries. With a memmap backed layout the
+    values are a row of the layout's arena, returned to it when the properties
+    are discarded.
+    """
+
+    __slots__ = ('layout', 'values', 'sparse', 'slot')
+
+    def __init__(self, layout, values=None, sparse=None):
+        self.layout = layout
+        self.slot = None
+        if values is None:
+            values, self.slot = layout.allocate()
+        self.values = values
+        self.sparse = sparse
+
+    def __del__(self):
+        if self.slot is not None:
+            self.layout.arena.release(self.slot)
+
+    def __getitem__(self, name):
+        index = self.layout.index.get(name)
+        if index is not None:
+            return float(self.values[index])
+        if name in self.layout.excluded_species:
+            return 0.0
+        if self.sparse is not None and name in self.sparse:
+            return self.sparse[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        index = self.layout.index.get(name)
+        if index is not None:
+            self.values[index] = value
+        elif name in self.layout.excluded_species:
+            return
+        else:
+            if self.sparse is None:
+                self.sparse = {}
+            self.sparse[name] = float(value)
+
+    def __delitem__(self, name):
+        if self.sparse is None or name not in self.sparse:
+            raise KeyError(name)
+        del self.sparse[name]
+        if not self.sparse:
+            self.sparse = None
+
+    def __contains__(self, name):
+        return name in self.layout.index or name in self.layout.excluded_species or (
+            self.sparse is not None and name in self.sparse
+        )
+
+    def __iter__(self):
+        yield from self.layout.names
+        if self.sparse is not None:
+            yield from list(self.sparse)
+
+    def __len__(self):
+        return len(self.layout.names) + (0 if self.sparse is None else len(self.sparse))
+
+    def copy(self):
+        duplicate = ParticleProperties(self.layout, sparse=None if not self.sparse else dict(self.sparse))
+        duplicate.values[:] = self.values
+        return duplicate
+
+    def __repr__(self):
+        return f"ParticleProperties({dict(self.items())})"
@@ -0,0 +1,97 @@
+# particles/population_control.py
+
+import numpy as np
+
+class PopulationController:
+    """
+    Keeps the number of particles per flow-grid cell within [n_min, n_max] by
+    splitting heavy particles and merging light ones. Splitting halves the
+    weight of a particle; merging keeps one of the two lightest particles with
+    probability proportional to its weight and gives it the combined weight,
+    which conserves total weight exactly and all scalar moments in expectation.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        settings = config.get('population_control', {})
+        self.enabled = settings.get('enabled', False)
+        self.n_min = settings.get('n_min', 2)
+        self.n_max = settings.get('n_max', 20)
+        self.interval = settings.get('interval', 1)
+        self.grid_coarsening = settings.get('grid_coarsening', 1)
+        if self.n_min < 1 or self.n_max < self.n_min:
+            raise ValueError("population_control: need 1 <= n_min <= n_max.")
+        self.cell_edges = None
+
+    def set_grid(self, fluid_solver):
+        """
+        Use the flow grid (optionally coarsened) as the control cells.
+        :param fluid_solver: an instance of FluidSolverInterface
+        """
+        self.cell_edges = [
+            np.asarray(axis)[::self.grid_coarsening] if len(axis) > self.grid_coarsening else np.asarray(axis)[[0, -1]]
+            for axis in (fluid_solver.x, fluid_solver.y, fluid_solver.z)
+        ]
+
+    def cell_indices(self, positions):
+        """
+        Flat cell index of each position; positions outside the grid go to the edge cells.
+        :param positions: numpy array of shape (N, 3)
+        :return: integer numpy array of shape (N,)
+        """
+        indices = []
+        shape = []
+        for axis, edges in enumerate(self.cell_edges):
+            num_cells = max(len(edges) - 1, 1)
+            index = np.searchsorted(edges, positions[:, axis], side='right') - 1
+            indices.append(np.clip(index, 0, num_cells - 1))
+            shape.append(num_cells)
+        return np.ravel_multi_index(indices, shape)
+
+    def apply(self, particles, rng):
+        """
+        Split and merge particles cell by cell.
+        :param particles: list of Particle objects
+        :param rng: numpy.random.Generator used to pick merge survivors
+        :return: new list of Particle objects
+        """
+        if not particles:
+            return particles
+        positions = np.array([particle.position for particle in particles], dtype=float).reshape(-1, 3)
+        cells = self.cell_indices(positions)
+
+        controlled = []
+        order = np.argsort(cells, kind='stable')
+        boundaries = np.flatnonzero(np.diff(cells[order])) + 1
+        for members in np.split(order, boundaries):
+            cell_particles = [particles[i] for i in members]
+            if len(cell_particles) < self.n_min:
+                cell_particles = self.split_cell(cell_particles)
+            elif len(cell_particles) > self.n_max:
+                cell_particles = self.merge_cell(cell_particles, rng)
+            controlled.extend(cell_particles)
+
+        # Keep the original ordering of surviving particles, with new ones at the end
+        survivors = {id(particle) for particle in controlled}
+        original = {id(particle) for particle in particles}
+        kept = [particle for particle in particles if id(particle) in survivors]
+        created = [particle for particle in controlled if id(particle) not in original]
+        return kept + created
+
+    def split_cell(self, cell_particles):
+        while len(cell_particles) < self.n_min:
+            heaviest = max(cell_particles, key=lambda particle: particle.weight)
+            cell_particles.append(heaviest.split())
+        return cell_particles
+
+    def merge_cell(self, cell_particles, rng):
+        cell_particles = sorted(cell_particles, key=lambda particle: particle.weight)
+        while len(cell_particles) > self.n_max:
+            first, second = cell_particles.pop(0), cell_particles.pop(0)
+            total_weight = first.weight + second.weight
+            survivor = first if rng.random() < first.weight / total_weight else second
+            survivor.weight = total_weight
+            # Re-insert keeping the list sorted by weight
+            weights = [particle.weight for particle in cell_particles]
+            cell_particles.insert(int(np.searchsorted(weights, total_weight)), survivor)
+        return cell_particles
@@ -6,17 +6,54 @@ import os
 # Add the project root directory to sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import argparse
 import json
 from core.engine import SimulationEngine
+from core.domain_decomposition import DomainDecomposedEngine
+from core.run_cache import RunCache
+from core.cost_model import CostModel
+from monte_carlo.uncertainty_ensemble import UncertaintyEnsemble
 
 def load_config(config_file):
     with open(config_file, 'r') as f:
         return json.load(f)
 
+def create_engine(config):
+    if config.get('domain_decomposition', {}).get('enabled', False):
+        return DomainDecomposedEngine(config)
+    return SimulationEngine(config)
+
 def main():
-    config = load_config('simulation_config.json')
-    engine = SimulationEngine(config)
-    engine.run()
+    parser = argparse.ArgumentParser(description="Run a PaSR particle simulation.")
+    parser.add_argument('--config', default='simulation_config.json', help="configuration file")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="predict the wall time and peak memory of the run instead of running it")
+    parser.add_argument('--particle-counts', type=int, nargs='+', default=None,
+                        help="other particle counts to predict in a dry run")
+    parser.add_argument('--recalibrate', action='store_true',
+                        help="measure the costs again even if a calibration is saved")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.dry_run:
+        CostModel(config).estimate(create_engine, args.particle_counts, args.recalibrate)
+        return
+    if config.get('uncertainty_quantification', {}).get('enabled', False):
+        ensemble = UncertaintyEnsemble(config)
+        ensemble.run()
+        ensemble.save_results()
+        return
+    cache = RunCache.from_config(config)
+    if cache is not None:
+        _, cached = cache.run(config, create_engine)
+        if cached:
+            print(f"Reused the cached results of an identical run in '{cache.directory}'.")
+        return
+    engine = create_engine(config)
+    try:
+        engine.run()
+    finally:
+        engine.close()
 
 if __name__ == "__main__":
     main()
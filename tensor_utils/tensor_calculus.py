@@ -53,3 +53,29 @@ class TensorCalculus:
         grad_u[:, 2] = (w_plus - w_minus) / (2 * delta)
 
         return grad_u
+
+    def compute_rates_of_strain(self, positions, fluid_solver, probes=None):
+        """
+        Compute the rate-of-strain tensors at a batch of positions with one
+        velocity evaluation (same central differences as compute_rate_of_strain).
+        :param positions: numpy array of shape (N, 3)
+        :param fluid_solver: an instance of FluidSolverInterface
+        :param probes: optional scratch array with at least 6 N rows of 3 columns
+        :return: numpy array of shape (N, 3, 3)
+        """
+        delta = 1e-5  # Small perturbation for finite differences
+        num_positions = len(positions)
+        if probes is None:
+            probes = np.empty((6 * num_positions, 3))
+        probes = probes[:6 * num_positions].reshape(6, num_positions, 3)
+        for axis in range(3):
+            probes[2 * axis] = positions
+            probes[2 * axis, :, axis] += delta
+            probes[2 * axis + 1] = positions
+            probes[2 * axis + 1, :, axis] -= delta
+        velocities = fluid_solver.get_velocities_at(probes.reshape(-1, 3)).reshape(6, num_positions, 3)
+
+        grad_u = np.empty((num_positions, 3, 3))
+        for axis in range(3):
+            grad_u[:, :, axis] = (velocities[2 * axis] - velocities[2 * axis + 1]) / (2 * delta)
+        return 0.5 * (grad_u + grad_u.transpose(0, 2, 1))
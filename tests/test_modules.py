@@ -3,15 +3,44 @@
 import unittest
 import h5py
 import numpy as np
+import pandas as pd
 import os
+import shutil
+import tempfile
+import time
+import multiprocessing as mp
+from unittest import mock
 import cantera as ct
 
 from chemistry.kinetics import ChemicalKinetics
+from chemistry.tabulated_chemistry import TabulatedChemistry
+from chemistry.thermo import NasaThermo
 from particles.particle import Particle
-from particles.particle_manager import ParticleManager
+from particles.particle_manager import ParticleManager, spawn_seed_sequences
+from particles.particle_storage import StateLayout, ParticleProperties
+from particles.transport_integrators import TransportIntegrator
+from particles.population_control import PopulationController
+from particles.spatial_ordering import morton_keys
 from fluid_solver.solver_interface import FluidSolverInterface
+from fluid_solver.shared_flow_field import SharedFlowField
+from fluid_solver.synthetic_turbulence import SyntheticTurbulenceGenerator
 from tensor_utils.tensor_calculus import TensorCalculus
 from micromixing.adaptive_micromixing import AdaptiveMicromixingModel
+from core.engine import SimulationEngine
+from monte_carlo.monte_carlo_simulation import MonteCarloSimulation
+from monte_carlo.uncertainty_ensemble import UncertaintyEnsemble, apply_parameters
+from core.time_step_controller import AdaptiveTimeStepController
+from core.operator_splitting import OperatorSplitting
+from core.blocked_pipeline import BlockedPipeline
+from core.run_cache import RunCache
+from core.telemetry import SimulationMetrics, TelemetryServer
+from core.steady_state import SteadyStateMonitor
+from core.memory_accounting import MemoryAccountant, array_bytes
+from core.cost_model import CostModel, fit_linear
+from core.domain_decomposition import DomainDecomposedEngine, SlabDecomposition
+from visualization.visualizer import Visualizer
+from data_io.output_handler import LatexDataExporter
+from data_io.snapshot_query import SnapshotIndex
 
 class TestParticle(unittest.TestCase):
     def test_particle_initialization(self):
@@ -20,6 +49,305 @@ class TestParticle(unittest.TestCase):
         particle = Particle(position, properties)
         self.assertEqual(particle.position.tolist(), position)
         self.assertEqual(particle.properties, properties)
+        self.assertEqual(particle.weight, 1.0)
+
+    def test_particle_split(self):
+        particle = Particle([0.1, 0.2, 0.3], {'temperature': 300.0}, weight=2.0)
+        twin = particle.split()
+        self.assertEqual(particle.weight, 1.0)
+        self.assertEqual(twin.weight, 1.0)
+        self.assertEqual(twin.properties, particle.properties)
+        twin.update_position(np.array([0.1, 0.0, 0.0]))
+        self.assertAlmostEqual(particle.position[0], 0.1)
+
+class TestParticleManager(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'mechanism_file': 'gri30.yaml',
+            'num_particles': 20,
+            'diffusivity': 1e-5,
+            'seed': 1234,
+            'initial_conditions': {
+                'composition': {'CH4': 0.095, 'O2': 0.21, 'N2': 0.695},
+                'temperature': 1200.0,
+                'pressure': ct.one_atm
+            }
+        }
+
+    def positions(self, manager):
+        return np.array([p.position for p in manager.particles])
+
+    def test_seeded_initialization_is_reproducible(self):
+        first = ParticleManager(self.config)
+        second = ParticleManager(self.config)
+        np.testing.assert_array_equal(self.positions(first), self.positions(second))
+
+        other_config = dict(self.config, seed=4321)
+        third = ParticleManager(other_config)
+        self.assertFalse(np.allclose(self.positions(first), self.positions(third)))
+
+    def test_stochastic_displacement_block(self):
+        manager = ParticleManager(self.config)
+        displacements = manager.get_stochastic_displacement(1e-3, 20)
+        self.assertEqual(displacements.shape, (20, 3))
+        self.assertEqual(manager.get_stochastic_displacement(1e-3).shape, (3,))
+
+    def test_rng_state_restore(self):
+        manager = ParticleManager(self.config)
+        state = manager.get_rng_state()
+        expected = manager.get_stochastic_displacement(1e-3, 20)
+        manager.set_rng_state(state)
+        np.testing.assert_array_equal(manager.get_stochastic_displacement(1e-3, 20), expected)
+
+    def test_weighted_statistics(self):
+        manager = ParticleManager(self.config)
+        manager.particles = manager.particles[:2]
+        manager.particles[0].properties['temperature'] = 300.0
+        manager.particles[1].properties['temperature'] = 600.0
+        manager.particles[1].weight = 2.0
+        self.assertAlmostEqual(manager.weighted_mean('temperature'), 500.0)
+        self.assertAlmostEqual(manager.mean_scalar_values()['temperature'], 500.0)
+        self.assertAlmostEqual(manager.weighted_variance('temperature'), 20000.0)
+
+    def test_worker_streams_are_independent(self):
+        seed_sequences = spawn_seed_sequences(self.config['seed'], 2)
+        worker_a = ParticleManager(self.config, seed_sequence=seed_sequences[0])
+        worker_b = ParticleManager(self.config, seed_sequence=seed_sequences[1])
+        self.assertFalse(np.allclose(self.positions(worker_a), self.positions(worker_b)))
+
+        # A single-process run uses the same stream as worker 0
+        single = ParticleManager(self.config)
+        np.testing.assert_array_equal(self.positions(single), self.positions(worker_a))
+
+class TestParticleStorage(unittest.TestCase):
+    def setUp(self):
+        self.layout = StateLayout(['temperature', 'pressure', 'CH4', 'AR'], precision='float32', excluded_species=['AR'])
+
+    def test_float32_storage_reads_as_float(self):
+        properties = self.layout.create({'temperature': 1234.56789, 'pressure': ct.one_atm, 'CH4': 0.1})
+        self.assertEqual(properties.values.dtype, np.float32)
+        self.assertIsInstance(properties['temperature'], float)
+        self.assertAlmostEqual(properties['temperature'], 1234.56789, places=3)
+        self.assertEqual(list(properties), ['temperature', 'pressure', 'CH4'])
+
+    def test_excluded_species_stay_zero(self):
+        properties = self.layout.create({'temperature': 300.0, 'AR': 0.0})
+        self.assertEqual(properties['AR'], 0.0)
+        self.assertIn('AR', properties)
+        self.assertIsNone(properties.sparse)
+
+        # Writes to excluded species are dropped; other unknown scalars are kept sparsely
+        properties['AR'] = 1e-3
+        self.assertEqual(properties['AR'], 0.0)
+        self.assertIsNone(properties.sparse)
+        properties['age'] = 2.0
+        self.assertEqual(properties.sparse, {'age': 2.0})
+        self.assertEqual(list(properties), ['temperature', 'pressure', 'CH4', 'age'])
+
+    def test_copy_is_independent(self):
+        properties = self.layout.create({'temperature': 300.0, 'age': 0.5})
+        twin = Particle([0.0, 0.0, 0.0], properties).split()
+        twin.properties['temperature'] = 400.0
+        twin.properties['age'] = 0.25
+        self.assertEqual(properties['temperature'], 300.0)
+        self.assertEqual(properties['age'], 0.5)
+
+    def test_particle_manager_uses_configured_storage(self):
+        config = {
+            'mechanism_file': 'gri30.yaml',
+            'num_particles': 3,
+            'initial_conditions': {'composition': {'CH4': 0.095, 'O2': 0.21, 'N2': 0.695}, 'temperature': 1200.0},
+            'particle_storage': {'format': 'array', 'precision': 'float32', 'excluded_species': ['AR']}
+        }
+        manager = ParticleManager(config)
+        properties = manager.particles[0].properties
+        self.assertIsInstance(properties, ParticleProperties)
+        self.assertEqual(len(properties.values), 2 + manager.gas.n_species - 1)
+        self.assertAlmostEqual(properties['CH4'], 0.095, places=6)
+
+        with self.assertRaises(ValueError):
+            ParticleManager(dict(config, particle_storage={'format': 'array', 'excluded_species': ['XX']}))
+        with self.assertRaisesRegex(ValueError, "initial composition"):
+            ParticleManager(dict(config, particle_storage={'format': 'array', 'excluded_species': ['N2']}))
+
+    def test_chemistry_leaves_excluded_species_out(self):
+        excluded = ['NO', 'NO2', 'N2O', 'HCN', 'C3H8']
+        config = {
+            'mechanism_file': 'gri30.yaml',
+            'time_step': 1e-3,
+            'num_particles': 2,
+            'initial_conditions': {'composition': {'CH4': 0.055, 'O2': 0.22, 'N2': 0.725}, 'temperature': 1800.0},
+            'particle_storage': {'format': 'array', 'excluded_species': excluded}
+        }
+        manager = ParticleManager(config)
+        kinetics = ChemicalKinetics(config)
+        kinetics.react_particles(manager.particles)
+        properties = manager.particles[0].properties
+        self.assertGreater(properties['temperature'], 2000.0)
+        self.assertIsNone(properties.sparse)
+        mass_fractions = [properties[name] for name in manager.gas.species_names]
+        self.assertAlmostEqual(sum(mass_fractions), 1.0, places=5)
+        for name in excluded:
+            self.assertEqual(kinetics.gas.Y[kinetics.gas.species_index(name)], 0.0)
+
+    def test_memmap_backing_reuses_rows(self):
+        layout = StateLayout(['temperature', 'CO'], backing='memmap', block_rows=4)
+        properties = [layout.create({'temperature': 300.0 + k, 'CO': 0.0}) for k in range(6)]
+        self.assertEqual(len(layout.arena.blocks), 2)
+        self.assertIsInstance(properties[5].values, np.memmap)
+        self.assertEqual(properties[5]['temperature'], 305.0)
+        del properties[:3]
+        properties.append(properties[0].copy())
+        self.assertEqual(layout.arena.rows_in_use(), 4)
+        self.assertEqual(properties[-1]['temperature'], 303.0)
+        directory = layout.arena.directory
+        layout.arena.close()
+        self.assertFalse(os.path.exists(directory))
+
+class TestPopulationControl(unittest.TestCase):
+    class Grid:
+        x = y = z = np.linspace(0, 1, 3)  # 2 x 2 x 2 cells
+
+    def setUp(self):
+        self.config = {'population_control': {'enabled': True, 'n_min': 3, 'n_max': 4}}
+        self.controller = PopulationController(self.config)
+        self.controller.set_grid(self.Grid)
+        self.rng = np.random.default_rng(0)
+
+    def make_particles(self, positions, temperatures, weights):
+        return [
+            Particle(position, {'temperature': temperature}, weight)
+            for position, temperature, weight in zip(positions, temperatures, weights)
+        ]
+
+    def statistics(self, particles):
+        weights = np.array([p.weight for p in particles])
+        temperatures = np.array([p.properties['temperature'] for p in particles])
+        return weights.sum(), np.sum(weights * temperatures) / weights.sum()
+
+    def test_split_sparse_cell(self):
+        particles = self.make_particles([[0.1, 0.1, 0.1]], [400.0], [3.0])
+        controlled = self.controller.apply(particles, self.rng)
+        self.assertEqual(len(controlled), 3)
+        self.assertAlmostEqual(self.statistics(controlled)[0], 3.0)
+        self.assertAlmostEqual(self.statistics(controlled)[1], 400.0)
+
+    def test_merge_dense_cell(self):
+        positions = [[0.7, 0.7, 0.7]] * 10
+        temperatures = np.linspace(300.0, 1200.0, 10)
+        particles = self.make_particles(positions, temperatures, np.ones(10))
+        controlled = self.controller.apply(particles, self.rng)
+        self.assertEqual(len(controlled), 4)
+        self.assertAlmostEqual(self.statistics(controlled)[0], 10.0)
+
+    def test_merge_conserves_mean_in_expectation(self):
+        means = []
+        for seed in range(200):
+            particles = self.make_particles([[0.7, 0.7, 0.7]] * 6, np.linspace(300.0, 800.0, 6), np.ones(6))
+            controlled = self.controller.apply(particles, np.random.default_rng(seed))
+            means.append(self.statistics(controlled)[1])
+        self.assertAlmostEqual(np.mean(means), 550.0, delta=15.0)
+
+    def test_cells_are_independent(self):
+        positions = [[0.1, 0.1, 0.1]] * 3 + [[0.9, 0.9, 0.9]] * 3
+        particles = self.make_particles(positions, [300.0] * 6, np.ones(6))
+        controlled = self.controller.apply(particles, self.rng)
+        self.assertEqual([id(p) for p in controlled], [id(p) for p in particles])
+
+class TestSpatialOrdering(unittest.TestCase):
+    class Grid:
+        x = y = z = np.linspace(0, 1, 9)
+
+    def make_manager(self, storage):
+        config = {
+            'mechanism_file': 'gri30.yaml',
+            'num_particles': 200,
+            'seed': 3,
+            'initial_conditions': {'composition': {'CH4': 0.095, 'O2': 0.21, 'N2': 0.695}, 'temperature': 300.0},
+            'particle_storage': storage,
+            'particle_sorting': {'enabled': True, 'interval': 1},
+        }
+        return ParticleManager(config)
+
+    def test_morton_keys_interleave_axes(self):
+        cells = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1], [2, 0, 0], [2 ** 21 - 1] * 3])
+        np.testing.assert_array_equal(morton_keys(cells), np.array([0, 1, 2, 4, 7, 8, 2 ** 63 - 1], dtype=np.uint64))
+
+    def test_sort_keeps_ids_and_state(self):
+        for storage in ({'format': 'dict'}, {'format': 'array'}, {'format': 'array', 'backing': 'memmap', 'block_rows': 64}):
+            with self.subTest(storage=storage):
+                manager = self.make_manager(storage)
+                np.testing.assert_array_equal(manager.particle_ids(), np.arange(200))
+                manager.set_scalar('temperature', 300.0 + manager.particle_ids())
+                before = dict(zip(manager.particle_ids(), manager.particle_positions().tolist()))
+                rows_in_use = None if manager.state_layout is None or manager.state_layout.arena is None \
+                    else manager.state_layout.arena.rows_in_use()
+
+                manager.sort_particles(self.Grid)
+                ids = manager.particle_ids()
+                keys = manager.ordering.keys(manager.particle_positions())
+                self.assertTrue(np.all(np.diff(keys.astype(np.float64)) >= 0))
+                self.assertEqual(sorted(ids), list(range(200)))
+                np.testing.assert_array_equal(manager.scalar_array(['temperature'])[:, 0], 300.0 + ids)
+                for particle_id, position in zip(ids, manager.particle_positions().tolist()):
+                    self.assertEqual(before[particle_id], position)
+                if rows_in_use is not None:
+                    self.assertEqual(manager.state_layout.arena.rows_in_use(), rows_in_use)
+                    slots = [particle.properties.slot for particle in manager.particles]
+                    self.assertEqual(slots, sorted(slots))
+
+    def test_new_particles_get_new_ids(self):
+        manager = self.make_manager({'format': 'dict'})
+        manager.population_controller = PopulationController({'population_control': {'n_min': 4, 'n_max': 8}})
+        manager.control_population(self.Grid)
+        ids = manager.particle_ids()
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertGreater(len(ids), 200)
+        self.assertEqual(manager.next_particle_id, 200 + sum(1 for i in ids if i >= 200))
+
+class TestTransportIntegrator(unittest.TestCase):
+    # Solid-body rotation about (0.5, 0.5): the exact trajectory is a circle
+    @staticmethod
+    def rotation_velocity(positions):
+        velocities = np.zeros_like(positions)
+        velocities[:, 0] = -(positions[:, 1] - 0.5)
+        velocities[:, 1] = positions[:, 0] - 0.5
+        return velocities
+
+    @staticmethod
+    def exact_rotation(positions, t):
+        exact = positions.copy()
+        dx, dy = positions[:, 0] - 0.5, positions[:, 1] - 0.5
+        exact[:, 0] = 0.5 + dx * np.cos(t) - dy * np.sin(t)
+        exact[:, 1] = 0.5 + dx * np.sin(t) + dy * np.cos(t)
+        return exact
+
+    def trajectory_error(self, scheme, time_step, total_time=1.0):
+        integrator = TransportIntegrator({'transport_scheme': scheme})
+        start = np.array([[0.8, 0.5, 0.5], [0.5, 0.9, 0.2]])
+        positions = start.copy()
+        noise = np.zeros_like(positions)
+        for _ in range(int(round(total_time / time_step))):
+            displacements, _ = integrator.step(positions, time_step, self.rotation_velocity, noise)
+            positions = positions + displacements
+        return np.max(np.abs(positions - self.exact_rotation(start, total_time)))
+
+    def test_convergence_order(self):
+        expected_orders = {'euler': 1, 'midpoint': 2, 'heun': 2, 'stochastic_heun': 2, 'rk4': 4}
+        time_steps = [0.1, 0.05, 0.025]
+        for scheme, expected_order in expected_orders.items():
+            errors = [self.trajectory_error(scheme, dt) for dt in time_steps]
+            observed_orders = np.log2(np.array(errors[:-1]) / np.array(errors[1:]))
+            with self.subTest(scheme=scheme, errors=errors):
+                np.testing.assert_allclose(observed_orders, expected_order, atol=0.3)
+
+    def test_higher_order_allows_larger_steps(self):
+        # RK4 at ten times the step is still more accurate than forward Euler
+        self.assertLess(self.trajectory_error('rk4', 0.1), self.trajectory_error('euler', 0.01))
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            TransportIntegrator({'transport_scheme': 'leapfrog'})
 
 class TestFluidSolverInterface(unittest.TestCase):
     def setUp(self):
@@ -56,10 +384,149 @@ class TestFluidSolverInterface(unittest.TestCase):
         expected_velocity = np.array([1.0, 0.0, 0.0])
         np.testing.assert_almost_equal(velocity, expected_velocity)
 
+    def test_get_velocities_at(self):
+        positions = np.array([[0.5, 0.5, 0.5], [0.1, 0.9, 0.3]])
+        velocities = self.solver.get_velocities_at(positions)
+        self.assertEqual(velocities.shape, (2, 3))
+        np.testing.assert_almost_equal(velocities, np.tile([1.0, 0.0, 0.0], (2, 1)))
+
     def tearDown(self):
         # Clean up the mock flow field file
         os.remove('test_flow_field.h5')
 
+def attach_and_count(config, queue):
+    solver = FluidSolverInterface(config)
+    queue.put((solver.shared_flow_field.reference_count(), solver.get_velocity_at(np.array([0.5, 0.5, 0.5])).tolist()))
+    solver.close()
+
+def attach_and_hang(config, queue):
+    solver = FluidSolverInterface(config)
+    queue.put(solver.shared_flow_field.manifest_file)
+    time.sleep(60)
+
+class TestSharedFlowField(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.flow_field_file = os.path.join(self.directory, 'flow_field.h5')
+        x = np.linspace(0, 1, 10)
+        X, Y, Z = np.meshgrid(x, x, x, indexing='ij')
+        with h5py.File(self.flow_field_file, 'w') as f:
+            for name in ('x', 'y', 'z'):
+                f.create_dataset(name, data=x)
+            f.create_dataset('u', data=X)
+            f.create_dataset('v', data=Y)
+            f.create_dataset('w', data=Z)
+
+    def make_config(self, mode, **sharing):
+        return {
+            'flow_field_file': self.flow_field_file,
+            'flow_field_sharing': dict(mode=mode, directory=os.path.join(self.directory, 'shared'), **sharing)
+        }
+
+    def check_sharing(self, mode):
+        config = self.make_config(mode)
+        first = FluidSolverInterface(config)
+        second = FluidSolverInterface(config)
+        self.assertEqual(first.shared_flow_field.reference_count(), 2)
+        np.testing.assert_almost_equal(second.get_velocity_at(np.array([0.25, 0.5, 0.75])), [0.25, 0.5, 0.75])
+        # Interpolators are built on the shared buffers without copying
+        self.assertTrue(np.shares_memory(first.u_interp.values, first.u))
+        with self.assertRaises(ValueError):
+            first.u[0, 0, 0] = 1.0
+
+        queue = mp.get_context('fork').Queue()
+        process = mp.get_context('fork').Process(target=attach_and_count, args=(config, queue))
+        process.start()
+        reference_count, velocity = queue.get(timeout=30)
+        process.join()
+        self.assertEqual(reference_count, 3)
+        np.testing.assert_almost_equal(velocity, [0.5, 0.5, 0.5])
+
+        manifest_file = first.shared_flow_field.manifest_file
+        first.close()
+        self.assertEqual(second.shared_flow_field.reference_count(), 1)
+        second.close()
+        self.assertFalse(os.path.exists(manifest_file))
+
+    def test_shared_memory_mode(self):
+        self.check_sharing('shared_memory')
+
+    def test_memmap_mode(self):
+        self.check_sharing('memmap')
+
+    def test_persistent_memmap_is_kept(self):
+        solver = FluidSolverInterface(self.make_config('memmap', persistent=True))
+        shared = solver.shared_flow_field
+        solver.close()
+        self.assertTrue(os.path.exists(shared.array_file('u')))
+        reattached = SharedFlowField(self.flow_field_file, 'memmap', shared.directory)
+        self.assertEqual(reattached.reference_count(), 1)
+        reattached.release()
+
+    def test_storage_of_killed_process_is_removed(self):
+        config = self.make_config('shared_memory')
+        context = mp.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(target=attach_and_hang, args=(config, queue))
+        process.start()
+        manifest_file = queue.get(timeout=30)
+        process.kill()
+        process.join()
+        # The killed process never released; its attachment no longer counts
+        solver = FluidSolverInterface(config)
+        self.assertEqual(solver.shared_flow_field.reference_count(), 1)
+        solver.close()
+        self.assertFalse(os.path.exists(manifest_file))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+class TestSyntheticTurbulence(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = {'resolution': [16, 12, 10], 'domain_size': [1.0, 1.0, 1.0], 'rms_velocity': 2.0,
+                         'peak_wavenumber': 2.0, 'seed': 7, 'slab_size': 3}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def generate(self, name, **settings):
+        output_file = os.path.join(self.directory, name)
+        SyntheticTurbulenceGenerator({'synthetic_turbulence': dict(self.settings, **settings)}).generate(output_file)
+        with h5py.File(output_file, 'r') as f:
+            return {name: f[name][:] for name in f.keys()}
+
+    def test_field_is_divergence_free_with_requested_rms(self):
+        field = self.generate('steady.h5')
+        velocity = np.stack([field['u'], field['v'], field['w']])
+        self.assertEqual(velocity.shape, (3, 16, 12, 10))
+        np.testing.assert_allclose(np.sqrt(np.mean(velocity ** 2)), 2.0, rtol=1e-10)
+        # Spectral divergence of the periodic field
+        spectrum = np.fft.fftn(velocity, axes=(1, 2, 3))
+        k = [2.0 * np.pi * np.fft.fftfreq(n, d=1.0 / n) for n in (16, 12, 10)]
+        divergence = (k[0][:, None, None] * spectrum[0] + k[1][None, :, None] * spectrum[1]
+                      + k[2][None, None, :] * spectrum[2])
+        self.assertLess(np.max(np.abs(divergence)) / np.max(np.abs(spectrum)), 1e-10)
+
+    def test_result_does_not_depend_on_slab_size(self):
+        small = self.generate('small.h5', slab_size=1)
+        large = self.generate('large.h5', slab_size=64)
+        for name in ('u', 'v', 'w'):
+            np.testing.assert_allclose(small[name], large[name], atol=1e-12)
+
+    def test_time_dependent_field_loads_in_solver(self):
+        output_file = os.path.join(self.directory, 'unsteady.h5')
+        SyntheticTurbulenceGenerator(
+            {'synthetic_turbulence': dict(self.settings, times=[0.0, 0.1, 0.2])}
+        ).generate(output_file)
+        steady = self.generate('steady.h5')
+        with h5py.File(output_file, 'r') as f:
+            self.assertEqual(f['u'].shape, (3, 16, 12, 10))
+            np.testing.assert_allclose(f['u'][0], steady['u'], atol=1e-12)
+        solver = FluidSolverInterface({'flow_field_file': output_file, 'flow_field_time_dependent': True})
+        solver.update_flow_field(0.05)
+        self.assertEqual(solver.get_velocities_at(np.array([[0.5, 0.5, 0.5]])).shape, (1, 3))
+
 class TestTensorCalculus(unittest.TestCase):
     def setUp(self):
         # Create a mock configuration
@@ -175,8 +642,1055 @@ class TestChemicalKinetics(unittest.TestCase):
         self.assertLess(final_CH4, initial_CH4)
         self.assertGreater(final_temperature, initial_temperature)
 
+    def test_reactor_is_reused_and_restarted(self):
+        reactor = self.chemistry.reactor
+        hot = Particle([0.0, 0.0, 0.0], dict(self.particle.properties, temperature=1600.0))
+        self.chemistry.react_particles([hot, self.particle])
+        self.assertIs(self.chemistry.reactor, reactor)
+
+        # The second particle must not inherit the first one's state or time
+        fresh = Particle([0.0, 0.0, 0.0], {'temperature': 1200.0, 'pressure': ct.one_atm, 'CH4': 0.5, 'O2': 0.5, 'N2': 0.0})
+        ChemicalKinetics(self.config).react_particles([fresh])
+        self.assertAlmostEqual(self.particle.properties['temperature'], fresh.properties['temperature'], places=6)
+        self.assertAlmostEqual(self.particle.properties['CH4'], fresh.properties['CH4'], places=9)
+
+        # The reactor is restarted at its initial size, so its mass does not grow from particle to particle
+        self.chemistry.react_particles([Particle([0.0, 0.0, 0.0], dict(hot.properties))])
+        mass = self.chemistry.reactor.mass
+        self.chemistry.react_particles([Particle([0.0, 0.0, 0.0], dict(hot.properties)) for _ in range(3)])
+        self.assertAlmostEqual(self.chemistry.reactor.mass, mass, delta=1e-12 * mass)
+
+    def test_reactor_falls_back_without_clone(self):
+        original = ct.IdealGasConstPressureReactor
+
+        def old_reactor(gas, **kwargs):
+            if 'clone' in kwargs:
+                raise TypeError("__init__() got an unexpected keyword argument 'clone'")
+            return original(gas)
+
+        with mock.patch.object(ct, 'IdealGasConstPressureReactor', side_effect=old_reactor):
+            chemistry = ChemicalKinetics(self.config)
+        chemistry.react_particles([self.particle])
+        self.assertGreater(self.particle.properties['temperature'], 1200.0)
+
     def tearDown(self):
         pass  # No cleanup needed
 
+class TestTabulatedChemistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.config = {
+            'mechanism_file': 'gri30.yaml',
+            'time_step': 1e-4,
+            'initial_conditions': {'temperature': 1200.0, 'pressure': ct.one_atm},
+            'tabulated_chemistry': {
+                'mixture_fraction_grid': [0.0, 0.03, 0.055, 0.08, 1.0],
+                'progress_points': 11,
+                'reactor_end_time': 0.2,
+                'num_workers': 2,
+                'cache_directory': cls.directory
+            }
+        }
+        cls.chemistry = TabulatedChemistry(cls.config)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def make_particle(self, mixture_fraction):
+        gas = ct.Solution('gri30.yaml')
+        gas.set_mixture_fraction(mixture_fraction, {'CH4': 1.0}, {'O2': 0.233, 'N2': 0.767}, basis='mass')
+        gas.TP = 1200.0, ct.one_atm
+        properties = {'temperature': 1200.0, 'pressure': ct.one_atm, **dict(zip(gas.species_names, gas.Y))}
+        return Particle([0.5, 0.5, 0.5], properties)
+
+    def test_table_is_cached(self):
+        self.assertTrue(os.path.exists(self.chemistry.table_file))
+        with mock.patch.object(TabulatedChemistry, 'generate_table') as generate_table:
+            cached = TabulatedChemistry(self.config)
+        generate_table.assert_not_called()
+        self.assertEqual(cached.table_file, self.chemistry.table_file)
+
+        other_config = dict(self.config, tabulated_chemistry=dict(self.config['tabulated_chemistry'], progress_points=5))
+        with mock.patch.object(TabulatedChemistry, 'generate_table'), mock.patch.object(TabulatedChemistry, 'load_table'):
+            self.assertNotEqual(TabulatedChemistry(other_config).table_file, self.chemistry.table_file)
+
+    def test_mixture_fraction_matches_cantera(self):
+        gas = ct.Solution('gri30.yaml')
+        compositions = []
+        expected = []
+        for mixture_fraction in (0.0, 0.02, 0.055, 0.3):
+            gas.set_mixture_fraction(mixture_fraction, {'CH4': 1.0}, {'O2': 0.233, 'N2': 0.767}, basis='mass')
+            compositions.append(gas.Y.copy())
+            expected.append(mixture_fraction)
+        np.testing.assert_allclose(self.chemistry.mixture_fraction(np.array(compositions)), expected, atol=1e-10)
+
+    def test_react_particles_releases_heat(self):
+        particles = [self.make_particle(0.055), self.make_particle(0.0)]
+        self.chemistry.react_particles(particles, 1e-3)
+        self.assertGreater(particles[0].properties['temperature'], 1200.0)
+        self.assertAlmostEqual(particles[1].properties['temperature'], 1200.0)
+        progress = sum(particles[0].properties[name] for name in ('CO2', 'CO', 'H2O', 'H2'))
+        self.assertGreater(progress, 0.0)
+
+    def test_progress_next_to_non_reacting_manifold(self):
+        # Z = 0.01 lies between the non-reacting pure oxidizer and the reacting 0.03 manifold
+        self.assertFalse(self.chemistry.reacting[0])
+        mixture_fraction = np.array([0.03, 0.01])
+        advanced = self.chemistry.advance_progress(mixture_fraction, np.zeros(2), 1e-3)
+        self.assertGreater(advanced[0], 0.0)
+        self.assertAlmostEqual(advanced[1], advanced[0])
+
+class TestNasaThermo(unittest.TestCase):
+    def setUp(self):
+        self.gas = ct.Solution('gri30.yaml')
+        self.thermo = NasaThermo(self.gas)
+        rng = np.random.default_rng(0)
+        self.temperatures = rng.uniform(300.0, 3000.0, 50)
+        self.mass_fractions = rng.random((50, self.gas.n_species)) ** 4
+        self.mass_fractions /= self.mass_fractions.sum(axis=1, keepdims=True)
+
+    def test_enthalpy_matches_cantera(self):
+        enthalpies = self.thermo.mixture_enthalpy(self.temperatures, self.mass_fractions)
+        cp = self.thermo.mixture_cp(self.temperatures, self.mass_fractions)
+        for k in range(0, 50, 7):
+            self.gas.TPY = self.temperatures[k], ct.one_atm, self.mass_fractions[k]
+            self.assertAlmostEqual(enthalpies[k], self.gas.enthalpy_mass, delta=1e-9 * abs(self.gas.enthalpy_mass) + 1e-6)
+            self.assertAlmostEqual(cp[k], self.gas.cp_mass, delta=1e-9 * self.gas.cp_mass)
+
+    def test_temperature_inversion(self):
+        enthalpies = self.thermo.mixture_enthalpy(self.temperatures, self.mass_fractions)
+        temperatures = self.thermo.temperature_from_enthalpy(enthalpies, self.mass_fractions, np.full(50, 1000.0))
+        np.testing.assert_allclose(temperatures, self.temperatures, atol=1e-6)
+
+    def test_inversion_warns_outside_polynomial_range(self):
+        temperatures = np.array([1000.0, self.thermo.max_temperature + 500.0])
+        enthalpies = self.thermo.mixture_enthalpy(temperatures, self.mass_fractions[:2])
+        with self.assertWarns(RuntimeWarning):
+            inverted = self.thermo.temperature_from_enthalpy(enthalpies, self.mass_fractions[:2], np.full(2, 1000.0))
+        np.testing.assert_allclose(inverted, [1000.0, self.thermo.max_temperature], atol=1e-6)
+
+class TestAdaptiveTimeStepController(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'time_step': 1e-3,
+            'adaptive_time_step': {
+                'enabled': True,
+                'cfl': 0.5,
+                'max_mixing_fraction': 0.1,
+                'max_relative_change': 0.05,
+                'min_time_step': 1e-5,
+                'max_time_step': 1e-1,
+                'max_growth': 2.0
+            }
+        }
+        self.controller = AdaptiveTimeStepController(self.config)
+        self.controller.grid_spacing = 0.1
+
+    def test_disabled_uses_fixed_step(self):
+        controller = AdaptiveTimeStepController({'time_step': 1e-3})
+        self.assertEqual(controller.propose_time_step(1e-3, np.full((4, 3), 100.0), 1e6, 1.0), 1e-3)
+
+    def test_cfl_limit(self):
+        velocities = np.array([[10.0, 0.0, 0.0], [0.0, 5.0, 0.0]])
+        time_step = self.controller.propose_time_step(1e-2, velocities, 0.0, 0.0)
+        self.assertAlmostEqual(time_step, 0.5 * 0.1 / 10.0)
+
+    def test_mixing_and_chemistry_limits(self):
+        velocities = np.zeros((2, 3))
+        self.assertAlmostEqual(self.controller.propose_time_step(1e-2, velocities, 50.0, 0.0), 0.1 / 50.0)
+        # A 10% change on the last step halves the step for a 5% target
+        self.assertAlmostEqual(self.controller.propose_time_step(1e-2, velocities, 0.0, 0.1), 5e-3)
+
+    def test_bounds_and_growth(self):
+        velocities = np.zeros((2, 3))
+        self.assertAlmostEqual(self.controller.propose_time_step(1e-2, velocities, 0.0, 0.0), 2e-2)
+        self.assertAlmostEqual(self.controller.propose_time_step(1e-1, velocities, 0.0, 0.0), 1e-1)
+        self.assertAlmostEqual(self.controller.propose_time_step(1e-2, velocities, 1e9, 0.0), 1e-5)
+
+    def test_clip_to_boundaries(self):
+        self.assertEqual(AdaptiveTimeStepController.clip_to_boundaries(0.095, 0.01, (0.1, 1.0)), 0.1)
+        self.assertAlmostEqual(AdaptiveTimeStepController.clip_to_boundaries(0.05, 0.01, (0.1, 1.0)), 0.06)
+        # A boundary within round-off of the end of the step is landed on exactly
+        self.assertEqual(AdaptiveTimeStepController.clip_to_boundaries(0.0099, 0.0001 - 1e-15, (0.01,)), 0.01)
+
+    def test_relative_change(self):
+        previous = np.array([[1000.0, 0.5, 0.0]])
+        current = np.array([[1100.0, 0.45, 1e-5]])
+        self.assertAlmostEqual(self.controller.relative_change(previous, current), 0.1)
+
+class TestOperatorSplitting(unittest.TestCase):
+    def test_lie_schedule(self):
+        splitting = OperatorSplitting({})
+        self.assertEqual(splitting.schedule(1.0), [
+            ('transport', 1.0, 1), ('mixing', 1.0, 1), ('chemistry', 1.0, 1)
+        ])
+
+    def test_strang_schedule(self):
+        splitting = OperatorSplitting({'operator_splitting': {
+            'scheme': 'strang', 'order': ['chemistry', 'transport', 'mixing'], 'substeps': {'transport': 4}
+        }})
+        self.assertEqual(splitting.schedule(1.0), [
+            ('chemistry', 0.5, 1), ('transport', 0.5, 4), ('mixing', 1.0, 1),
+            ('transport', 0.5, 4), ('chemistry', 0.5, 1)
+        ])
+
+    def test_deferred_stage_accumulates_time(self):
+        splitting = OperatorSplitting({'operator_splitting': {'intervals': {'chemistry': 3}}})
+        chemistry_steps = []
+        for step in range(5):
+            plan = splitting.schedule(0.1, flush=(step == 4))
+            chemistry_steps.extend(dt for stage, dt, _ in plan if stage == 'chemistry')
+        np.testing.assert_allclose(chemistry_steps, [0.3, 0.2])
+
+    def test_flush_restarts_interval(self):
+        splitting = OperatorSplitting({'operator_splitting': {'scheme': 'strang', 'intervals': {'chemistry': 3}}})
+        chemistry_steps = []
+        for step in range(5):
+            plan = splitting.schedule(0.1, flush=(step == 1))
+            chemistry_steps.extend(dt for stage, dt, _ in plan if stage == 'chemistry')
+        np.testing.assert_allclose(chemistry_steps, [0.2, 0.3])
+        self.assertAlmostEqual(splitting.pending_time['chemistry'], 0.0)
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            OperatorSplitting({'operator_splitting': {'scheme': 'yoshida'}})
+        with self.assertRaises(ValueError):
+            OperatorSplitting({'operator_splitting': {'order': ['transport', 'chemistry']}})
+        with self.assertRaises(ValueError):
+            OperatorSplitting({'operator_splitting': {'substeps': {'mixing': 0}}})
+
+class EngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        flow_field_file = os.path.join(self.directory, 'flow_field.h5')
+        x = np.linspace(0, 1, 10)
+        with h5py.File(flow_field_file, 'w') as f:
+            for name in ('x', 'y', 'z'):
+                f.create_dataset(name, data=x)
+            f.create_dataset('u', data=np.ones((10, 10, 10)))
+            f.create_dataset('v', data=np.zeros((10, 10, 10)))
+            f.create_dataset('w', data=np.zeros((10, 10, 10)))
+        self.config = {
+            'mechanism_file': 'gri30.yaml',
+            'time_step': 3e-4,
+            'total_time': 1e-3,
+            'num_particles': 4,
+            'seed': 7,
+            'initial_conditions': {
+                'composition': {'CH4': 0.095, 'O2': 0.21, 'N2': 0.695},
+                'temperature': 1200.0,
+                'pressure': ct.one_atm
+            },
+            'flow_field_file': flow_field_file,
+            'export_interval': 5e-4,
+            'output_file': os.path.join(self.directory, 'simulation_output.h5'),
+            'export_directory': os.path.join(self.directory, 'exports'),
+            'micromixing_constant': 1.0,
+            'diffusivity': 1e-5,
+            'micromixing_model': 'adaptive'
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+class TestSimulationEngine(EngineTestCase):
+    def run_engine(self, config):
+        engine = SimulationEngine(config)
+        export_times = []
+        collect_data = engine.collect_data
+
+        def recording_collect_data():
+            if engine.time >= engine.next_export_time - engine.time_tolerance:
+                export_times.append(engine.time)
+            collect_data()
+
+        engine.collect_data = recording_collect_data
+        engine.run()
+        return engine, export_times
+
+    def test_fixed_step_lands_on_boundaries(self):
+        engine, export_times = self.run_engine(self.config)
+        self.assertEqual(engine.time, self.config['total_time'])
+        self.assertEqual(export_times, [5e-4, 1e-3])
+
+    def test_adaptive_step_lands_on_boundaries(self):
+        config = dict(self.config, adaptive_time_step={
+            'enabled': True, 'min_time_step': 1e-5, 'max_time_step': 2e-4, 'max_growth': 2.0
+        })
+        engine, export_times = self.run_engine(config)
+        self.assertEqual(engine.time, config['total_time'])
+        self.assertEqual(export_times, [5e-4, 1e-3])
+        self.assertLessEqual(engine.time_step, 2e-4)
+
+    def test_landing_step_does_not_cut_growth(self):
+        config = dict(self.config, adaptive_time_step={
+            'enabled': True, 'min_time_step': 1e-6, 'max_time_step': 1e-2, 'max_growth': 1.5
+        })
+        engine = SimulationEngine(config)
+        engine.current_step = 1
+        engine.time = 4.9e-4
+        engine.select_time_step()
+        self.assertAlmostEqual(engine.time_step, 1e-5)
+        # The step after the short landing step grows from the unclipped proposal
+        engine.time = 5e-4
+        engine.next_export_time = 1e-3
+        engine.select_time_step()
+        self.assertAlmostEqual(engine.time_step, 5e-4)
+        engine.close()
+
+    def test_population_control_conserves_weight(self):
+        config = dict(self.config, num_particles=12, population_control={
+            'enabled': True, 'n_min': 2, 'n_max': 3, 'interval': 1, 'grid_coarsening': 3
+        })
+        engine = SimulationEngine(config)
+        engine.run()
+        self.assertAlmostEqual(engine.particle_manager.total_weight(), 12.0)
+        positions = engine.particle_manager.particle_positions()
+        cells = engine.particle_manager.population_controller.cell_indices(positions)
+        counts = np.bincount(cells)
+        self.assertTrue(np.all(counts[counts > 0] >= 2))
+        self.assertTrue(np.all(counts <= 3))
+
+    def test_subcycled_stages_cover_total_time(self):
+        config = dict(self.config, operator_splitting={
+            'scheme': 'strang', 'substeps': {'transport': 3}, 'intervals': {'chemistry': 2}
+        })
+        engine = SimulationEngine(config)
+        stage_times = {'transport': [], 'chemistry': []}
+        move_particles = engine.particle_manager.move_particles
+        react_particles = engine.chemistry.react_particles
+
+        def recording_move_particles(time_step, fluid_solver):
+            stage_times['transport'].append(time_step)
+            move_particles(time_step, fluid_solver)
+
+        def recording_react_particles(particles, time_step=None):
+            stage_times['chemistry'].append(time_step)
+            react_particles(particles, time_step)
+
+        engine.particle_manager.move_particles = recording_move_particles
+        engine.chemistry.react_particles = recording_react_particles
+        engine.run()
+        self.assertAlmostEqual(sum(stage_times['transport']), config['total_time'])
+        self.assertAlmostEqual(sum(stage_times['chemistry']), config['total_time'])
+        self.assertLess(len(stage_times['chemistry']), len(stage_times['transport']))
+
+    def test_deferred_stages_flush_at_exports(self):
+        engine = SimulationEngine(dict(self.config, operator_splitting={'intervals': {'chemistry': 10}}))
+        chemistry_steps = []
+        react_particles = engine.chemistry.react_particles
+
+        def recording_react_particles(particles, time_step=None):
+            chemistry_steps.append((engine.time, time_step))
+            react_particles(particles, time_step)
+
+        engine.chemistry.react_particles = recording_react_particles
+        engine.run()
+        # Chemistry catches up on the steps ending at the export times 5e-4 and 1e-3
+        np.testing.assert_allclose(chemistry_steps, [(3e-4, 2e-4 + 3e-4), (8e-4, 2e-4 + 3e-4)])
+
+    def test_snapshot_ids_track_particles_across_sorting(self):
+        config = dict(self.config, num_particles=20, snapshots={'enabled': True},
+                      particle_sorting={'enabled': True, 'interval': 1})
+        engine = SimulationEngine(config)
+        try:
+            engine.run()
+        finally:
+            engine.close()
+
+        with h5py.File(config['output_file'], 'r') as f:
+            first, second = (f[name] for name in sorted(f.keys()))
+            first_ids, second_ids = first['ids'][:], second['ids'][:]
+            first_positions, second_positions = first['positions'][:], second['positions'][:]
+            first_temperature = first['temperature'][:]
+        self.assertEqual(sorted(first_ids), list(range(20)))
+        self.assertEqual(sorted(second_ids), list(range(20)))
+
+        # One particle followed by its ID: it moved with the uniform flow u = 1 over the export interval
+        tracked = int(first_ids[7])
+        row_first = int(np.flatnonzero(first_ids == tracked)[0])
+        row_second = int(np.flatnonzero(second_ids == tracked)[0])
+        displacement = second_positions[row_second] - first_positions[row_first]
+        self.assertAlmostEqual(displacement[0], config['export_interval'], delta=2e-4)
+
+        # The .dat export carries the same ID with the same row
+        exported = pd.read_csv(os.path.join(config['export_directory'], f"{engine.simulation_label}_data_0.0005.dat"),
+                               sep="\t")
+        row = exported[exported['id'] == tracked].iloc[0]
+        self.assertAlmostEqual(row['temperature'], first_temperature[row_first])
+        np.testing.assert_allclose(row[['x', 'y', 'z']].to_numpy(dtype=float), first_positions[row_first])
+
+    def test_compact_storage_matches_dict_storage(self):
+        reference = SimulationEngine(self.config)
+        reference.run()
+        config = dict(self.config, particle_storage={'format': 'array', 'precision': 'float32', 'excluded_species': ['AR']})
+        compact = SimulationEngine(config)
+        compact.run()
+        for name in ('temperature', 'CH4', 'CO2'):
+            self.assertAlmostEqual(compact.compute_mean_scalar(name), reference.compute_mean_scalar(name),
+                                   delta=1e-4 * max(abs(reference.compute_mean_scalar(name)), 1.0))
+
+    def test_enthalpy_mixing_conserves_enthalpy(self):
+        class HalfwayMixing:
+            def apply_mixing(self, particle, strain_tensor, mean_properties, time_step=None):
+                for scalar in particle.properties:
+                    particle.properties[scalar] += 0.5 * (mean_properties[scalar] - particle.properties[scalar])
+                return 0.5
+
+        engine = SimulationEngine(dict(self.config, enthalpy_mixing={'enabled': True}))
+        engine.micromixing_model = HalfwayMixing()
+        gas = engine.particle_manager.gas
+        hot = {'CO2': 0.15, 'H2O': 0.12, 'N2': 0.73}
+        for k, particle in enumerate(engine.particle_manager.particles):
+            composition = hot if k % 2 else {'O2': 0.233, 'N2': 0.767}
+            particle.properties.update({name: composition.get(name, 0.0) for name in gas.species_names})
+            particle.properties['temperature'] = 2000.0 if k % 2 else 300.0
+        manager = engine.particle_manager
+        mass_fractions = manager.scalar_array(gas.species_names)
+        enthalpies = engine.thermo.mixture_enthalpy(manager.scalar_array(['temperature'])[:, 0], mass_fractions)
+
+        engine.mix_particles(1e-4)
+        mixed_fractions = manager.scalar_array(gas.species_names)
+        expected_enthalpies = enthalpies + 0.5 * (enthalpies.mean() - enthalpies)
+        for particle, enthalpy, fractions in zip(manager.particles, expected_enthalpies, mixed_fractions):
+            gas.HPY = enthalpy, ct.one_atm, fractions
+            self.assertAlmostEqual(particle.properties['temperature'], gas.T, delta=1e-4)
+        # Linear temperature mixing would move the cold particles to 725 K
+        self.assertGreater(abs(manager.particles[0].properties['temperature'] - 725.0), 1.0)
+        self.assertNotIn('enthalpy', manager.particles[0].properties)
+
+    def test_blocked_execution_matches_stage_by_stage(self):
+        flow_field_file = os.path.join(self.directory, 'turbulence.h5')
+        SyntheticTurbulenceGenerator(
+            {'synthetic_turbulence': {'resolution': [12, 12, 12], 'seed': 1}}
+        ).generate(flow_field_file)
+        for splitting in ({'scheme': 'lie'}, {'scheme': 'strang'}):
+            config = dict(self.config, flow_field_file=flow_field_file, num_particles=10, micromixing_constant=500.0,
+                          operator_splitting=splitting)
+            engines = []
+            for blocked in ({'enabled': False}, {'enabled': True, 'chunk_size': 3}):
+                engine = SimulationEngine(dict(config, blocked_execution=blocked))
+                for k, particle in enumerate(engine.particle_manager.particles):
+                    particle.properties['temperature'] = 1000.0 + 100.0 * k
+                engine.run()
+                engines.append(engine)
+            reference, blocked = engines
+            self.assertIsInstance(blocked.blocked_pipeline, BlockedPipeline)
+            np.testing.assert_array_equal(blocked.particle_manager.particle_positions(),
+                                          reference.particle_manager.particle_positions())
+            np.testing.assert_allclose(blocked.particle_manager.scalar_array(['temperature', 'CO']),
+                                       reference.particle_manager.scalar_array(['temperature', 'CO']), rtol=1e-12)
+            self.assertEqual(blocked.max_mixing_rate, reference.max_mixing_rate)
+
+    def test_fused_groups_split_before_dependent_mixing(self):
+        plan = [('transport', 0.5, 1), ('mixing', 0.5, 1), ('chemistry', 1.0, 1), ('mixing', 0.5, 1), ('transport', 0.5, 1)]
+        groups = BlockedPipeline.fused_groups(plan)
+        self.assertEqual([[stage for stage, _, _ in group] for group in groups],
+                         [['transport', 'mixing', 'chemistry'], ['mixing', 'transport']])
+
+class TestRunCache(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = RunCache(os.path.join(self.directory, 'cache'))
+        self.engines = []
+
+    def create_engine(self, config):
+        self.engines.append(config['export_directory'])
+        return SimulationEngine(config)
+
+    def test_identical_run_is_reused(self):
+        state, cached = self.cache.run(self.config, self.create_engine)
+        self.assertFalse(cached)
+        export_directory = self.config['export_directory']
+        with open(os.path.join(export_directory, 'scalar_variance_decay_comparison.dat')) as f:
+            variance_decay = f.read()
+        shutil.rmtree(export_directory)
+
+        # Output locations and 1 vs 1.0 do not change the key
+        config = dict(self.config, micromixing_constant=1, output_file='elsewhere.h5')
+        cached_state, cached = self.cache.run(config, self.create_engine)
+        self.assertTrue(cached)
+        self.assertEqual(len(self.engines), 1)
+        with open(os.path.join(export_directory, 'scalar_variance_decay_comparison.dat')) as f:
+            self.assertEqual(f.read(), variance_decay)
+        self.assertEqual(cached_state['names'], state['names'])
+        np.testing.assert_array_equal(cached_state['values'], state['values'])
+        np.testing.assert_array_equal(cached_state['positions'], state['positions'])
+
+    def test_changed_inputs_miss(self):
+        self.cache.run(self.config, self.create_engine)
+        self.cache.run(dict(self.config, diffusivity=2e-5), self.create_engine)
+        with h5py.File(self.config['flow_field_file'], 'a') as f:
+            f['u'][0, 0, 0] = 1.5
+        self.cache.run(self.config, self.create_engine)
+        self.assertEqual(len(self.engines), 3)
+        self.assertIsNone(self.cache.key(dict(self.config, seed=None)))
+
+    def test_single_point_files_merge_by_label(self):
+        self.cache.run(self.config, self.create_engine)
+        export_directory = self.config['export_directory']
+        LatexDataExporter('other_run', export_directory).append_single_data_point('particle_count.dat', 'other_run', 5)
+        self.cache.run(self.config, self.create_engine)
+        rows = pd.read_csv(os.path.join(export_directory, 'particle_count.dat'), sep="\t", header=None)
+        self.assertEqual(sorted(rows[0]), sorted(['other_run', SimulationEngine(self.config).simulation_label]))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = RunCache(os.path.join(self.directory, 'small_cache'), max_entries=2)
+        configs = [dict(self.config, diffusivity=d) for d in (1e-5, 2e-5, 3e-5)]
+        cache.run(configs[0], self.create_engine)
+        cache.run(configs[1], self.create_engine)
+        cache.run(configs[0], self.create_engine)
+        cache.run(configs[2], self.create_engine)
+        self.assertIsNotNone(cache.lookup(cache.key(configs[0])))
+        self.assertIsNone(cache.lookup(cache.key(configs[1])))
+        self.assertEqual(len(cache.entries()), 2)
+
+class TestSteadyState(EngineTestCase):
+    def monitor(self, **settings):
+        settings = dict({'quantities': ['mean_temperature'], 'window': 20, 'relative_tolerance': 1e-3}, **settings)
+        return SteadyStateMonitor({'steady_state': settings})
+
+    def feed(self, monitor, values):
+        for k, value in enumerate(values):
+            monitor.add_sample(1e-3 * k, {'mean_temperature': value})
+
+    def test_stationarity_tests(self):
+        rng = np.random.default_rng(0)
+        noisy = 1500.0 + 0.1 * rng.standard_normal(20)
+        drifting = np.linspace(1200.0, 1500.0, 20)
+        for test in ('relative_change', 'batch_means'):
+            with self.subTest(test=test):
+                monitor = self.monitor(test=test)
+                self.feed(monitor, noisy[:19])
+                self.assertFalse(monitor.converged())  # window not full yet
+                self.feed(monitor, noisy[19:])
+                self.assertTrue(monitor.converged())
+                self.feed(monitor, drifting)
+                self.assertFalse(monitor.converged())
+
+        # Batch means rejects noise too large for the tolerance even without drift
+        monitor = self.monitor(test='batch_means', relative_tolerance=1e-5)
+        self.feed(monitor, 1500.0 + rng.standard_normal(20))
+        self.assertFalse(monitor.status()['mean_temperature']['steady'])
+
+    def test_min_time_and_validation(self):
+        monitor = self.monitor(min_time=1.0)
+        self.feed(monitor, np.full(20, 1500.0))
+        self.assertFalse(monitor.converged())
+        with self.assertRaises(ValueError):
+            self.monitor(test='unknown')
+        with self.assertRaises(ValueError):
+            self.monitor(quantities=['median_temperature'])
+
+    def test_steady_run_ends_early(self):
+        # Inert, uniform particles are steady from the start
+        config = dict(self.config, total_time=1.0, steady_state={
+            'enabled': True, 'window': 4, 'absolute_tolerance': 1e-9,
+        })
+        config['initial_conditions'] = dict(config['initial_conditions'], composition={'N2': 1.0})
+        engine = SimulationEngine(config)
+        try:
+            engine.run()
+        finally:
+            engine.close()
+        self.assertEqual(engine.stop_reason, 'steady_state')
+        self.assertEqual(engine.current_step, 4)
+        self.assertLess(engine.time, config['total_time'])
+
+        export_directory = config['export_directory']
+        reason = pd.read_csv(os.path.join(export_directory, 'termination_reason.dat'), sep="\t", header=None)
+        termination_time = pd.read_csv(os.path.join(export_directory, 'termination_time.dat'), sep="\t", header=None)
+        self.assertEqual(reason[1][0], 'steady_state')
+        self.assertAlmostEqual(termination_time[1][0], engine.time)
+        variance = pd.read_csv(os.path.join(export_directory, 'scalar_variance_decay_comparison.dat'), sep="\t")
+        self.assertAlmostEqual(variance['Time'].max(), engine.time)
+
+    def test_deferred_stages_delay_termination(self):
+        # No export before the third step, which would flush the deferred chemistry
+        config = dict(self.config, total_time=1.0, export_interval=1.0, steady_state={
+            'enabled': True, 'window': 2, 'absolute_tolerance': 1e-9,
+        }, operator_splitting={'intervals': {'chemistry': 3}})
+        config['initial_conditions'] = dict(config['initial_conditions'], composition={'N2': 1.0})
+        engine = SimulationEngine(config)
+        try:
+            engine.run()
+        finally:
+            engine.close()
+        self.assertEqual(engine.current_step, 3)
+        self.assertEqual(engine.stop_reason, 'steady_state')
+
+class TestMemoryAccounting(EngineTestCase):
+    def test_budget_fails_fast_with_projection(self):
+        config = dict(self.config, num_particles=100000, memory_accounting={'enabled': True, 'budget_mb': 1})
+        with mock.patch('core.engine.SimulationEngine.initialize_components') as initialize_components:
+            with self.assertRaisesRegex(RuntimeError, r"100000 particles exceeds the budget of 1 MB"):
+                SimulationEngine(config)
+        initialize_components.assert_not_called()
+
+    def test_reports_are_exported(self):
+        config = dict(self.config, num_particles=50, particle_storage={'format': 'array'},
+                      memory_accounting={'enabled': True, 'budget_mb': 1e6, 'probe_particles': 50})
+        engine = SimulationEngine(config)
+        try:
+            engine.run()
+        finally:
+            engine.close()
+        export_directory = config['export_directory']
+        report = pd.read_csv(os.path.join(export_directory, 'memory_report.dat'), sep="\t")
+        # Startup and one row per continuous export
+        self.assertEqual(len(report), 1 + 2)
+        self.assertTrue(np.all(report['Flow Field'] == 3 * 10 * 8 + 3 * 1000 * 8))
+        self.assertTrue(np.all(report['RSS'] > report['Particle State']))
+        projected = pd.read_csv(os.path.join(export_directory, 'bytes_per_particle_projected.dat'), sep="\t", header=None)
+        actual = pd.read_csv(os.path.join(export_directory, 'bytes_per_particle_actual.dat'), sep="\t", header=None)
+        self.assertLess(abs(projected[1][0] / actual[1][0] - 1.0), 0.5)
+
+    def test_decomposed_run_sums_worker_footprints(self):
+        config = dict(self.config, num_particles=40, domain_decomposition={'enabled': True, 'num_workers': 2},
+                      memory_accounting={'enabled': True, 'budget_mb': 1e6, 'probe_particles': 40})
+        engine = DomainDecomposedEngine(config)
+        engine.run()
+        report = pd.read_csv(os.path.join(config['export_directory'], 'memory_report.dat'), sep="\t")
+        # The grid of this process and one full flow field per worker
+        self.assertTrue(np.all(report['Flow Field'] == 3 * 10 * 8 + 2 * (3 * 10 * 8 + 3 * 1000 * 8)))
+        self.assertTrue(np.all(report['Particle State'] > 0))
+        self.assertTrue(np.all(report['RSS'] > report['Particle State'] + report['Flow Field']))
+        actual = pd.read_csv(os.path.join(config['export_directory'], 'bytes_per_particle_actual.dat'),
+                             sep="\t", header=None)
+        self.assertGreater(actual[1][0], 0)
+
+    def test_projection_counts(self):
+        config = dict(self.config, num_particles=100, population_control={'enabled': True, 'n_min': 4},
+                      domain_decomposition={'enabled': True, 'num_workers': 2})
+        accountant = MemoryAccountant(config)
+        self.assertEqual(accountant.projected_particle_count(), 400)
+        self.assertEqual(accountant.projected_flow_field_bytes(), 3 * 10 * 8 + 3 * 1000 * 8)
+        solver = FluidSolverInterface(config)
+        # The interpolators share the solver's arrays
+        self.assertEqual(array_bytes(solver), 3 * 10 * 8 + 3 * 1000 * 8)
+
+class TestTelemetry(EngineTestCase):
+    def scrape(self, address):
+        import urllib.request
+        host, port = address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+            return response.read().decode()
+
+    @staticmethod
+    def sample(text, name):
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.split()[-1])
+        return None
+
+    def test_metrics_are_served_during_run(self):
+        config = dict(self.config, telemetry={'enabled': True, 'port': 0})
+        engine = SimulationEngine(config)
+        scrapes = []
+        collect_data = engine.collect_data
+
+        def scraping_collect_data():
+            collect_data()
+            scrapes.append(self.scrape(engine.telemetry.address))
+
+        engine.collect_data = scraping_collect_data
+        try:
+            engine.run()
+        finally:
+            engine.close()
+        self.assertIsNone(engine.telemetry.address)
+
+        # The metrics of a step are recorded after its data is collected
+        last = scrapes[-1]
+        self.assertEqual(self.sample(last, 'iroh_steps_total'), engine.current_step - 1)
+        self.assertEqual(self.sample(last, 'iroh_particles'), 4)
+        self.assertGreater(self.sample(last, 'iroh_simulated_time_seconds'), 0.0)
+        self.assertEqual(self.sample(last, 'iroh_chemistry_integrations_total{model="detailed"}'),
+                         4 * engine.current_step)
+        self.assertGreater(self.sample(last, 'iroh_stage_particles_per_second{stage="chemistry"}'), 0.0)
+        self.assertGreater(self.sample(last, 'iroh_resident_memory_bytes{process="main"}'), 0.0)
+        self.assertEqual(self.sample(last, 'iroh_export_queue_depth'), 0.0)
+        self.assertIn('# TYPE iroh_stage_seconds_total counter', last)
+        self.assertEqual(engine.metrics.steps, engine.current_step)
+
+    def test_deferred_chemistry_counts_as_skip(self):
+        config = dict(self.config, operator_splitting={'intervals': {'chemistry': 2}},
+                      blocked_execution={'enabled': True, 'chunk_size': 3})
+        engine = SimulationEngine(config)
+        engine.metrics.start_run(engine.total_time, 4)
+        for _ in range(3):
+            engine.advance_stages()
+        engine.close()
+        self.assertEqual(engine.metrics.chemistry_skips, 8)
+        self.assertEqual(engine.metrics.chemistry_integrations['detailed'], 4)
+        self.assertEqual(engine.metrics.step_stage_particles['transport'], 12)
+
+    @unittest.skipUnless(hasattr(__import__('socket'), 'AF_UNIX'), "Unix sockets are not available")
+    def test_unix_socket_endpoint(self):
+        import socket
+        metrics = SimulationMetrics()
+        metrics.end_step(1e-3, 1e-4, 10)
+        path = os.path.join(self.directory, 'telemetry.sock')
+        server = TelemetryServer(metrics, unix_socket=path)
+        server.start()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(path)
+                client.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+                response = b''.join(iter(lambda: client.recv(65536), b'')).decode()
+        finally:
+            server.stop()
+        self.assertTrue(response.startswith('HTTP/1.0 200'))
+        self.assertEqual(self.sample(response, 'iroh_simulated_time_seconds'), 1e-3)
+        self.assertFalse(os.path.exists(path))
+
+class TestCostModel(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.config['cost_model'] = {
+            'calibration_particles': [2, 6],
+            'calibration_steps': 2,
+            'calibration_file': os.path.join(self.directory, 'calibrations.json'),
+        }
+
+    def test_fit_is_linear_and_non_negative(self):
+        a, b = fit_linear([1, 2, 4], [3.0, 5.0, 9.0])
+        self.assertAlmostEqual(a, 1.0)
+        self.assertAlmostEqual(b, 2.0)
+        self.assertEqual(fit_linear([1, 2], [2.0, 1.0])[1], 0.0)
+
+    def test_step_and_call_counts(self):
+        engine = SimulationEngine(self.config)
+        try:
+            engine.run()
+        finally:
+            engine.close()
+        model = CostModel(self.config)
+        self.assertEqual(model.num_steps(self.config['time_step']), engine.current_step)
+        self.assertEqual(model.num_exports(), 2)
+        config = dict(self.config, operator_splitting={
+            'scheme': 'strang', 'substeps': {'chemistry': 3}, 'intervals': {'chemistry': 2}
+        })
+        self.assertEqual(CostModel(config).stage_calls_per_step(),
+                         {'transport': 2.0, 'mixing': 2.0, 'chemistry': 1.5})
+
+    def test_key_ignores_run_length(self):
+        key = CostModel(self.config).key()
+        self.assertEqual(CostModel(dict(self.config, num_particles=1000, total_time=1.0,
+                                        export_directory='elsewhere')).key(), key)
+        self.assertNotEqual(CostModel(dict(self.config, time_step=1e-4)).key(), key)
+        self.assertNotEqual(CostModel(dict(self.config, chemistry_model='tabulated')).key(), key)
+
+    def test_calibration_is_saved_and_reused(self):
+        predictions = CostModel(self.config).estimate(SimulationEngine, particle_counts=[40])
+        self.assertEqual([prediction['num_particles'] for prediction in predictions], [4, 40])
+        small, large = predictions
+        self.assertEqual(small['steps'], 4)
+        self.assertGreater(large['total_seconds'], small['total_seconds'])
+        self.assertGreater(large['peak_memory'], small['peak_memory'])
+        self.assertGreater(small['seconds']['chemistry'], 0.0)
+
+        # Another run length and particle count needs no new measurements
+        config = dict(self.config, num_particles=40, total_time=2e-3)
+        model = CostModel(config)
+        with mock.patch.object(CostModel, 'calibrate', side_effect=AssertionError("recalibrated")):
+            prediction, = model.estimate(SimulationEngine)
+        self.assertEqual(prediction['steps'], 8)
+        self.assertAlmostEqual(prediction['seconds']['chemistry'], 2 * large['seconds']['chemistry'])
+        self.assertEqual(model.key(), CostModel(self.config).key())
+
+class TestMonteCarloSimulation(unittest.TestCase):
+    def test_quasi_random_samples_follow_distributions(self):
+        from scipy import stats
+        distributions = [stats.uniform(loc=1000.0, scale=400.0), stats.norm(loc=1.0, scale=0.1)]
+        for sampling in ('sobol', 'lhs'):
+            monte_carlo = MonteCarloSimulation({'sampling': sampling, 'seed': 3, 'num_samples': 256})
+            samples = monte_carlo.sample_parameters(distributions)
+            self.assertEqual(samples.shape, (256, 2))
+            self.assertTrue(np.all((samples[:, 0] >= 1000.0) & (samples[:, 0] <= 1400.0)))
+            self.assertAlmostEqual(samples[:, 0].mean(), 1200.0, delta=2.0)
+            self.assertAlmostEqual(samples[:, 1].std(), 0.1, delta=0.005)
+
+    def test_unknown_sampling_raises(self):
+        with self.assertRaises(ValueError):
+            MonteCarloSimulation({'sampling': 'halton'})
+
+def analytic_member(task):
+    config = task['config']
+    temperature = config['initial_conditions']['temperature']
+    return [temperature * np.exp(-0.1 * config['micromixing_constant'])]
+
+class TestUncertaintyEnsemble(EngineTestCase):
+    def ensemble_config(self, **settings):
+        return dict(self.config, uncertainty_quantification=dict({
+            'parameters': {
+                'initial_conditions.temperature': {'distribution': 'norm', 'loc': 1200.0, 'scale': 20.0},
+                'micromixing_constant': {'distribution': 'uniform', 'loc': 0.5, 'scale': 1.0},
+            },
+            'outputs': ['mean_temperature'],
+            'num_workers': 1,
+            'output_directory': os.path.join(self.directory, 'ensemble'),
+        }, **settings))
+
+    def test_apply_parameters_renormalizes_composition(self):
+        member_config = apply_parameters(self.config, ['initial_conditions.composition.CH4', 'micromixing_constant'], [0.195, 2.0])
+        composition = member_config['initial_conditions']['composition']
+        self.assertAlmostEqual(sum(composition.values()), 1.0)
+        self.assertAlmostEqual(composition['CH4'], 0.195 / 1.1)
+        self.assertEqual(member_config['micromixing_constant'], 2.0)
+        self.assertEqual(self.config['initial_conditions']['composition']['CH4'], 0.095)
+
+    def test_sobol_stops_early_at_tolerance(self):
+        config = self.ensemble_config(sampling='sobol', relative_tolerance=1e-4, max_members=4096)
+        ensemble = UncertaintyEnsemble(config)
+        result = ensemble.run(analytic_member)
+        self.assertTrue(result['converged'])
+        self.assertLess(result['num_members'], 4096)
+        statistics = result['statistics']['mean_temperature']
+        self.assertLessEqual(statistics['half_width'], statistics['tolerance'])
+        self.assertLess(statistics['half_width'], statistics['monte_carlo_half_width'])
+        # Exact mean: 1200 * E[exp(-0.1 k)] for k ~ U(0.5, 1.5)
+        expected = 1200.0 * (np.exp(-0.05) - np.exp(-0.15)) / 0.1
+        self.assertAlmostEqual(statistics['mean'], expected, delta=3 * statistics['half_width'])
+        with h5py.File(ensemble.save_results(), 'r') as f:
+            self.assertEqual(f['outputs'].shape, (result['num_members'], 1))
+            self.assertEqual(len(f['history/num_members']), len(result['history']))
+
+    def test_members_run_in_parallel_processes(self):
+        config = self.ensemble_config(num_replicates=2, initial_samples=1, max_members=2, num_workers=2)
+        result = UncertaintyEnsemble(config).run()
+        self.assertEqual(result['num_members'], 2)
+        self.assertTrue(np.isfinite(result['statistics']['mean_temperature']['mean']))
+        self.assertTrue(os.path.isdir(os.path.join(self.directory, 'ensemble', 'member_00001')))
+
+class TestDomainDecomposition(EngineTestCase):
+    class Grid:
+        x = y = z = np.linspace(0, 1, 10)
+
+    def test_slab_decomposition(self):
+        decomposition = SlabDecomposition(self.Grid, 3)
+        positions = np.array([[-0.5, 0.5, 0.5], [0.4, 0.5, 0.5], [0.7, 0.5, 0.5], [1.5, 0.5, 0.5]])
+        np.testing.assert_array_equal(decomposition.owner(positions), [0, 1, 2, 2])
+        self.assertEqual(sum(decomposition.particle_shares(100)), 100)
+        lower, upper = decomposition.subdomain_bounds(0)
+        np.testing.assert_allclose(lower, [0, 0, 0])
+        np.testing.assert_allclose(upper, [1 / 3, 1, 1])
+        with self.assertRaises(ValueError):
+            SlabDecomposition(self.Grid, 10)
+
+    def test_single_worker_matches_serial_run(self):
+        serial = SimulationEngine(self.config)
+        serial.run()
+        config = dict(self.config, domain_decomposition={'enabled': True, 'num_workers': 1})
+        decomposed = DomainDecomposedEngine(config)
+        try:
+            # Run the time loop without the final shutdown so the workers can be queried
+            SimulationEngine.run(decomposed)
+            self.assertEqual(decomposed.time, serial.time)
+            self.assertAlmostEqual(decomposed.compute_mean_scalar('temperature'), serial.compute_mean_scalar('temperature'))
+            self.assertAlmostEqual(decomposed.compute_mean_scalar('CO'), serial.compute_mean_scalar('CO'))
+        finally:
+            decomposed.shutdown()
+
+    def test_adaptive_step_matches_serial_run(self):
+        config = dict(self.config, adaptive_time_step={'enabled': True, 'max_relative_change': 1e-3})
+        serial = SimulationEngine(config)
+        serial.run()
+        decomposed = DomainDecomposedEngine(dict(config, domain_decomposition={'enabled': True, 'num_workers': 1}))
+        try:
+            SimulationEngine.run(decomposed)
+            self.assertGreater(serial.chemistry_relative_change, 0.0)
+            self.assertAlmostEqual(decomposed.chemistry_relative_change, serial.chemistry_relative_change)
+            self.assertEqual(decomposed.current_step, serial.current_step)
+        finally:
+            decomposed.shutdown()
+
+    def test_worker_startup_failure_raises(self):
+        # The transport scheme is only checked by the workers' own engines
+        config = dict(self.config, transport_scheme='bogus', domain_decomposition={'enabled': True, 'num_workers': 2})
+        with self.assertRaisesRegex(RuntimeError, "Worker 0 failed"):
+            DomainDecomposedEngine(config)
+
+    def test_tabulated_chemistry_table_built_once(self):
+        config = dict(self.config, chemistry_model='tabulated', domain_decomposition={'enabled': True, 'num_workers': 2},
+                      tabulated_chemistry={'mixture_fraction_grid': [0.0, 0.055, 1.0], 'progress_points': 5,
+                                           'reactor_end_time': 0.01,
+                                           'cache_directory': os.path.join(self.directory, 'tables')})
+        with mock.patch.object(TabulatedChemistry, 'generate_table', autospec=True,
+                               side_effect=TabulatedChemistry.generate_table) as generate_table:
+            engine = DomainDecomposedEngine(config)
+        try:
+            generate_table.assert_called_once()
+            self.assertEqual(len(os.listdir(config['tabulated_chemistry']['cache_directory'])), 1)
+            SimulationEngine.run(engine)
+            self.assertEqual(engine.time, config['total_time'])
+        finally:
+            engine.shutdown()
+
+    def test_particles_migrate_to_owner(self):
+        config = dict(self.config, num_particles=12, domain_decomposition={'enabled': True, 'num_workers': 3})
+        engine = DomainDecomposedEngine(config)
+        try:
+            self.assertEqual(engine.total_particle_count(), 12)
+            # u = 1 in x: a 0.3 s step moves every particle about one slab to the right
+            engine.transport_particles(0.3)
+            self.assertEqual(engine.total_particle_count(), 12)
+            for rank, (positions, _) in enumerate(engine.broadcast('samples', ('temperature',))):
+                np.testing.assert_array_equal(engine.decomposition.owner(positions), rank)
+            engine.mix_particles(0.3)
+            total_weight, mean_temperature, _ = engine.reduced_statistics('temperature')
+            self.assertAlmostEqual(total_weight, 12.0)
+            self.assertAlmostEqual(mean_temperature, 1200.0)
+        finally:
+            engine.shutdown()
+
+    def test_decomposed_run_reduces_statistics(self):
+        config = dict(self.config, num_particles=8, domain_decomposition={'enabled': True, 'num_workers': 2})
+        engine = DomainDecomposedEngine(config)
+        engine.run()
+        self.assertEqual(engine.time, config['total_time'])
+        self.assertTrue(os.path.exists(os.path.join(config['export_directory'], 'scalar_variance_decay_comparison.dat')))
+
+    def test_particle_ids_stay_unique_across_workers(self):
+        config = dict(self.config, num_particles=12, domain_decomposition={'enabled': True, 'num_workers': 3},
+                      particle_sorting={'enabled': True, 'interval': 1})
+        engine = DomainDecomposedEngine(config)
+        engine.run()
+        self.assertEqual(sorted(engine.final_state()['ids']), list(range(12)))
+
+class TestSnapshotIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.directory, 'simulation_output.h5')
+        rng = np.random.default_rng(0)
+        self.snapshots = {}
+        with h5py.File(self.data_file, 'w') as f:
+            for k, name in enumerate(('time_0.00', 'time_0.01', 'time_0.02')):
+                # Particles sorted along x, so blocks cover slabs of the domain
+                positions = rng.random((1000, 3))
+                positions = positions[np.argsort(positions[:, 0])]
+                temperature = 300.0 + 1000.0 * positions[:, 0] + 10.0 * k
+                group = f.create_group(name)
+                chunks = (100, 3) if k == 1 else None  # One chunked snapshot read by hyperslabs
+                group.create_dataset('positions', data=positions, chunks=chunks)
+                group.create_dataset('temperature', data=temperature, chunks=chunks and (100,))
+                group.create_dataset('CO', data=0.01 * positions[:, 1], chunks=chunks and (100,))
+                self.snapshots[0.01 * k] = (positions, temperature)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_box_query_reads_only_needed_blocks(self):
+        box = ((0.2, 0.0, 0.0), (0.3, 0.5, 1.0))
+        with SnapshotIndex(self.data_file, block_rows=100) as index:
+            self.assertGreaterEqual(index.snapshots[0]['offsets']['positions'], 0)
+            self.assertEqual(index.snapshots[1]['offsets']['positions'], -1)
+            result = index.query(['temperature', 'CO'], box=box, time_range=(0.005, 0.03))
+            rows_read = index.rows_read
+
+        expected_times, expected_temperatures = [], []
+        for time, (positions, temperature) in self.snapshots.items():
+            if time < 0.005:
+                continue
+            inside = np.all((positions >= box[0]) & (positions <= box[1]), axis=1)
+            expected_times.append(np.full(inside.sum(), time))
+            expected_temperatures.append(temperature[inside])
+        np.testing.assert_allclose(result['time'], np.concatenate(expected_times))
+        np.testing.assert_allclose(result['temperature'], np.concatenate(expected_temperatures))
+        self.assertTrue(np.all((result['positions'] >= box[0]) & (result['positions'] <= box[1])))
+        self.assertEqual(result['CO'].shape, result['temperature'].shape)
+        # Two snapshots of 1000 rows, three columns read; the x slab needs only a few blocks of each
+        self.assertLess(rows_read, 0.3 * 2 * 1000 * 3)
+
+    def test_value_range_and_index_summaries(self):
+        with SnapshotIndex(self.data_file, block_rows=100) as index:
+            result = index.query('temperature', value_range=(1200.0, 1250.0))
+            low, high = index.scalar_range('temperature')
+            lower, upper = index.bounds(0.0)
+            np.testing.assert_allclose(index.times(), [0.0, 0.01, 0.02])
+        self.assertTrue(np.all((result['temperature'] >= 1200.0) & (result['temperature'] <= 1250.0)))
+        expected = sum(np.sum((t >= 1200.0) & (t <= 1250.0)) for _, t in self.snapshots.values())
+        self.assertEqual(len(result['temperature']), expected)
+        self.assertAlmostEqual(low, min(t.min() for _, t in self.snapshots.values()))
+        self.assertAlmostEqual(high, max(t.max() for _, t in self.snapshots.values()))
+        np.testing.assert_allclose(lower, self.snapshots[0.0][0].min(axis=0))
+        np.testing.assert_allclose(upper, self.snapshots[0.0][0].max(axis=0))
+
+    def test_index_is_saved_and_rebuilt_when_stale(self):
+        with SnapshotIndex(self.data_file) as index:
+            self.assertEqual(len(index.snapshots), 3)
+        self.assertTrue(os.path.exists(self.data_file + '.index.h5'))
+        with mock.patch.object(SnapshotIndex, 'build_index', side_effect=AssertionError("rebuilt")):
+            with SnapshotIndex(self.data_file) as index:
+                self.assertEqual(len(index.snapshots), 3)
+
+        with h5py.File(self.data_file, 'a') as f:
+            group = f.create_group('time_0.03')
+            group.create_dataset('positions', data=np.zeros((5, 3)))
+            group.create_dataset('temperature', data=np.full(5, 400.0))
+        with SnapshotIndex(self.data_file) as index:
+            self.assertEqual(len(index.query('temperature', time_range=(0.03, 0.03))['temperature']), 5)
+            with self.assertRaises(ValueError):
+                index.query('CO')
+
+class TestVisualizer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.directory, 'simulation_output.h5')
+        rng = np.random.default_rng(0)
+        with h5py.File(self.data_file, 'w') as f:
+            for name in ('time_0.00', 'time_0.01', 'time_0.01_1', 'summary'):
+                group = f.create_group(name)
+                if name == 'summary':
+                    continue
+                positions = rng.random((500, 3))
+                group.create_dataset('positions', data=positions)
+                group.create_dataset('temperature', data=300.0 + 1000.0 * positions[:, 0])
+                group.create_dataset('CO', data=0.01 * positions[:, 1])
+        self.visualizer = Visualizer(self.data_file)
+
+    def tearDown(self):
+        self.visualizer.close()
+        shutil.rmtree(self.directory)
+
+    def test_snapshots_are_sorted(self):
+        self.assertEqual(
+            self.visualizer.snapshots(), [(0.0, 'time_0.00'), (0.01, 'time_0.01'), (0.01, 'time_0.01_1')]
+        )
+
+    def test_render_batch_in_pool(self):
+        output_directory = os.path.join(self.directory, 'frames')
+        frames = self.visualizer.render_batch(
+            ['temperature', 'CO'], output_directory, bins=(16, 16), num_workers=2, animation_format='gif'
+        )
+        self.assertEqual(len(frames['temperature']), 3)
+        for images in frames.values():
+            for image in images:
+                self.assertTrue(os.path.getsize(image) > 0)
+        self.assertTrue(os.path.exists(os.path.join(output_directory, 'temperature.gif')))
+
+    def test_render_selected_times_decimated(self):
+        output_directory = os.path.join(self.directory, 'scatter')
+        frames = self.visualizer.render_batch(
+            ['temperature'], output_directory, times=[0.0], mode='scatter', max_points=50, num_workers=1
+        )
+        self.assertEqual(len(frames['temperature']), 1)
+        with self.assertRaises(ValueError):
+            self.visualizer.render_batch(['temperature'], output_directory, times=[0.5], num_workers=1)
+
+    def test_limits_from_index(self):
+        with h5py.File(self.data_file, 'r') as f:
+            temperature = f['time_0.01']['temperature'][:]
+            temperature = np.concatenate((temperature, f['time_0.01_1']['temperature'][:]))
+            positions = f['time_0.00']['positions'][:]
+        self.assertEqual(self.visualizer.scalar_limits([0.01], 'temperature'), (temperature.min(), temperature.max()))
+        extent = self.visualizer.position_extent([0.0], (0, 2))
+        np.testing.assert_allclose(extent, (positions[:, 0].min(), positions[:, 0].max(),
+                                            positions[:, 2].min(), positions[:, 2].max()))
+        self.assertTrue(os.path.exists(self.visualizer.snapshot_index().index_file))
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
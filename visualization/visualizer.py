@@ -1,15 +1,90 @@
 # visualization/visualizer.py
 
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import matplotlib.pyplot as plt
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import h5py
 import numpy as np
 
+from data_io.output_handler import snapshot_label
+from data_io.snapshot_query import SNAPSHOT_PATTERN, SnapshotIndex
+
+AXIS_LABELS = ('X Position', 'Y Position', 'Z Position')
+
+
+def render_frame(task):
+    """
+    Render one scalar of one snapshot to an image file with the Agg backend.
+    Runs in a worker process, so it opens the HDF5 file itself and reads only
+    the two position columns and the scalar it draws.
+    :param task: dict with data_file, group, time, scalar_name, output_file, mode,
+                 axes, max_points, bins, extent, color_limits, dpi, cmap
+    :return: path of the written image
+    """
+    horizontal, vertical = task['axes']
+    with h5py.File(task['data_file'], 'r') as f:
+        group = f[task['group']]
+        num_particles = group['positions'].shape[0]
+        if task['mode'] == 'scatter':
+            # Strided decimation keeps reads contiguous
+            stride = max(1, int(np.ceil(num_particles / task['max_points'])))
+            selection = slice(None, None, stride)
+        else:
+            selection = slice(None)
+        x = group['positions'][selection, horizontal]
+        y = group['positions'][selection, vertical]
+        values = group[task['scalar_name']][selection]
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    vmin, vmax = task['color_limits'] if task['color_limits'] is not None else (None, None)
+    if task['mode'] == 'scatter':
+        image = ax.scatter(x, y, c=values, cmap=task['cmap'], s=1, vmin=vmin, vmax=vmax,
+                           rasterized=True)
+    else:
+        # Mean value per pixel; empty pixels stay transparent
+        extent = task['extent']
+        edges = (np.linspace(extent[0], extent[1], task['bins'][0] + 1),
+                 np.linspace(extent[2], extent[3], task['bins'][1] + 1))
+        counts, _, _ = np.histogram2d(x, y, bins=edges)
+        sums, _, _ = np.histogram2d(x, y, bins=edges, weights=values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        image = ax.imshow(means.T, origin='lower', extent=extent, aspect='auto', cmap=task['cmap'],
+                          vmin=vmin, vmax=vmax, interpolation='nearest')
+    figure.colorbar(image, ax=ax, label=task['scalar_name'])
+    ax.set_xlabel(AXIS_LABELS[horizontal])
+    ax.set_ylabel(AXIS_LABELS[vertical])
+    ax.set_title(f"{task['scalar_name']} Distribution at Time {task['time']:.4g}")
+    figure.savefig(task['output_file'], dpi=task['dpi'])
+    return task['output_file']
+
+
 class Visualizer:
     def __init__(self, data_file):
+        self.data_file_path = os.path.abspath(data_file)
         self.data_file = h5py.File(data_file, 'r')
+        self.index = None
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+        self.data_file.close()
+
+    def snapshot_index(self):
+        """Return the SnapshotIndex of the data file, built (or loaded) on first use."""
+        if self.index is None:
+            self.index = SnapshotIndex(self.data_file_path)
+        return self.index
 
     def plot_scalar_field(self, time, scalar_name):
-        time_group = self.data_file.get(f"time_{time:.2f}")
+        time_group = self.data_file.get(f"time_{snapshot_label(time)}")
         positions = time_group['positions'][:]
         scalar_values = time_group[scalar_name][:]
         plt.scatter(positions[:, 0], positions[:, 1], c=scalar_values, cmap='jet', s=5)
@@ -18,3 +93,148 @@ class Visualizer:
         plt.ylabel('Y Position')
         plt.title(f"{scalar_name} Distribution at Time {time:.2f}")
         plt.show()
+
+    def snapshots(self):
+        """
+        Return the snapshot groups sorted by time.
+        :return: list of (time, group name)
+        """
+        entries = []
+        for name in self.data_file.keys():
+            match = SNAPSHOT_PATTERN.match(name)
+            if match and 'positions' in self.data_file[name]:
+                entries.append((float(match.group(1)), int(match.group(2) or 0), name))
+        return [(time, name) for time, _, name in sorted(entries)]
+
+    def scalar_limits(self, times, scalar_name):
+        """Return the (min, max) of a scalar over the snapshots at the given times, from the snapshot index."""
+        return self.snapshot_index().scalar_range(scalar_name, times)
+
+    def position_extent(self, times, axes):
+        """
+        Return the (xmin, xmax, ymin, ymax) bounding box of the positions over the snapshots
+        at the given times, from the snapshot index.
+        """
+        lower, upper = self.snapshot_index().bounds(times)
+        lower = lower[list(axes)]
+        upper = upper[list(axes)]
+        upper = np.where(upper > lower, upper, lower + 1.0)
+        return (float(lower[0]), float(upper[0]), float(lower[1]), float(upper[1]))
+
+    def render_batch(self, scalar_names, output_directory, times=None, mode='histogram', axes=(0, 1),
+                     max_points=50000, bins=(256, 256), extent=None, num_workers=None, dpi=100, cmap='jet',
+                     fixed_color_limits=True, animation_format=None, fps=10):
+        """
+        Render scalars of many snapshots to image files in a process pool.
+        :param scalar_names: scalars to draw, one image per scalar and snapshot
+        :param output_directory: directory for the images (and animations)
+        :param times: snapshot times to render (all snapshots by default)
+        :param mode: 'histogram' rasterizes the per-pixel mean, 'scatter' draws at most max_points points
+        :param axes: position components on the horizontal and vertical axes
+        :param extent: histogram (xmin, xmax, ymin, ymax); defaults to the bounding box of all snapshots
+        :param num_workers: pool size (None uses all cores, 1 renders in this process)
+        :param fixed_color_limits: share color limits across the snapshots of each scalar
+        :param animation_format: None, 'gif' or 'mp4' to assemble one animation per scalar
+        :return: dict of scalar name -> list of image paths, in time order
+        """
+        if mode not in ('histogram', 'scatter'):
+            raise ValueError(f"Unknown rendering mode '{mode}'. Expected 'histogram' or 'scatter'.")
+        snapshots = self.snapshots()
+        if times is not None:
+            wanted = [float(time) for time in times]
+            snapshots = [(time, name) for time, name in snapshots if any(np.isclose(time, t) for t in wanted)]
+        if not snapshots:
+            raise ValueError("No snapshots to render.")
+        snapshot_times = [time for time, _ in snapshots]
+        os.makedirs(output_directory, exist_ok=True)
+
+        # Extent and color limits come from the snapshot index rather than a serial pass over the data
+        if mode == 'histogram' and extent is None:
+            extent = self.position_extent(snapshot_times, axes)
+        tasks = []
+        for scalar_name in scalar_names:
+            color_limits = self.scalar_limits(snapshot_times, scalar_name) if fixed_color_limits else None
+            for index, (time, group) in enumerate(snapshots):
+                tasks.append({
+                    'data_file': self.data_file_path,
+                    'group': group,
+                    'time': time,
+                    'scalar_name': scalar_name,
+                    'output_file': os.path.join(output_directory, f"{scalar_name}_{index:05d}.png"),
+                    'mode': mode,
+                    'axes': tuple(axes),
+                    'max_points': max_points,
+                    'bins': tuple(bins),
+                    'extent': extent,
+                    'color_limits': color_limits,
+                    'dpi': dpi,
+                    'cmap': cmap,
+                })
+
+        if num_workers == 1:
+            images = [render_frame(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                images = list(executor.map(render_frame, tasks))
+
+        frames = {scalar_name: images[i * len(snapshots):(i + 1) * len(snapshots)]
+                  for i, scalar_name in enumerate(scalar_names)}
+        if animation_format is not None:
+            for scalar_name, images in frames.items():
+                self.assemble_animation(
+                    images, os.path.join(output_directory, f"{scalar_name}.{animation_format}"), fps, dpi
+                )
+        return frames
+
+    @staticmethod
+    def assemble_animation(image_files, output_file, fps=10, dpi=100):
+        """
+        Combine rendered frames into an animation ('.gif' uses Pillow, '.mp4' needs ffmpeg).
+        """
+        writer_name = 'ffmpeg' if output_file.endswith('.mp4') else 'pillow'
+        if not animation.writers.is_available(writer_name):
+            raise RuntimeError(f"Animation writer '{writer_name}' is not available.")
+        first = plt.imread(image_files[0])
+        height, width = first.shape[:2]
+        figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        image = ax.imshow(first)
+        writer = animation.writers[writer_name](fps=fps)
+        with writer.saving(figure, output_file, dpi):
+            for image_file in image_files:
+                image.set_data(plt.imread(image_file))
+                writer.grab_frame()
+        return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render particle snapshots to images.")
+    parser.add_argument('data_file')
+    parser.add_argument('scalars', nargs='+')
+    parser.add_argument('--output', default='frames')
+    parser.add_argument('--times', type=float, nargs='*')
+    parser.add_argument('--mode', choices=('histogram', 'scatter'), default='histogram')
+    parser.add_argument('--axes', type=int, nargs=2, default=(0, 1))
+    parser.add_argument('--max-points', type=int, default=50000)
+    parser.add_argument('--bins', type=int, nargs=2, default=(256, 256))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--animation', choices=('gif', 'mp4'))
+    parser.add_argument('--fps', type=int, default=10)
+    args = parser.parse_args()
+
+    visualizer = Visualizer(args.data_file)
+    try:
+        frames = visualizer.render_batch(
+            args.scalars, args.output, times=args.times, mode=args.mode, axes=args.axes, max_points=args.max_points,
+            bins=args.bins, num_workers=args.workers, dpi=args.dpi, animation_format=args.animation, fps=args.fps
+        )
+    finally:
+        visualizer.close()
+    print(f"Rendered {sum(len(images) for images in frames.values())} images to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()